@@ -30,10 +30,10 @@ SOFTWARE.
 
 import re
 import numpy as np
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
 
-RE=re.compile(r'/\d+')
+RE=re.compile(r'/[^\s]*')
+RE_BYTES=re.compile(rb'/[^\s]*')
+RE_COMMENT=re.compile(rb'#[^\n]*')
 
 class ObjFile:
     """
@@ -54,64 +54,229 @@ class ObjFile:
     
     def __init__(self, obj_file=None):
         self.nodes=None
-        self.faces=None
+        self.face_nodes=None
+        self.face_sizes=None
         if obj_file:
-            self.ObjParse(obj_file)
+            if obj_file.lower().endswith('.off'):
+                self.OffParse(obj_file)
+            else:
+                self.ObjParse(obj_file)
         
     def ObjInfo(self):
         print ("Num vertices  :    %d"%(len(self.nodes)))
-        print ("Num faces     :    %d"%(len(self.faces))) 
+        print ("Num faces     :    %d"%(len(self.face_sizes)))
         nmin,nmax=self.MinMaxNodes()
         print ("Min/Max       :    %s %s"%(np.around(nmin,3), np.around(nmax,3) ))
 
     @staticmethod
     def MinMax3d(arr):
-        nmin=1E9*np.ones((3))
-        nmax=-1E9*np.ones((3))
-        for a in arr:
-            for i in range(3):
-                nmin[i]=min(nmin[i],a[i])
-                nmax[i]=max(nmax[i],a[i])    
-        return (nmin,nmax)
+        arr=np.asarray(arr,dtype=np.float64).reshape(-1,3)
+        if len(arr)==0:
+            return (1E9*np.ones((3)),-1E9*np.ones((3)))
+        return (arr.min(axis=0),arr.max(axis=0))
         
     def MinMaxNodes(self):
         return ObjFile.MinMax3d(self.nodes)
-        
+
+    def NormalizeNodes(self):
+        """Centers the bounding box of the mesh at the origin and scales it
+        into the unit sphere.
+
+        Returns:
+          (center, scale) such that the original nodes are
+          nodes * scale + center.
+        """
+        nmin,nmax=ObjFile.MinMax3d(self.nodes[1:]) # skip first dummy 'node'
+        if np.any(nmin>nmax):
+            return np.zeros(3),1.
+        center=(nmin+nmax)/2.
+        self.nodes=self.nodes-center
+        self.nodes[0]=0.
+        scale=np.sqrt(np.max(np.sum(self.nodes[1:]**2,axis=1)))
+        if scale<0.000000001:
+            scale=1.
+        self.nodes/=scale
+        return center,scale
+
+
+    @property
+    def faces(self):
+        """Faces as lists of 1-based node ids."""
+        if self.face_nodes is None:
+            return None
+        return [f.tolist() for f in np.split(self.face_nodes,
+                                             np.cumsum(self.face_sizes)[:-1])]
+
+    @faces.setter
+    def faces(self, faces):
+        if faces is None:
+            self.face_nodes=None
+            self.face_sizes=None
+        else:
+            self.face_sizes=np.array([len(f) for f in faces],dtype=np.int64)
+            self.face_nodes=np.array([n for f in faces for n in f],dtype=np.int64)
+
+    @staticmethod
+    def LineRuns(mask):
+        """(start, stop) line ranges of the runs of consecutive True lines."""
+        edges=np.diff(np.concatenate([[0],mask.astype(np.int8),[0]]))
+        return zip(np.flatnonzero(edges==1),np.flatnonzero(edges==-1))
 
     def ObjParse(self, obj_file ):
-        f=open(obj_file)
-        lines=f.readlines()
-        f.close()
-        nodes=[]
+        """Reads the vertices and faces of an .obj file.
+
+        Lines are classified by their first two bytes with NumPy; the runs
+        of vertex lines and of face lines are cut out of the file as whole
+        byte ranges and each parsed with a single np.fromstring call. Faces
+        are kept flat, as `face_nodes` with the number of nodes of every face
+        in `face_sizes`. Texture and normal ids ('f 1/2/3') and relative ids
+        ('f -3 -2 -1') are handled.
+        """
+        with open(obj_file,'rb') as f:
+            data=f.read()
+
+        buf=np.frombuffer(data,dtype=np.uint8)
+        starts=np.concatenate([[0],np.flatnonzero(buf==ord('\n'))+1])
+        starts=starts[starts<len(buf)]
+        ends=np.append(starts[1:],len(buf))
+        first=buf[starts]
+        second=buf[np.minimum(starts+1,len(buf)-1)]
+        sep=(second==ord(' '))|(second==ord('\t'))
+        is_v=(first==ord('v'))&sep
+        is_f=(first==ord('f'))&sep
+
+        v_text=b' '.join(data[starts[a]:ends[b-1]] for a,b in ObjFile.LineRuns(is_v))
+        coords=np.fromstring(v_text.replace(b'v',b' '),sep=' ')
         # add zero entry to get ids right
-        nodes.append([.0,.0,.0])
-        faces=[]
-        for line in lines:
-            if 'v' == line[0]:
-                v=line.split()
-                nodes.append(ObjFile.ToFloats(v[1:]))
-            if 'f' == line[0]:
-                # remove /int 
-                line=re.sub(RE,'',line)                
-                f=line.split()
-                faces.append(ObjFile.ToInts(f[1:]))
-    
-        self.nodes=np.array(nodes)
-        self.faces=faces    
+        nodes=np.zeros((int(is_v.sum())+1,3))
+        if len(coords)==3*(len(nodes)-1):
+            nodes[1:]=coords.reshape(-1,3)
+        else:
+            # vertices with a w coordinate or colors
+            lines=v_text.decode().splitlines()
+            nodes[1:]=[ObjFile.ToFloats(line.split()[1:4]) for line in lines]
+
+        f_text=b' '.join(data[starts[a]:ends[b-1]] for a,b in ObjFile.LineRuns(is_f))
+        # every face starts with a 0, which is not a valid id, to mark where
+        # it begins.
+        ids,sizes=ObjFile.ParseFaces(f_text.replace(b'f',b'0'))
+        relative=ids<0
+        if relative.any():
+            # number of vertices defined before every face
+            offsets=np.repeat(np.cumsum(is_v)[is_f],sizes)
+            ids[relative]+=offsets[relative]+1
+
+        self.nodes=nodes
+        self.face_nodes=ids
+        self.face_sizes=sizes
+
+
+    @staticmethod
+    def ParseFaces(f_text):
+        """Node ids and sizes of the faces in `f_text`, each starting with 0.
+
+        Texture and normal ids are dropped. When every node is written the
+        same way ('n', 'n/t', 'n//m' or 'n/t/m'), the slashes are parsed as
+        separators and every stride-th number kept; otherwise they are
+        removed with a regular expression first.
+        """
+        num_slashes=f_text.count(b'/')
+        if num_slashes:
+            node=f_text.split(None,2)[1]
+            stride=len([n for n in node.split(b'/') if n])
+            numbers=np.fromstring(f_text.replace(b'/',b' '),dtype=np.int64,sep=' ')
+            bounds=np.flatnonzero(numbers==0)
+            sizes,rest=np.divmod(np.diff(np.append(bounds,len(numbers)))-1,stride)
+            if not rest.any() and sizes.sum()*node.count(b'/')==num_slashes:
+                return np.delete(numbers,bounds)[::stride],sizes
+            # remove /int and //int
+            f_text=RE_BYTES.sub(b'',f_text)
+
+        ids=np.fromstring(f_text,dtype=np.int64,sep=' ')
+        bounds=np.flatnonzero(ids==0)
+        sizes=np.diff(np.append(bounds,len(ids)))-1
+        return np.delete(ids,bounds),sizes
+
+    def OffParse(self, off_file):
+        """Reads the vertices and faces of an .off file.
+
+        Handles the 'OFF<nv> <nf> <ne>' header of some ModelNet files and
+        '#' comments. The vertex lines are parsed with one np.fromstring
+        call; the face lines with another after every line end is replaced
+        by a -1, which is not a valid vertex index, to mark where each face
+        begins. Vertex indices are converted to the 1-based ids of ObjParse.
+        """
+        with open(off_file,'rb') as f:
+            data=f.read()
+        if b'#' in data:
+            data=RE_COMMENT.sub(b'',data)
+
+        header,body=data.lstrip().split(b'\n',1)
+        header=header.strip()
+        if not header.startswith(b'OFF'):
+            raise ValueError('%s is not an OFF file'%off_file)
+        # the counts follow on the header line in some ModelNet files
+        header=header[3:]
+        while not header.strip():
+            header,body=body.split(b'\n',1)
+        num_nodes,num_faces=[int(n) for n in header.split()[:2]]
+
+        buf=np.frombuffer(body,dtype=np.uint8)
+        ends=np.append(np.flatnonzero(buf==ord('\n')),len(body))
+        # skip blank lines between the header and the vertices
+        lead=len(body)-len(body.lstrip())
+        end=ends[np.searchsorted(ends,lead)+num_nodes-1] if num_nodes else lead
+        v_text,f_text=body[:end],body[end:]
+
+        coords=np.fromstring(v_text,sep=' ')
+        nodes=np.zeros((num_nodes+1,3))
+        if len(coords)==3*num_nodes:
+            nodes[1:]=coords.reshape(-1,3)
+        else:
+            # vertices with colors
+            nodes[1:]=[ObjFile.ToFloats(line.split()[:3])
+                       for line in v_text.decode().split('\n') if line.strip()]
+
+        numbers=np.fromstring(f_text.replace(b'\n',b' -1 '),dtype=np.int64,sep=' ')
+        bounds=np.flatnonzero(numbers==-1)
+        # first number of every non-blank line
+        heads=bounds[np.diff(np.append(bounds,len(numbers)))>1]+1
+        if len(heads)!=num_faces:
+            raise ValueError('%s: expected %d faces, found %d'%(off_file,num_faces,len(heads)))
+        sizes=numbers[heads]
+        # index of every node in `numbers`, skipping the face sizes and colors
+        index=np.arange(sizes.sum())-np.repeat(np.cumsum(sizes)-sizes,sizes)
+        index+=np.repeat(heads+1,sizes)
 
+        self.nodes=nodes
+        self.face_nodes=numbers[index]+1
+        self.face_sizes=sizes
+
+    @staticmethod
+    def FaceFormat(sizes,prefix,fmt):
+        """Format string of all faces, `prefix` then `fmt` per node."""
+        lines={}
+        for size in np.unique(sizes):
+            lines[size]=prefix+' '.join([fmt]*size)+'\n'
+        return ''.join([lines[size] for size in sizes.tolist()])
 
     def ObjWrite(self, obj_file):
-        f=open(obj_file, 'w')
-        for n in self.nodes[1:]: # skip first dummy 'node'
-            f.write('v ')
-            for nn in n:
-                f.write('%g '%(nn))
-            f.write('\n')
-        for ff in self.faces:
-            f.write('f ')
-            for fff in ff:
-                f.write('%d '%(fff))
-            f.write('\n')
+        nodes=self.nodes[1:] # skip first dummy 'node'
+        with open(obj_file, 'w') as f:
+            f.write('v %g %g %g\n'*len(nodes)%tuple(nodes.ravel().tolist()))
+            f.write(ObjFile.FaceFormat(self.face_sizes,'f ','%d')
+                    %tuple(self.face_nodes.tolist()))
+
+    def OffWrite(self, off_file):
+        nodes=self.nodes[1:] # skip first dummy 'node'
+        faces=self.face_nodes-1
+        with open(off_file, 'w') as f:
+            f.write('OFF\n%d %d 0\n'%(len(nodes),len(self.face_sizes)))
+            f.write('%g %g %g\n'*len(nodes)%tuple(nodes.ravel().tolist()))
+            lines=ObjFile.FaceFormat(self.face_sizes,'%d ','%d')
+            # every face starts with its size
+            f.write(lines%tuple(np.insert(faces,np.cumsum(self.face_sizes)-self.face_sizes,
+                                          self.face_sizes).tolist()))
 
             
     @staticmethod
@@ -126,14 +291,15 @@ class ObjFile:
                 
     @staticmethod
     def ToInts(n):
+        # node id of 'id', 'id/vt', 'id//vn' and 'id/vt/vn'
         if isinstance(n,list):
             v=[]
             for nn in n:
-                v.append(int(nn[:-2]))
+                v.append(int(nn.split('/')[0]))
             return v
         else:
-            return int(n)
-                
+            return int(n.split('/')[0])
+
     @staticmethod
     def Normalize(v):
         v2=np.linalg.norm(v)
@@ -142,18 +308,73 @@ class ObjFile:
         else:
             return v/v2
     
+    def Triangulate(self):
+        """Fan-triangulates every face into (f0, fi, fi+1) triangles.
+
+        Returns:
+          [num_triangles, 3] array of 1-based node ids. Faces with fewer than
+          3 nodes are dropped.
+        """
+        sizes=self.face_sizes
+        starts=np.cumsum(sizes)-sizes
+        counts=np.maximum(sizes-2,0)
+        face=np.repeat(np.arange(len(sizes)),counts)
+        # index of the second node of every triangle within its face
+        i=np.arange(len(face))-np.repeat(np.cumsum(counts)-counts,counts)+1
+        first=self.face_nodes[starts[face]]
+        second=self.face_nodes[starts[face]+i]
+        third=self.face_nodes[starts[face]+i+1]
+        return np.stack([first,second,third],axis=1)
+
     def QuadToTria(self):
-        trifaces=[]
-        for f in self.faces:
-            if len(f)==3:
-                trifaces.append(f)
-            elif len(f)==4:
-                f1=[f[0],f[1],f[2]]
-                f2=[f[0],f[2],f[3]]
-                trifaces.append(f1)
-                trifaces.append(f2)
-        return trifaces
-    
+        return self.Triangulate()
+
+    def Decimate(self, cell_size):
+        """Simplifies the mesh by vertex clustering.
+
+        The nodes are binned into a grid of cubes of side `cell_size` and
+        every occupied cube is replaced by the mean of its nodes. Triangles
+        with two corners in one cube collapse and are dropped, as are the
+        duplicates left when two triangles fall on the same cubes. With a
+        cube about the size of a pixel of the views, the views barely change
+        while dense meshes lose most of their faces. The mesh is
+        triangulated first.
+
+        Returns:
+          (triangles before, triangles after).
+        """
+        triangles=self.Triangulate()
+        num_triangles=len(triangles)
+        if len(self.nodes)<2 or not num_triangles:
+            return num_triangles,num_triangles
+
+        cells=np.floor(self.nodes[1:]/cell_size).astype(np.int64) # skip first dummy 'node'
+        cells-=cells.min(axis=0)
+        key=np.ravel_multi_index(cells.T,cells.max(axis=0)+1)
+        _,cluster,counts=np.unique(key,return_inverse=True,return_counts=True)
+        cluster=cluster.reshape(-1)
+        nodes=np.zeros((len(counts)+1,3))
+        for k in range(3):
+            nodes[1:,k]=np.bincount(cluster,weights=self.nodes[1:,k])/counts
+
+        triangles=cluster[triangles-1]+1
+        triangles=triangles[(triangles[:,0]!=triangles[:,1])&
+                            (triangles[:,1]!=triangles[:,2])&
+                            (triangles[:,2]!=triangles[:,0])]
+        # one triangle per set of cubes, the first in face order
+        corners=np.sort(triangles,axis=1)
+        if len(nodes)<(1<<21):
+            _,first=np.unique((corners[:,0]<<42)|(corners[:,1]<<21)|corners[:,2],
+                              return_index=True)
+        else:
+            _,first=np.unique(corners,axis=0,return_index=True)
+        triangles=triangles[np.sort(first)]
+
+        self.nodes=nodes
+        self.face_nodes=triangles.reshape(-1)
+        self.face_sizes=np.full(len(triangles),3,dtype=np.int64)
+        return num_triangles,len(triangles)
+
     @staticmethod
     def ScaleVal(v,scale,minval=True):
         
@@ -169,11 +390,12 @@ class ObjFile:
                 return v*(1.-scale)
             
 
-    def Plot(self, output_file=None, elevation=None, azim=None,dpi=None,scale=None,animate=None):
-        plt.ioff()
+    def PlotSurface(self, fig, scale=None):
+        """Adds the 3d axes with the surface of the mesh to `fig`."""
+        # only needed to plot, data_utils.rasterizer renders without it
+        from mpl_toolkits.mplot3d import Axes3D
         tri=self.QuadToTria()
-        fig = plt.figure()
-        ax = fig.gca(projection='3d')
+        ax = fig.add_subplot(111, projection='3d')
         ax.plot_trisurf(self.nodes[:,0],self.nodes[:,1],self.nodes[:,2], triangles=tri)
         ax.axis('off')
         fig.subplots_adjust(left=0, right=1, bottom=0, top=1)
@@ -182,6 +404,46 @@ class ObjFile:
             ax.set_xlim(ObjFile.ScaleVal(nmin[0],scale),ObjFile.ScaleVal(nmax[0],scale,False))
             ax.set_ylim(ObjFile.ScaleVal(nmin[1],scale),ObjFile.ScaleVal(nmax[1],scale,False))
             ax.set_zlim(ObjFile.ScaleVal(nmin[2],scale),ObjFile.ScaleVal(nmax[2],scale,False))
+        return ax
+
+    def PlotViews(self, elevations, azims, height=299, width=299, scale=None,
+                  output_files=None, transparent=True):
+        """Renders several views of the mesh with matplotlib.
+
+        The surface is built once on an off-screen Agg canvas of exactly
+        height x width pixels; every view only calls view_init, redraws and
+        copies the canvas buffer, without pyplot or a savefig round-trip.
+
+        Returns:
+          list of [height, width, 4] uint8 RGBA views, also written as PNG
+          to `output_files` if given.
+        """
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        dpi=100.
+        fig=Figure(figsize=(width/dpi,height/dpi),dpi=dpi)
+        canvas=FigureCanvasAgg(fig)
+        ax=self.PlotSurface(fig,scale)
+        if transparent:
+            fig.patch.set_alpha(0)
+            ax.patch.set_alpha(0)
+
+        views=[]
+        for i,(elevation,azim) in enumerate(zip(elevations,azims)):
+            ax.view_init(elevation,azim)
+            canvas.draw()
+            view=np.array(canvas.buffer_rgba())
+            views.append(view)
+            if output_files:
+                import PIL.Image
+                PIL.Image.fromarray(view).save(output_files[i])
+        return views
+
+    def Plot(self, output_file=None, elevation=None, azim=None,dpi=None,scale=None,animate=None):
+        import matplotlib.pyplot as plt
+        plt.ioff()
+        fig = plt.figure()
+        ax = self.PlotSurface(fig, scale)
         if elevation is not None and azim is not None:
             ax.view_init(elevation, azim)
         elif elevation is not None:
@@ -0,0 +1,141 @@
+"""Tests for the .obj and .off parsers of data_utils.ObjFile."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+
+from data_utils import ObjFile
+
+
+# Unit square in z=0 with texture and normal ids, an apex added after the
+# first face and referenced by relative ids, and faces written both with
+# and without the texture and normal ids.
+SQUARE_OBJ = b'''# square
+v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+vt 0 0
+vt 1 0
+vn 0 0 1
+f 1/1/1 2/2/1 3/2/1 4/1/1
+v 0.5 0.5 1
+f -5 -4 -1
+
+f 1//1 2//1 5//1
+f 1 3 5
+'''
+
+# A pentagon and a triangle with a face color, with the counts on the
+# header line as in some ModelNet files.
+PENTAGON_OFF = b'''OFF5 2 0
+# house
+0 0 0
+1 0 0
+1 1 0
+0 1 0
+0.5 1.5 0 # apex
+5 0 1 2 4 3
+3 0 1 2 255 0 0
+'''
+
+SQUARE_NODES = [[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]]
+PENTAGON_NODES = SQUARE_NODES + [[0.5, 1.5, 0]]
+
+
+class ObjFileTest(tf.test.TestCase):
+
+    def setUp(self):
+        super(ObjFileTest, self).setUp()
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        super(ObjFileTest, self).tearDown()
+
+    def _parse(self, name, data):
+        path = os.path.join(self.root, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return ObjFile.ObjFile(path)
+
+    def _assert_square(self, obj):
+        self.assertAllEqual(obj.nodes[0], [0, 0, 0])
+        self.assertAllClose(obj.nodes[1:], SQUARE_NODES + [[0.5, 0.5, 1]])
+        self.assertEqual(obj.faces, [[1, 2, 3, 4], [1, 2, 5], [1, 2, 5], [1, 3, 5]])
+
+    def _assert_pentagon(self, obj):
+        self.assertAllEqual(obj.nodes[0], [0, 0, 0])
+        self.assertAllClose(obj.nodes[1:], PENTAGON_NODES)
+        self.assertEqual(obj.faces, [[1, 2, 3, 5, 4], [1, 2, 3]])
+
+    def test_obj_texture_normal_and_relative_ids(self):
+        self._assert_square(self._parse('square.obj', SQUARE_OBJ))
+
+    def test_obj_uniform_texture_normal_ids(self):
+        obj = self._parse('square.obj', b'v 0 0 0\nv 1 0 0\nv 1 1 0\n'
+                                        b'f 1/1/1 2/2/1 3/3/1\nf 3/3/1 2/2/1 1/1/1\n')
+        self.assertEqual(obj.faces, [[1, 2, 3], [3, 2, 1]])
+
+    def test_obj_crlf(self):
+        self._assert_square(self._parse('square.obj',
+                                        SQUARE_OBJ.replace(b'\n', b'\r\n')))
+
+    def test_obj_vertex_colors(self):
+        obj = self._parse('square.obj', b'v 0 0 0 1 0 0\nv 1 0 0 0 1 0\n'
+                                        b'v 1 1 0 0 0 1\nf 1 2 3\n')
+        self.assertAllClose(obj.nodes[1:], SQUARE_NODES[:3])
+        self.assertEqual(obj.faces, [[1, 2, 3]])
+
+    def test_off_compact_header_comments_and_face_colors(self):
+        self._assert_pentagon(self._parse('pentagon.off', PENTAGON_OFF))
+
+    def test_off_crlf(self):
+        self._assert_pentagon(self._parse('pentagon.off',
+                                          PENTAGON_OFF.replace(b'\n', b'\r\n')))
+
+    def test_off_counts_on_their_own_line(self):
+        data = PENTAGON_OFF.replace(b'OFF5 2 0', b'OFF\n\n5 2 0\n')
+        self._assert_pentagon(self._parse('pentagon.off', data))
+
+    def test_off_face_count_mismatch(self):
+        with self.assertRaisesRegex(ValueError, 'expected 3 faces, found 2'):
+            self._parse('pentagon.off', PENTAGON_OFF.replace(b'OFF5 2 0', b'OFF5 3 0'))
+
+    def test_not_an_off_file(self):
+        with self.assertRaisesRegex(ValueError, 'is not an OFF file'):
+            self._parse('square.off', SQUARE_OBJ)
+
+    def test_triangulate_ngons(self):
+        obj = self._parse('pentagon.off', PENTAGON_OFF)
+        self.assertAllEqual(obj.Triangulate(),
+                            [[1, 2, 3], [1, 3, 5], [1, 5, 4], [1, 2, 3]])
+
+        obj = self._parse('square.obj', SQUARE_OBJ)
+        self.assertAllEqual(obj.Triangulate(),
+                            [[1, 2, 3], [1, 3, 4], [1, 2, 5], [1, 2, 5], [1, 3, 5]])
+
+    def test_triangulate_drops_degenerate_faces(self):
+        obj = ObjFile.ObjFile()
+        obj.faces = [[1, 2], [1, 2, 3, 4]]
+        self.assertAllEqual(obj.Triangulate(), [[1, 2, 3], [1, 3, 4]])
+
+    def test_write_round_trip(self):
+        source = self._parse('pentagon.off', PENTAGON_OFF)
+        for name, write in (('out.obj', source.ObjWrite), ('out.off', source.OffWrite)):
+            path = os.path.join(self.root, name)
+            write(path)
+            obj = ObjFile.ObjFile(path)
+            self.assertAllClose(obj.nodes, source.nodes)
+            self.assertEqual(obj.faces, source.faces)
+            self.assertAllEqual(obj.face_sizes, np.array([5, 3]))
+
+
+if __name__ == '__main__':
+    tf.test.main()
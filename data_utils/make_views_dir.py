@@ -2,6 +2,8 @@ import os
 
 import tensorflow as tf
 
+from dataset_tools import catalog
+
 flags = tf.app.flags
 
 FLAGS = flags.FLAGS
@@ -17,21 +19,15 @@ flags.DEFINE_string('dataset_category', 'test',
 
 
 def main(unused_argv):
-    root = os.listdir(FLAGS.source_dir)
-    root.sort()
-
-    for cls in root:
-        if not os.path.isdir(os.path.join(FLAGS.source_dir, cls)):
-            continue
-
-        dataset = os.path.join(FLAGS.source_dir, cls, FLAGS.dataset_category)
-        data_list = os.listdir(dataset)
-
-        for f in data_list:
-            if '.off' in f:
-                target_dir = os.path.join(FLAGS.target_dir, cls, FLAGS.dataset_category)
-                p = os.path.join(target_dir, f)
-                os.makedirs(p)
+    data_catalog = catalog.load_catalog(FLAGS.source_dir)
+    for cls, f, _, _, _ in data_catalog.files(FLAGS.dataset_category):
+        if '.off' in f:
+            target_dir = os.path.join(FLAGS.target_dir, cls, FLAGS.dataset_category)
+            p = os.path.join(target_dir, f)
+            os.makedirs(p)
+
+    # Files were added to target_dir.
+    catalog.invalidate(FLAGS.target_dir)
 
 
 
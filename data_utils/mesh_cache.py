@@ -0,0 +1,90 @@
+"""
+Binary cache of parsed meshes.
+
+Parsing the text .off/.obj meshes is the first cost of every render run.
+load_mesh parses a mesh once, triangulates it, centers it and scales it into
+the unit sphere, and stores the result as `<cache_dir>/<sha1 of path>.npz`
+together with the size and mtime of the source file. Later runs, e.g. with
+another number of views or image size, load the arrays and skip parsing as
+long as the source file is unchanged.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import hashlib
+import os
+
+import numpy as np
+
+from data_utils import ObjFile
+
+
+def cache_path(cache_dir, mesh_path):
+    key = hashlib.sha1(os.path.abspath(mesh_path).encode('utf8')).hexdigest()
+    return os.path.join(cache_dir, key + '.npz')
+
+
+def _from_arrays(nodes, triangles):
+    mesh = ObjFile.ObjFile()
+    mesh.nodes = nodes
+    mesh.face_nodes = triangles.reshape(-1)
+    mesh.face_sizes = np.full(len(triangles), 3, dtype=np.int64)
+    return mesh
+
+
+def _read(path, stat):
+    """Cached (nodes, triangles, center, scale), None if missing or stale."""
+    try:
+        with np.load(path) as cached:
+            if (int(cached['size']) != stat.st_size or
+                    int(cached['mtime_ns']) != stat.st_mtime_ns):
+                return None
+            return (cached['nodes'].astype(np.float64),
+                    cached['triangles'].astype(np.int64),
+                    cached['center'], float(cached['scale']))
+    except (IOError, OSError, KeyError, ValueError):
+        return None
+
+
+def parse_mesh(mesh_path):
+    """Parses, triangulates and normalizes a mesh.
+
+    Returns:
+      (mesh, center, scale): an ObjFile of triangles whose nodes are
+      centered and scaled into the unit sphere, and the transform that maps
+      them back, see ObjFile.NormalizeNodes.
+    """
+    mesh = ObjFile.ObjFile(mesh_path)
+    triangles = mesh.Triangulate()
+    center, scale = mesh.NormalizeNodes()
+    return _from_arrays(mesh.nodes, triangles), center, scale
+
+
+def load_mesh(mesh_path, cache_dir=None):
+    """Like parse_mesh, reading and writing the cache in `cache_dir` if set."""
+    if not cache_dir:
+        return parse_mesh(mesh_path)
+
+    stat = os.stat(mesh_path)
+    path = cache_path(cache_dir, mesh_path)
+    cached = _read(path, stat)
+    if cached is not None:
+        nodes, triangles, center, scale = cached
+        return _from_arrays(nodes, triangles), center, scale
+
+    mesh, center, scale = parse_mesh(mesh_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Node ids fit in int32 and the nodes are in [-1, 1].
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        np.savez(f,
+                 nodes=mesh.nodes.astype(np.float32),
+                 triangles=mesh.face_nodes.reshape(-1, 3).astype(np.int32),
+                 center=center,
+                 scale=scale,
+                 size=stat.st_size,
+                 mtime_ns=stat.st_mtime_ns)
+    os.rename(tmp_path, path)
+    return mesh, center, scale
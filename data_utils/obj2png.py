@@ -29,12 +29,20 @@ SOFTWARE.
 
 import tensorflow as tf
 
+import functools
+import multiprocessing
 import os
-import data_utils.ObjFile
+import PIL.Image
+
+from data_utils import mesh_cache
+from data_utils import render_util
 import sys
 import os
 import glob
 
+from dataset_tools import build_util
+from dataset_tools import catalog
+
 
 flags = tf.app.flags
 
@@ -42,7 +50,7 @@ FLAGS = flags.FLAGS
 
 
 flags.DEFINE_string('source_dir', '/home/ace19/dl_data/ModelNet10',
-                    'Directory where .obj files is.')
+                    'Directory where the .off or .obj files are.')
 
 flags.DEFINE_string('target_dir', '/home/ace19/dl_data/modelnet',
                     'Output directory.')
@@ -59,6 +67,26 @@ flags.DEFINE_float('elevation', None, 'Elevation angle of view in degrees.')
 flags.DEFINE_string('quality', 'LOW', 'Image quality (HIGH,MEDIUM,LOW).  Default: LOW')
 flags.DEFINE_float('scale', 0.9,
                    'Scale picture by descreasing boundaries. Lower than 1. gives a larger object.')
+flags.DEFINE_string('renderer', 'matplotlib',
+                    'matplotlib (ObjFile.Plot) or numpy (data_utils/rasterizer.py, '
+                    'much faster). Both draw on a transparent background, but '
+                    'the numpy views keep the aspect ratio of the mesh while '
+                    'matplotlib stretches every axis to fill its 3d box, so do '
+                    'not mix the views of the two in one dataset.')
+flags.DEFINE_integer('image_size', 299,
+                     'Height and width of the views in pixels; 0 renders every view '
+                     'with ObjFile.Plot at the --quality dpi instead.')
+flags.DEFINE_string('shading', 'lambert',
+                    'Shading of the numpy renderer, lambert or phong.')
+flags.DEFINE_integer('num_workers', 1,
+                     'Meshes rendered in parallel, each by its own process.')
+flags.DEFINE_string('mesh_cache_dir', None,
+                    'If set, parsed and normalized meshes are cached here and '
+                    'reused by later runs.')
+flags.DEFINE_float('decimate', 0.,
+                   'If set, meshes are simplified by vertex clustering into '
+                   'cubes of about this many pixels of the views before '
+                   'rendering. 0 renders every face.')
 flags.DEFINE_string('animate', None,
                     'Animate instead of creating picture file as animation, from elevation -180:180 and azim -180:180')
 
@@ -68,6 +96,62 @@ flags.DEFINE_string('animate', None,
 #           help="View instead of creating picture file.")
 
 
+def _init_worker():
+    # Every worker has its own matplotlib, drawing off-screen.
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def _save_views(views, output_files):
+    """Writes the views as PNG, each under a temporary name renamed once
+    complete so that an interrupted run leaves no partial file behind."""
+    num_bytes = 0
+    for view, output_file in zip(views, output_files):
+        tmp_file = output_file + '.tmp'
+        PIL.Image.fromarray(view).save(tmp_file, format='PNG')
+        os.rename(tmp_file, output_file)
+        num_bytes += os.path.getsize(output_file)
+    return num_bytes
+
+
+def render_mesh(task, options):
+    """Renders the views of one mesh.
+
+    Args:
+      task: (size, mesh path, output files), one file per view.
+      options: renderer settings, see main().
+
+    Returns:
+      (number of views, bytes written).
+    """
+    _, obj_file_path, output_files = task
+
+    if options['renderer'] == 'numpy' or options['image_size']:
+        views = render_util.render_mesh_views(
+            obj_file_path, options['elevations'], options['azims'],
+            image_size=options['image_size'],
+            renderer=options['renderer'],
+            shading=options['shading'],
+            scale=options['scale'],
+            mesh_cache_dir=options['mesh_cache_dir'],
+            decimate=options['decimate'])
+        return len(views), _save_views(views, output_files)
+
+    ob, _, _ = mesh_cache.load_mesh(obj_file_path, options['mesh_cache_dir'])
+    if options['decimate']:
+        # the default 6.4 x 4.8 inch figure at the --quality dpi
+        ob.Decimate(render_util.decimation_cell(options['decimate'],
+                                                4.8 * options['dpi']))
+    for outfile_path, azim in zip(output_files, options['azims']):
+        ob.Plot(outfile_path,
+                elevation=options['elevation'],
+                azim=azim,
+                dpi=options['dpi'],
+                scale=options['scale'],
+                animate=options['animate'])
+    return len(output_files), sum(os.path.getsize(f) for f in output_files)
+
+
 def main(unused_argv):
     tf.logging.set_verbosity(tf.logging.INFO)
 
@@ -96,43 +180,58 @@ def main(unused_argv):
         animate=FLAGS.animate
 
 
-    root = os.listdir(FLAGS.source_dir)
-    root.sort()
-    for cls in root:
-        if not os.path.isdir(os.path.join(FLAGS.source_dir, cls)):
+    data_catalog = catalog.load_catalog(FLAGS.source_dir)
+    mesh_files = data_catalog.files(FLAGS.dataset_category)
+    off_paths = set(path for _, _, path, _, _ in mesh_files if path.endswith('.off'))
+    tasks = []
+    num_done = 0
+    for cls, objfile, obj_file_path, size, _ in mesh_files:
+        if objfile.endswith('.obj') and obj_file_path[:-4] + '.off' in off_paths:
+            # converted by off2obj.py, render the .off
             continue
-
-        dataset = os.path.join(FLAGS.source_dir, cls, FLAGS.dataset_category)
-        files = os.listdir(dataset)
-        files.sort()
-
-        for objfile in files:
-            obj_file_path = os.path.join(dataset, objfile)
-            if os.path.isfile(obj_file_path) and '.obj' in objfile:
-                target_path = objfile.replace('.obj','.off')
-                # if FLAGS.outfile:
-                #     outfile=FLAGS.outfile
-                # if FLAGS.view:
-                #     outfile=None
-                # else:
-                #     print('Converting %s to %s'%(objfile, outfile))
-
-                ob = data_utils.ObjFile.ObjFile(obj_file_path)
-
-                for i in range(FLAGS.num_views):
-                    new_output = objfile[:-4] + '.' + str(i) + '.png'
-                    print('Converting %s to %s' % (objfile, new_output))
-                    outfile_path = os.path.join(FLAGS.target_dir, cls, FLAGS.dataset_category,
-                                                target_path, new_output)
-                    ob.Plot(outfile_path,
-                            elevation=elevation,
-                            azim=azim*(i+1),
-                            dpi=dpi,
-                            scale=scale,
-                            animate=animate)
-            # else:
-            #     print('File %s not found or not file type .obj'%objfile)
-            #     sys.exit(1)
+        if objfile.endswith(('.off', '.obj')):
+            # views of both go to the <object>.off directory
+            target_path = objfile[:-4] + '.off'
+            output_files = [os.path.join(FLAGS.target_dir, cls, FLAGS.dataset_category,
+                                         target_path, objfile[:-4] + '.' + str(i) + '.png')
+                            for i in range(FLAGS.num_views)]
+            if all(os.path.exists(f) for f in output_files):
+                # rendered by an earlier run
+                num_done += 1
+                continue
+            tasks.append((size, obj_file_path, output_files))
+
+    # Largest meshes first: the workers take the next mesh as soon as they
+    # are done, so the small ones fill in at the end and no worker is left
+    # with a huge mesh while the others idle. The file size stands in for
+    # the face count, which is only known after parsing.
+    tasks.sort(key=lambda task: -task[0])
+    tf.logging.info('Rendering %d meshes, %d already done.', len(tasks), num_done)
+
+    elevations, azims = render_util.view_angles(FLAGS.num_views, azim, elevation)
+    options = {'renderer': FLAGS.renderer,
+               'image_size': FLAGS.image_size,
+               'shading': FLAGS.shading,
+               'mesh_cache_dir': FLAGS.mesh_cache_dir,
+               'decimate': FLAGS.decimate,
+               'elevations': elevations,
+               'azims': azims,
+               'elevation': elevation,
+               'dpi': dpi,
+               'scale': scale,
+               'animate': animate}
+    render = functools.partial(render_mesh, options=options)
+    progress = build_util.Progress(len(tasks), log_every=10)
+    if FLAGS.num_workers <= 1:
+        for num_views, num_bytes in map(render, tasks):
+            progress.update(num_views, num_bytes)
+    else:
+        with multiprocessing.Pool(FLAGS.num_workers, initializer=_init_worker) as pool:
+            for num_views, num_bytes in pool.imap_unordered(render, tasks, chunksize=1):
+                progress.update(num_views, num_bytes)
+
+    # Files were added to target_dir.
+    catalog.invalidate(FLAGS.target_dir)
     
 if __name__ == '__main__':
     tf.app.run()
\ No newline at end of file
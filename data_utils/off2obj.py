@@ -2,6 +2,9 @@ import tensorflow as tf
 
 import os
 
+from data_utils import ObjFile
+from dataset_tools import catalog
+
 flags = tf.app.flags
 
 FLAGS = flags.FLAGS
@@ -23,26 +26,25 @@ flags.DEFINE_string('dataset_category', 'train',
 def main(unused_argv):
     tf.logging.set_verbosity(tf.logging.INFO)
 
-    root = os.listdir(FLAGS.source_dir)
-    root.sort()
-
-    for cls in root:
-        if not os.path.isdir(os.path.join(FLAGS.source_dir, cls)):
-            continue
-
-        dataset = os.path.join(FLAGS.source_dir, cls, FLAGS.dataset_category)
-        off_files = os.listdir(dataset)
-        off_files.sort()
+    data_catalog = catalog.load_catalog(FLAGS.source_dir)
+    for cls in data_catalog.classes():
+        off_files = data_catalog.files(FLAGS.dataset_category, cls)
 
         total = len(off_files)
-        for i, file in enumerate(off_files):
+        for i, (_, file, file_path, _, _) in enumerate(off_files):
             if i % 50 == 0:
                 tf.logging.info('\n\ncompleted \'%s\': %d/%d' % (cls, i, total))
 
             file_name = os.path.basename(file)[:-4]
             output_file_path = os.path.join(FLAGS.target_dir, cls, FLAGS.dataset_category, file_name + FLAGS.target_file_ext)
-            cmd = 'ctmconv ' + os.path.join(dataset, file) + ' ' + output_file_path
-            os.system(cmd)
+            mesh = ObjFile.ObjFile(file_path)
+            if FLAGS.target_file_ext.lower() == '.off':
+                mesh.OffWrite(output_file_path)
+            else:
+                mesh.ObjWrite(output_file_path)
+
+    # Files were added to target_dir.
+    catalog.invalidate(FLAGS.target_dir)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,270 @@
+"""
+Headless NumPy renderer of shaded mesh views.
+
+A replacement for ObjFile.Plot (matplotlib plot_trisurf + savefig) that
+renders at an exact pixel size with a real depth buffer:
+
+  - the nodes are rotated into the camera frame of all V viewpoints with one
+    matmul, using the (elevation, azimuth) convention of matplotlib's
+    view_init, and projected orthographically;
+  - every triangle of every view is cut into one span of pixels per row,
+    bounded by where its barycentric coordinates are >= 0, and the spans are
+    expanded into pixels all at once;
+  - the nearest triangle of every pixel is kept with np.minimum.at on a
+    z-buffer shared by the V views;
+  - only then are the visible pixels shaded, with Lambert (flat, per face)
+    or Phong (vertex normals interpolated per pixel, plus a specular term)
+    lighting from a light at the camera.
+
+Unlike ObjFile.PlotViews, the views keep the true aspect ratio of the mesh
+with one scale for all three axes (matplotlib stretches every axis to the
+data range on it) and are orthographic. With `transparent`, the background
+matches the transparent white of PlotViews.
+
+    views = rasterizer.render_views(mesh.nodes, mesh.Triangulate(),
+                                    elevations=[30] * 12,
+                                    azimuths=np.arange(12) * 30,
+                                    height=299, width=299)
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+
+# matplotlib's default face color 'C0'.
+DEFAULT_COLOR = (0x1f, 0x77, 0xb4)
+
+
+def camera_rotations(elevations, azimuths):
+    """[V, 3, 3] rotations from world to camera coordinates.
+
+    The rows are the screen x (right), screen y (up) and depth (towards the
+    viewer) axes of cameras looking at the origin from `elevations` degrees
+    above the xy plane and `azimuths` degrees around the z axis, as with
+    matplotlib's view_init.
+    """
+    elev = np.radians(np.asarray(elevations, dtype=np.float64))
+    azim = np.radians(np.asarray(azimuths, dtype=np.float64))
+    towards = np.stack([np.cos(elev) * np.cos(azim),
+                        np.cos(elev) * np.sin(azim),
+                        np.sin(elev)], axis=-1)
+    right = np.stack([-np.sin(azim), np.cos(azim), np.zeros_like(azim)], axis=-1)
+    up = np.cross(towards, right)
+    return np.stack([right, up, towards], axis=1)
+
+
+def vertex_normals(nodes, triangles):
+    """Area-weighted unit normals of the nodes of a triangle mesh."""
+    corners = nodes[triangles]
+    face_normals = np.cross(corners[:, 1] - corners[:, 0],
+                            corners[:, 2] - corners[:, 0])
+    normals = np.stack([np.bincount(triangles.ravel(),
+                                    np.repeat(face_normals[:, i], 3),
+                                    minlength=len(nodes))
+                        for i in range(3)], axis=1)
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    return normals / np.maximum(length, 1e-12)
+
+
+def _planes(x, y, z):
+    """Barycentric and depth planes of triangles with screen corners x, y
+    and depths z ([3, T] each).
+
+    Returns:
+      [T, 9] coefficients (a, b, c) of the first two barycentric coordinates
+      and of the depth, each a * px + b * py + c at pixel center (px, py).
+    """
+    x0, x1, x2 = x
+    y0, y1, y2 = y
+    z0, z1, z2 = z
+    inv_area = 1. / ((x1 - x0) * (y2 - y0) - (x2 - x0) * (y1 - y0))
+    planes = np.empty((len(x0), 9))
+    planes[:, 0] = (y1 - y2) * inv_area
+    planes[:, 1] = (x2 - x1) * inv_area
+    planes[:, 2] = (x1 * y2 - x2 * y1) * inv_area
+    planes[:, 3] = (y2 - y0) * inv_area
+    planes[:, 4] = (x0 - x2) * inv_area
+    planes[:, 5] = (x2 * y0 - x0 * y2) * inv_area
+    # depth = w0 z0 + w1 z1 + (1 - w0 - w1) z2
+    dz0, dz1 = z0 - z2, z1 - z2
+    for i in range(3):
+        planes[:, 6 + i] = planes[:, i] * dz0 + planes[:, 3 + i] * dz1
+    planes[:, 8] += z2
+    return planes
+
+
+def _pixel_boxes(x, y, height, width):
+    """[x0, x1) and [y0, y1) ranges of the pixels whose centers are in the
+    bounding boxes of triangles with screen corners x, y ([3, T] each), as
+    floats."""
+    x0 = np.clip(np.ceil(np.minimum(np.minimum(x[0], x[1]), x[2]) - 0.5), 0, width)
+    x1 = np.clip(np.floor(np.maximum(np.maximum(x[0], x[1]), x[2]) + 0.5), 0, width)
+    y0 = np.clip(np.ceil(np.minimum(np.minimum(y[0], y[1]), y[2]) - 0.5), 0, height)
+    y1 = np.clip(np.floor(np.maximum(np.maximum(y[0], y[1]), y[2]) + 0.5), 0, height)
+    return x0, x1, y0, y1
+
+
+def _spans(planes, x0, x1, y0, y1):
+    """Pixel spans of triangles, one per pixel row of their boxes.
+
+    The pixel centers of a row inside a triangle are those where its three
+    barycentric coordinates, linear in x along the row, are all >= 0.
+
+    Returns:
+      (triangle, py, px, count): the triangle, row, first pixel and number
+      of pixels of every non-empty span.
+    """
+    rows = y1 - y0
+    triangle = np.repeat(np.arange(len(y0)), rows)
+    py = y0[triangle] + np.arange(len(triangle)) - np.repeat(np.cumsum(rows) - rows, rows)
+    cy = py + 0.5
+    plane = planes[triangle]
+    a0, k0 = plane[:, 0], plane[:, 1] * cy + plane[:, 2]
+    a1, k1 = plane[:, 3], plane[:, 4] * cy + plane[:, 5]
+
+    # Range of pixel centers, starting with those of the box.
+    lo = x0[triangle] + 0.5
+    hi = x1[triangle] - 0.5
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for a, k in ((a0, k0), (a1, k1), (-a0 - a1, 1. - k0 - k1)):
+            # a * cx + k >= 0
+            bound = -k / a
+            lo = np.where(a > 0, np.maximum(lo, bound), lo)
+            hi = np.where(a < 0, np.minimum(hi, bound), hi)
+            hi = np.where((a == 0) & (k < 0), -np.inf, hi)
+    px = np.ceil(lo - 0.5)
+    count = np.maximum(np.floor(hi - 0.5) + 1 - px, 0)
+
+    nonempty = np.flatnonzero(count > 0)
+    return (triangle[nonempty], py[nonempty], px[nonempty].astype(np.int64),
+            count[nonempty].astype(np.int64))
+
+
+def _chunks(box_area, max_fragments):
+    """Splits the triangles into ranges of about `max_fragments` candidate
+    pixels each."""
+    total = np.cumsum(box_area)
+    bounds = np.searchsorted(total, np.arange(max_fragments, total[-1], max_fragments))
+    bounds = np.unique(np.concatenate([[0], bounds, [len(box_area)]]))
+    return zip(bounds[:-1], bounds[1:])
+
+
+def render_views(nodes, triangles, elevations, azimuths, height=299, width=299,
+                 extent=1., shading='lambert', color=DEFAULT_COLOR,
+                 background=255, transparent=False, ambient=0.3, specular=0.3,
+                 shininess=20., max_fragments=1 << 22):
+    """Renders V views of a triangle mesh.
+
+    Args:
+      nodes: [N, 3] node coordinates, e.g. ObjFile.nodes of a mesh
+        normalized into the unit sphere.
+      triangles: [T, 3] node indices into `nodes`, e.g. ObjFile.Triangulate().
+      elevations, azimuths: V camera angles in degrees, see camera_rotations.
+      height, width: size of the views in pixels.
+      extent: half the width of the square of the scene shown by the views;
+        lower values give larger objects.
+      shading: 'lambert' or 'phong'.
+      color: RGB color of the surface.
+      background: value of the background pixels.
+      transparent: whether to add an alpha channel, 0 on the background and
+        255 on the mesh, like the views of ObjFile.PlotViews.
+
+    Returns:
+      [V, height, width, 3] uint8 RGB views, [V, height, width, 4] RGBA
+      with `transparent`.
+    """
+    if shading not in ('lambert', 'phong'):
+        raise ValueError('Unknown shading %s' % shading)
+    nodes = np.asarray(nodes, dtype=np.float64)
+    triangles = np.asarray(triangles, dtype=np.int64)
+    rotations = camera_rotations(elevations, azimuths)
+    num_views = len(rotations)
+    fill = [background] * 3 + ([0] if transparent else [])
+
+    # [V, N, 3] camera coordinates of all views in one matmul.
+    camera = np.matmul(nodes[None], rotations.transpose(0, 2, 1))
+    pixels_per_unit = min(height, width) / (2. * extent)
+    screen_x = camera[..., 0] * pixels_per_unit + width / 2.
+    screen_y = height / 2. - camera[..., 1] * pixels_per_unit
+    depth = camera[..., 2]
+
+    if not len(triangles):
+        return np.tile(np.uint8(fill), (num_views, height, width, 1))
+
+    # Triangles of all views, flattened to V * T with the corners first, and
+    # without those that are degenerate or cover no pixel center, e.g. the
+    # many sub-pixel triangles of dense meshes.
+    tx = screen_x[:, triangles.T].transpose(1, 0, 2).reshape(3, -1)
+    ty = screen_y[:, triangles.T].transpose(1, 0, 2).reshape(3, -1)
+    x0, x1, y0, y1 = _pixel_boxes(tx, ty, height, width)
+    area = (tx[1] - tx[0]) * (ty[2] - ty[0]) - (tx[2] - tx[0]) * (ty[1] - ty[0])
+    keep = np.flatnonzero((x1 > x0) & (y1 > y0) & (np.abs(area) > 1e-12))
+    if not len(keep):
+        return np.tile(np.uint8(fill), (num_views, height, width, 1))
+    view, face = np.divmod(keep, len(triangles))
+    tx, ty = tx[:, keep], ty[:, keep]
+    x0, x1 = x0[keep], x1[keep]
+    y0, y1 = y0[keep].astype(np.int64), y1[keep].astype(np.int64)
+    box_area = (x1 - x0).astype(np.int64) * (y1 - y0)
+    planes = _planes(tx, ty, depth[view, triangles[face].T])
+
+    # The z-buffer holds the depth, quantized to 31 bits with 0 nearest to
+    # the camera, in the high bits and the triangle in the low 32 bits, so a
+    # single minimum keeps the nearest triangle of every pixel.
+    near, far = depth.max(), depth.min()
+    depth_scale = (2 ** 31 - 1) / max(near - far, 1e-12)
+    zbuffer = np.full(num_views * height * width, np.iinfo(np.int64).max)
+    for start, stop in _chunks(box_area, max_fragments):
+        triangle, py, px, count = _spans(planes[start:stop], x0[start:stop],
+                                         x1[start:stop], y0[start:stop],
+                                         y1[start:stop])
+        triangle += start
+        # Depth along every span, a * cx + k.
+        plane = planes[triangle]
+        depth_a = plane[:, 6]
+        depth_k = plane[:, 7] * (py + 0.5) + plane[:, 8]
+        base = view[triangle] * (height * width) + py * width + px
+
+        # Expand the spans into pixels.
+        span = np.repeat(np.arange(len(count)), count)
+        offset = np.arange(len(span)) - np.repeat(np.cumsum(count) - count, count)
+        frag_depth = depth_a[span] * (px[span] + offset + 0.5) + depth_k[span]
+        key = np.clip((near - frag_depth) * depth_scale, 0, 2 ** 31 - 1).astype(np.int64)
+        np.minimum.at(zbuffer, base[span] + offset, (key << 32) | triangle[span])
+
+    # Shade the visible triangle of every covered pixel.
+    pixel = np.flatnonzero(zbuffer != np.iinfo(np.int64).max)
+    triangle = zbuffer[pixel] & 0xffffffff
+    towards = rotations[view[triangle], 2]
+    corners = triangles[face[triangle]]
+    if shading == 'phong':
+        px, py = pixel % width + 0.5, pixel // width % height + 0.5
+        plane = planes[triangle]
+        w0 = plane[:, 0] * px + plane[:, 1] * py + plane[:, 2]
+        w1 = plane[:, 3] * px + plane[:, 4] * py + plane[:, 5]
+        bary = np.stack([w0, w1, 1. - w0 - w1], axis=1)
+        normal = np.sum(bary[:, :, None] * vertex_normals(nodes, triangles)[corners],
+                        axis=1)
+    else:
+        corners = nodes[corners]
+        normal = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    # Two-sided: ModelNet meshes are not consistently oriented.
+    n_z = np.abs(np.sum(normal * towards, axis=1)) / \
+        np.maximum(np.linalg.norm(normal, axis=1), 1e-12)
+    light = ambient + (1. - ambient) * n_z
+    highlight = 0.
+    if shading == 'phong':
+        # Light and viewer are both at the camera: the reflected light makes
+        # an angle with cos = 2 n_z^2 - 1 with the view direction.
+        highlight = specular * np.clip(2. * n_z * n_z - 1., 0., 1.) ** shininess
+
+    colors = np.tile(np.float64(fill), (num_views * height * width, 1))
+    colors[pixel, :3] = (np.asarray(color, dtype=np.float64) * light[:, None] +
+                         255. * np.reshape(highlight, (-1, 1)))
+    if transparent:
+        colors[pixel, 3] = 255.
+    return np.clip(colors, 0, 255).astype(np.uint8).reshape(
+        num_views, height, width, len(fill))
@@ -0,0 +1,106 @@
+"""Pixel tests of data_utils.rasterizer on meshes with known views."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+from data_utils import rasterizer
+
+
+SIZE = 20
+
+
+def _rectangle(half_width, half_height):
+    """Nodes and triangles of a rectangle in the x=0 plane, facing the camera
+    at elevation 0 and azimuth 0, with the dummy first node of ObjFile."""
+    nodes = np.array([[0., 0., 0.],
+                      [0., -half_width, -half_height],
+                      [0., half_width, -half_height],
+                      [0., half_width, half_height],
+                      [0., -half_width, half_height]])
+    return nodes, np.array([[1, 2, 3], [1, 3, 4]])
+
+
+def _render(nodes, triangles, azimuth=0., **kwargs):
+    return rasterizer.render_views(nodes, triangles, elevations=[0.],
+                                   azimuths=[azimuth], height=SIZE,
+                                   width=SIZE, **kwargs)[0]
+
+
+def _mask(rows, cols):
+    mask = np.zeros((SIZE, SIZE), dtype=bool)
+    mask[rows[0]:rows[1], cols[0]:cols[1]] = True
+    return mask
+
+
+class RasterizerTest(tf.test.TestCase):
+
+    def test_square_covers_exact_pixels(self):
+        # The views show [-1, 1] on 20 pixels, so the corners at +-0.6 fall
+        # on the pixel edges 4 and 16.
+        view = _render(*_rectangle(0.6, 0.6))
+        self.assertEqual(view.shape, (SIZE, SIZE, 3))
+        mask = _mask((4, 16), (4, 16))
+        self.assertAllClose(view[mask], np.tile(rasterizer.DEFAULT_COLOR, (144, 1)),
+                            atol=1)
+        self.assertAllEqual(view[~mask], np.full(((~mask).sum(), 3), 255))
+
+    def test_aspect_ratio_is_kept(self):
+        view = _render(*_rectangle(0.6, 0.3))
+        covered = np.any(view != 255, axis=-1)
+        self.assertAllEqual(covered, _mask((7, 13), (4, 16)))
+
+    def test_transparent_background(self):
+        view = _render(*_rectangle(0.6, 0.6), transparent=True)
+        self.assertEqual(view.shape, (SIZE, SIZE, 4))
+        mask = _mask((4, 16), (4, 16))
+        self.assertAllEqual(view[..., 3], np.where(mask, 255, 0))
+        self.assertAllEqual(view[~mask], np.tile([255, 255, 255, 0], ((~mask).sum(), 1)))
+        self.assertAllEqual(view[..., :3], _render(*_rectangle(0.6, 0.6)))
+
+    def test_lambert_shading_of_tilted_square(self):
+        # Seen from 60 degrees, the square is half as wide and lit with
+        # cos 60 = 0.5.
+        view = _render(*_rectangle(0.6, 0.6), azimuth=60.)
+        mask = _mask((4, 16), (7, 13))
+        self.assertAllEqual(np.any(view != 255, axis=-1), mask)
+        expected = np.array(rasterizer.DEFAULT_COLOR) * (0.3 + 0.7 * 0.5)
+        self.assertAllClose(view[mask], np.tile(expected, (mask.sum(), 1)), atol=1)
+
+    def test_phong_highlight_facing_the_camera(self):
+        view = _render(*_rectangle(0.6, 0.6), shading='phong')
+        expected = np.minimum(np.array(rasterizer.DEFAULT_COLOR) + 0.3 * 255, 255)
+        self.assertAllClose(view[10, 10], expected, atol=1)
+
+    def test_back_face_and_edge_on(self):
+        front = _render(*_rectangle(0.6, 0.6))
+        # Two-sided, and mirrored from behind.
+        self.assertAllEqual(_render(*_rectangle(0.6, 0.6), azimuth=180.),
+                            front[:, ::-1])
+        self.assertAllEqual(_render(*_rectangle(0.6, 0.6), azimuth=90.),
+                            np.full((SIZE, SIZE, 3), 255))
+
+    def test_nearest_triangle_is_visible(self):
+        nodes, triangles = _rectangle(0.6, 0.6)
+        # A smaller square in front of the first, tilted by 45 degrees so
+        # that it is lit with cos 45.
+        tilted = np.array([[0.1, -0.2, -0.2], [0.5, 0.2, -0.2],
+                           [0.5, 0.2, 0.2], [0.1, -0.2, 0.2]])
+        nodes = np.concatenate([nodes, tilted])
+        expected = np.array(rasterizer.DEFAULT_COLOR) * (0.3 + 0.7 * np.sqrt(0.5))
+        for triangles in (np.concatenate([triangles, triangles + 4]),
+                          np.concatenate([triangles + 4, triangles])):
+            view = _render(nodes, triangles)
+            self.assertAllClose(view[4, 4], rasterizer.DEFAULT_COLOR, atol=1)
+            self.assertAllClose(view[10, 10], expected, atol=1)
+
+    def test_no_triangles(self):
+        view = _render(np.zeros((1, 3)), np.zeros((0, 3), np.int64),
+                       transparent=True)
+        self.assertAllEqual(view, np.tile([255, 255, 255, 0], (SIZE, SIZE, 1)))
+
+
+if __name__ == '__main__':
+    tf.test.main()
@@ -0,0 +1,67 @@
+"""
+Renders the views of a mesh into memory.
+
+Shared by obj2png.py, which saves the views as PNG files, and
+dataset_tools/render_modelnet_tf_record.py, which encodes them straight into
+tf.Examples.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from data_utils import mesh_cache
+from data_utils import rasterizer
+
+
+def view_angles(num_views, azim=45., elevation=None):
+    """(elevations, azimuths) of the views, the angles ObjFile.Plot uses."""
+    azims = [azim * (i + 1) for i in range(num_views)]
+    elevations = [30 if elevation is None else elevation] * num_views
+    return elevations, azims
+
+
+def decimation_cell(decimate, image_size):
+    """Side of the ObjFile.Decimate cubes for cubes of `decimate` pixels in
+    views of `image_size` pixels, which show the unit sphere whole."""
+    return decimate * 2. / image_size
+
+
+def render_mesh_views(mesh_path, elevations, azims, image_size=299,
+                      renderer='matplotlib', shading='lambert', scale=None,
+                      mesh_cache_dir=None, decimate=0.):
+    """Renders one view of a mesh per (elevation, azimuth).
+
+    Args:
+      mesh_path: .off or .obj mesh, normalized into the unit sphere.
+      elevations, azims: angles of the views in degrees.
+      image_size: height and width of the views in pixels.
+      renderer: 'numpy' (rasterizer.render_views) or 'matplotlib'
+        (ObjFile.PlotViews). The numpy views keep the aspect ratio of the
+        mesh, matplotlib stretches every axis to fill its 3d box.
+      shading: 'lambert' or 'phong', for the numpy renderer.
+      scale: axis scale of the matplotlib renderer, see ObjFile.ScaleVal.
+      mesh_cache_dir: if set, see mesh_cache.load_mesh.
+      decimate: if set, the mesh is first simplified by vertex clustering
+        into cubes of about `decimate` pixels, see ObjFile.Decimate.
+
+    Returns:
+      list of [image_size, image_size, 4] uint8 RGBA views with a
+      transparent background.
+    """
+    mesh, _, _ = mesh_cache.load_mesh(mesh_path, mesh_cache_dir)
+    if decimate:
+        mesh.Decimate(decimation_cell(decimate, image_size))
+    if renderer == 'numpy':
+        # The meshes are normalized into the unit sphere, which the views
+        # show whole.
+        return list(rasterizer.render_views(mesh.nodes, mesh.Triangulate(),
+                                            elevations=elevations,
+                                            azimuths=azims,
+                                            height=image_size,
+                                            width=image_size,
+                                            shading=shading,
+                                            transparent=True))
+    # all views from one figure
+    return mesh.PlotViews(elevations, azims, height=image_size,
+                          width=image_size, scale=scale)
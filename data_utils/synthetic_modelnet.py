@@ -0,0 +1,291 @@
+"""
+Writes a synthetic modelnet of procedural meshes, for benchmarking the
+render -> record -> train -> eval pipeline without the ModelNet download.
+
+Every class is a parametric shape (box, cylinder, sphere, torus) or a
+composite of them (table, dumbbell), and every object a random variant: its
+proportions, its parts and their placement, a rotation about the vertical
+axis and a noise on the nodes are drawn per object. The meshes are written
+in the ModelNet layout, `<class>/train/<class>_0001.off` and
+`<class>/test/<class>_<num_train + 1>.off`, e.g.
+
+    python -m data_utils.synthetic_modelnet --output_dir=/tmp/synthetic \
+        --num_train=80 --num_test=20 --resolution=32
+
+    python -m dataset_tools.render_modelnet_tf_record --mesh_dir=/tmp/synthetic \
+        --output_dir=/tmp/synthetic_records --renderer=numpy
+
+Objects are drawn from their own seed, derived from --seed, the class, the
+split and the index, so the same flags always give the same dataset, with
+any number of workers. --resolution sets the number of segments along every
+curve and edge, the face count grows with its square.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import functools
+import multiprocessing
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from data_utils import ObjFile
+from dataset_tools import build_util
+from dataset_tools import catalog
+
+
+flags = tf.compat.v1.app.flags
+flags.DEFINE_string('output_dir', None, 'Root directory of the dataset.')
+flags.DEFINE_string('classes', 'box,cylinder,sphere,torus,table,dumbbell',
+                    'Comma-separated classes to generate.')
+flags.DEFINE_integer('num_train', 80, 'Objects per class in the train split.')
+flags.DEFINE_integer('num_test', 20, 'Objects per class in the test split.')
+flags.DEFINE_integer('resolution', 32,
+                     'Segments along every curve and edge of a shape.')
+flags.DEFINE_float('noise', 0.005,
+                   'Standard deviation of the node noise, relative to the '
+                   'object size.')
+flags.DEFINE_integer('seed', 0, 'Seed of the dataset.')
+flags.DEFINE_integer('num_workers', 1, 'Processes writing the meshes.')
+
+FLAGS = flags.FLAGS
+
+SPLITS = ('train', 'test')
+
+
+class Mesh(object):
+    """Nodes and flat faces with 0-based node ids, as in ObjFile."""
+
+    def __init__(self, nodes, face_nodes, face_sizes):
+        self.nodes = nodes
+        self.face_nodes = face_nodes
+        self.face_sizes = face_sizes
+
+    def transformed(self, scale=1., offset=0.):
+        return Mesh(self.nodes * scale + offset, self.face_nodes, self.face_sizes)
+
+    @staticmethod
+    def concat(meshes):
+        offsets = np.cumsum([0] + [len(m.nodes) for m in meshes[:-1]])
+        return Mesh(np.concatenate([m.nodes for m in meshes]),
+                    np.concatenate([m.face_nodes + o for m, o in zip(meshes, offsets)]),
+                    np.concatenate([m.face_sizes for m in meshes]))
+
+
+def _grid_quads(rows, cols, wrap_cols=False, wrap_rows=False):
+    """Quads of a rows x cols grid of nodes, numbered row by row."""
+    row_count = rows if wrap_rows else rows - 1
+    col_count = cols if wrap_cols else cols - 1
+    r, c = np.meshgrid(np.arange(row_count), np.arange(col_count), indexing='ij')
+    r, c = r.reshape(-1), c.reshape(-1)
+    r1, c1 = (r + 1) % rows, (c + 1) % cols
+    quads = np.stack([r * cols + c, r * cols + c1, r1 * cols + c1, r1 * cols + c],
+                     axis=1)
+    return quads.reshape(-1), np.full(len(quads), 4, dtype=np.int64)
+
+
+def _fan(center, ring, reverse=False):
+    """Triangles from node `center` to the closed loop of nodes `ring`."""
+    nxt = np.roll(ring, -1)
+    if reverse:
+        ring, nxt = nxt, ring
+    triangles = np.stack([np.full(len(ring), center), ring, nxt], axis=1)
+    return triangles.reshape(-1), np.full(len(ring), 3, dtype=np.int64)
+
+
+def box(resolution):
+    """Unit cube [-1, 1]^3, every side a resolution x resolution grid."""
+    t = np.linspace(-1., 1., resolution + 1)
+    u, v = [a.reshape(-1) for a in np.meshgrid(t, t, indexing='ij')]
+    face_nodes, face_sizes = _grid_quads(resolution + 1, resolution + 1)
+    sides = []
+    for axis in range(3):
+        for sign in (-1., 1.):
+            nodes = np.zeros((len(u), 3))
+            nodes[:, axis] = sign
+            nodes[:, (axis + 1) % 3] = u
+            nodes[:, (axis + 2) % 3] = v
+            sides.append(Mesh(nodes, face_nodes, face_sizes))
+    return Mesh.concat(sides)
+
+
+def cylinder(resolution, top_radius=1.):
+    """Cylinder of radius 1 around the z axis from z=-1 to z=1, closed by
+    two fans; a cone with `top_radius` 0."""
+    segments = 2 * resolution
+    phi = np.linspace(0., 2 * np.pi, segments, endpoint=False)
+    z = np.linspace(-1., 1., resolution + 1)
+    radius = np.linspace(1., top_radius, resolution + 1)
+    nodes = np.stack([np.outer(radius, np.cos(phi)), np.outer(radius, np.sin(phi)),
+                      np.outer(z, np.ones(segments))], axis=-1).reshape(-1, 3)
+    side = Mesh(nodes, *_grid_quads(resolution + 1, segments, wrap_cols=True))
+
+    num = len(nodes)
+    nodes = np.concatenate([nodes, [[0., 0., -1.], [0., 0., 1.]]])
+    bottom = _fan(num, np.arange(segments), reverse=True)
+    top = _fan(num + 1, np.arange(resolution * segments, num))
+    return Mesh(nodes,
+                np.concatenate([side.face_nodes, bottom[0], top[0]]),
+                np.concatenate([side.face_sizes, bottom[1], top[1]]))
+
+
+def sphere(resolution):
+    """Unit sphere of resolution rings between two fans at the poles."""
+    segments = 2 * resolution
+    theta = np.linspace(0., np.pi, resolution + 1)[1:-1]
+    phi = np.linspace(0., 2 * np.pi, segments, endpoint=False)
+    nodes = np.stack([np.outer(np.sin(theta), np.cos(phi)),
+                      np.outer(np.sin(theta), np.sin(phi)),
+                      np.outer(np.cos(theta), np.ones(segments))],
+                     axis=-1).reshape(-1, 3)
+    rings = Mesh(nodes, *_grid_quads(len(theta), segments, wrap_cols=True))
+
+    num = len(nodes)
+    nodes = np.concatenate([nodes, [[0., 0., 1.], [0., 0., -1.]]])
+    north = _fan(num, np.arange(segments), reverse=True)
+    south = _fan(num + 1, np.arange(num - segments, num))
+    return Mesh(nodes,
+                np.concatenate([rings.face_nodes, north[0], south[0]]),
+                np.concatenate([rings.face_sizes, north[1], south[1]]))
+
+
+def torus(resolution, tube_radius=0.3):
+    """Torus around the z axis of radius 1."""
+    segments = 2 * resolution
+    u = np.linspace(0., 2 * np.pi, segments, endpoint=False)
+    v = np.linspace(0., 2 * np.pi, resolution, endpoint=False)
+    u, v = np.meshgrid(u, v, indexing='ij')
+    ring = 1. + tube_radius * np.cos(v)
+    nodes = np.stack([ring * np.cos(u), ring * np.sin(u), tube_radius * np.sin(v)],
+                     axis=-1).reshape(-1, 3)
+    return Mesh(nodes, *_grid_quads(segments, resolution, wrap_cols=True,
+                                    wrap_rows=True))
+
+
+def table(resolution, rng):
+    """Box top on four cylinder legs."""
+    width, depth = rng.uniform(0.6, 1.), rng.uniform(0.4, 1.)
+    height, thickness = rng.uniform(0.5, 1.), rng.uniform(0.03, 0.08)
+    leg = rng.uniform(0.03, 0.08)
+    inset = rng.uniform(0.05, 0.15)
+    parts = [box(resolution).transformed([width, depth, thickness],
+                                         [0., 0., height])]
+    leg_mesh = cylinder(max(resolution // 4, 3))
+    for sx in (-1., 1.):
+        for sy in (-1., 1.):
+            parts.append(leg_mesh.transformed(
+                [leg, leg, height / 2.],
+                [sx * (width - inset), sy * (depth - inset), height / 2.]))
+    return Mesh.concat(parts)
+
+
+def dumbbell(resolution, rng):
+    """Two spheres joined by a cylinder bar."""
+    length, bar = rng.uniform(0.6, 1.), rng.uniform(0.05, 0.15)
+    radius = rng.uniform(0.25, 0.45)
+    ball = sphere(resolution)
+    return Mesh.concat([
+        cylinder(max(resolution // 2, 3)).transformed([bar, bar, length]),
+        ball.transformed(radius * rng.uniform(0.9, 1.1, 3), [0., 0., -length]),
+        ball.transformed(radius * rng.uniform(0.9, 1.1, 3), [0., 0., length])])
+
+
+def make_object(cls, resolution, noise, rng):
+    """A random variant of the class `cls`."""
+    if cls == 'box':
+        mesh = box(resolution)
+    elif cls == 'cylinder':
+        mesh = cylinder(resolution, top_radius=rng.choice([1., rng.uniform(0.5, 1.)]))
+    elif cls == 'sphere':
+        mesh = sphere(resolution)
+    elif cls == 'torus':
+        mesh = torus(resolution, tube_radius=rng.uniform(0.15, 0.45))
+    elif cls == 'table':
+        mesh = table(resolution, rng)
+    elif cls == 'dumbbell':
+        mesh = dumbbell(resolution, rng)
+    else:
+        raise ValueError('Unknown class %s' % cls)
+
+    # ModelNet objects stand upright, they only turn about the vertical axis.
+    nodes = mesh.nodes
+    if cls in ('box', 'cylinder', 'sphere', 'torus'):
+        nodes = nodes * rng.uniform(0.5, 1.5, 3)
+    angle = rng.uniform(0., 2 * np.pi)
+    rotation = np.array([[np.cos(angle), -np.sin(angle), 0.],
+                         [np.sin(angle), np.cos(angle), 0.],
+                         [0., 0., 1.]])
+    nodes = nodes.dot(rotation.T)
+    size = np.max(nodes.max(axis=0) - nodes.min(axis=0))
+    nodes = nodes + rng.normal(0., noise * size, nodes.shape)
+    return Mesh(nodes, mesh.face_nodes, mesh.face_sizes)
+
+
+def write_off(mesh, path):
+    obj = ObjFile.ObjFile()
+    # ObjFile counts nodes from 1, after a dummy node 0.
+    obj.nodes = np.concatenate([np.zeros((1, 3)), mesh.nodes])
+    obj.face_nodes = mesh.face_nodes + 1
+    obj.face_sizes = mesh.face_sizes
+    obj.OffWrite(path)
+
+
+def object_tasks(output_dir, classes, num_train, num_test):
+    """(class index, class, split, object number, path) of every object."""
+    tasks = []
+    for c, cls in enumerate(classes):
+        numbers = {'train': range(1, num_train + 1),
+                   'test': range(num_train + 1, num_train + num_test + 1)}
+        for split in SPLITS:
+            for number in numbers[split]:
+                tasks.append((c, cls, split, number,
+                              os.path.join(output_dir, cls, split,
+                                           '%s_%04d.off' % (cls, number))))
+    return tasks
+
+
+def write_object(task, resolution, noise, seed):
+    """Writes one object; returns its number of faces and bytes."""
+    c, cls, split, number, path = task
+    rng = np.random.RandomState([seed, c, SPLITS.index(split), number])
+    mesh = make_object(cls, resolution, noise, rng)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    write_off(mesh, tmp_path)
+    os.rename(tmp_path, path)
+    return len(mesh.face_sizes), os.path.getsize(path)
+
+
+def main(unused_argv):
+    tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.INFO)
+
+    classes = FLAGS.classes.split(',')
+    tasks = object_tasks(FLAGS.output_dir, classes, FLAGS.num_train, FLAGS.num_test)
+    for cls in classes:
+        for split in SPLITS:
+            os.makedirs(os.path.join(FLAGS.output_dir, cls, split), exist_ok=True)
+
+    write = functools.partial(write_object, resolution=FLAGS.resolution,
+                              noise=FLAGS.noise, seed=FLAGS.seed)
+    progress = build_util.Progress(len(tasks), log_every=100)
+    num_faces = 0
+    if FLAGS.num_workers <= 1:
+        for faces, num_bytes in map(write, tasks):
+            num_faces += faces
+            progress.update(1, num_bytes)
+    else:
+        with multiprocessing.Pool(FLAGS.num_workers) as pool:
+            for faces, num_bytes in pool.imap_unordered(write, tasks, chunksize=16):
+                num_faces += faces
+                progress.update(1, num_bytes)
+    tf.compat.v1.logging.info('Wrote %d meshes of %d classes, %.0f faces per mesh.',
+                              len(tasks), len(classes), num_faces / max(len(tasks), 1))
+
+    # Files were added to output_dir.
+    catalog.invalidate(FLAGS.output_dir)
+
+
+if __name__ == '__main__':
+    tf.compat.v1.app.run()
@@ -0,0 +1,177 @@
+"""
+Parallel serialization of modelnet examples for the record builders.
+
+Reading the views, hashing and re-encoding them is done by a pool of worker
+processes, one for the whole build, which return serialized tf.Examples;
+results come back in task order so that a single writer can consume them. build_records() writes them
+into shards kept up to date by a content manifest, see manifest.py.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import functools
+import multiprocessing
+import os
+import time
+
+import tensorflow as tf
+
+from dataset_tools import manifest as manifest_lib
+from dataset_tools import record_index
+from dataset_tools import view_example
+
+
+def _serialize_example(task, example_kwargs):
+    image, label, views = task
+    example = view_example.dict_to_tf_example(image, {image: label}, {image: views},
+                                              **example_kwargs)
+    return example.SerializeToString(), label, len(views)
+
+
+def serialize_examples(tasks, num_workers=1, serialize_fn=None, pool=None,
+                       **example_kwargs):
+    """Yields (serialized_example, label, num_views) for every task, in order.
+
+    Args:
+      tasks: list of (image, label, view paths) of the objects to serialize.
+      num_workers: number of worker processes, 1 serializes in this process.
+      serialize_fn: picklable function of (task, example_kwargs) returning
+        (serialized_example, label, num_views); by default the views of the
+        task are read from their files.
+      pool: multiprocessing pool to serialize in, instead of a pool of
+        `num_workers` processes started for this call.
+      **example_kwargs: passed on to view_example.dict_to_tf_example.
+    """
+    serialize = functools.partial(serialize_fn or _serialize_example,
+                                  example_kwargs=example_kwargs)
+    if pool is not None:
+        for result in pool.imap(serialize, tasks, chunksize=4):
+            yield result
+        return
+    if num_workers <= 1:
+        for task in tasks:
+            yield serialize(task)
+        return
+
+    with multiprocessing.Pool(num_workers) as pool:
+        for result in pool.imap(serialize, tasks, chunksize=4):
+            yield result
+
+
+class Progress(object):
+    """Logs progress, throughput and ETA of a record build."""
+
+    def __init__(self, total, log_every=100):
+        self.total = total
+        self.log_every = log_every
+        self.examples = 0
+        self.views = 0
+        self.bytes = 0
+        self.start_time = time.time()
+
+    def update(self, num_views, num_bytes):
+        self.examples += 1
+        self.views += num_views
+        self.bytes += num_bytes
+        if self.examples % self.log_every == 0 or self.examples == self.total:
+            self.log()
+
+    def log(self):
+        elapsed = max(time.time() - self.start_time, 1e-6)
+        rate = self.examples / elapsed
+        eta = (self.total - self.examples) / rate if rate else 0.
+        tf.compat.v1.logging.info(
+            'On image %d of %d: %.1f examples/sec, %.1f views/sec, '
+            '%.1f MB/sec, ETA %.0f s', self.examples, self.total, rate,
+            self.views / elapsed, self.bytes / elapsed / 2.**20, eta)
+
+
+def build_records(record_path, tasks, num_shards=1, num_workers=1,
+                  serialize_fn=None, **example_kwargs):
+    """Writes `tasks` into `num_shards` shards of `record_path`.
+
+    Shards that are complete and hold the same objects with the same view
+    contents as in the manifest are reused; only the other shards are
+    re-encoded.
+
+    Args:
+      record_path: output record file; shards get a -%05d-of-%05d suffix.
+      tasks: list of (image, label, view paths) of the objects to write.
+      num_shards: number of record files to split the objects over.
+      num_workers: number of worker processes, see serialize_examples.
+      serialize_fn: see serialize_examples. The files of a task are hashed
+        into the manifest whatever they hold, e.g. the mesh that
+        serialize_fn renders.
+      **example_kwargs: passed on to view_example.dict_to_tf_example, or to
+        serialize_fn.
+
+    Returns:
+      The list of shard paths.
+    """
+    if num_workers <= 1:
+        return _build_records(record_path, tasks, num_shards, None,
+                              serialize_fn, example_kwargs)
+    # One pool hashes the new views and serializes every dirty shard.
+    with multiprocessing.Pool(num_workers) as pool:
+        return _build_records(record_path, tasks, num_shards, pool,
+                              serialize_fn, example_kwargs)
+
+
+def _build_records(record_path, tasks, num_shards, pool, serialize_fn,
+                   example_kwargs):
+    options = dict(example_kwargs, num_shards=num_shards)
+    manifest = manifest_lib.Manifest(record_path, options)
+    shard_paths = manifest_lib.shard_paths(record_path, num_shards)
+
+    shard_objects = [{} for _ in shard_paths]
+    shard_tasks = [[] for _ in shard_paths]
+    for task in sorted(tasks):
+        image, label, views = task
+        shard = manifest_lib.shard_of(image, num_shards)
+        shard_objects[shard][image] = {'label': int(label),
+                                       'views': manifest.view_entries(views)}
+        shard_tasks[shard].append(task)
+    manifest.prune(image for image, _, _ in tasks)
+    manifest_lib.hash_views(
+        [view for objects in shard_objects
+         for entry in objects.values() for view in entry['views']],
+        functools.partial(pool.imap, chunksize=16) if pool else map)
+
+    for name in manifest.stale_shards:
+        path = os.path.join(os.path.dirname(record_path), name)
+        if path not in shard_paths:
+            for stale_path in [path, record_index.index_path(path)]:
+                if tf.io.gfile.exists(stale_path):
+                    tf.io.gfile.remove(stale_path)
+
+    dirty = [i for i, path in enumerate(shard_paths)
+             if not manifest.is_current(path, shard_objects[i])]
+    tf.compat.v1.logging.info('Reusing %d of %d shards, writing %d.',
+                              num_shards - len(dirty), num_shards, len(dirty))
+
+    for i, path in enumerate(shard_paths):
+        if i not in dirty:
+            manifest.objects.update(shard_objects[i])
+
+    progress = Progress(sum(len(shard_tasks[i]) for i in dirty))
+    for i in dirty:
+        # Written under a temporary name and renamed once complete, so that
+        # an interrupted build leaves no partial record.
+        tmp_path = shard_paths[i] + '.tmp'
+        writer = record_index.RecordIndexWriter(tmp_path, compression='GZIP')
+        for serialized, label, num_views in serialize_examples(
+                shard_tasks[i], serialize_fn=serialize_fn, pool=pool,
+                **example_kwargs):
+            writer.write(serialized, label, num_views)
+            progress.update(num_views, len(serialized))
+        writer.close()
+
+        tf.io.gfile.rename(record_index.index_path(tmp_path),
+                           record_index.index_path(shard_paths[i]), overwrite=True)
+        tf.io.gfile.rename(tmp_path, shard_paths[i], overwrite=True)
+        manifest.complete_shard(shard_paths[i], shard_objects[i])
+
+    manifest.save()
+    return shard_paths
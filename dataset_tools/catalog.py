@@ -0,0 +1,240 @@
+"""
+SQLite catalog of a modelnet directory tree.
+
+Both the mesh trees (`<class>/<split>/<object>.off`) and the view trees
+(`<class>/<split>/<object>.off/<object>.<view>.png`) are listed once, one
+directory level at a time with os.scandir calls spread over a thread pool,
+and stored in `<root>/.catalog.sqlite` with the class, split, object, path,
+size and mtime of every file. The data tools query the catalog instead of
+walking the tree, which on network filesystems takes minutes.
+
+The catalog is built on first use. It also stores the mtime of every class,
+split and object directory, which changes when files are added to or
+removed from it: a catalog whose directories changed since, e.g. after new
+meshes or views were copied in, is listed again when it is loaded. Tools
+that write into a tree also drop its catalog, and it can be rebuilt with
+
+    python -m dataset_tools.catalog --catalog_dir=/home/ace19/dl_data/modelnet12/view/classes
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import os
+import sqlite3
+import time
+
+from concurrent import futures
+
+import tensorflow as tf
+
+
+flags = tf.compat.v1.app.flags
+
+# Prefixed, since the data tools importing this module define --dataset_dir.
+flags.DEFINE_string('catalog_dir', None,
+                    'Root directory of the tree to catalog.')
+flags.DEFINE_integer('catalog_threads', 32,
+                     'Threads listing the directories of --catalog_dir.')
+
+FLAGS = flags.FLAGS
+
+
+CATALOG_NAME = '.catalog.sqlite'
+
+_SCHEMA = '''
+CREATE TABLE classes (name TEXT NOT NULL);
+CREATE TABLE files (
+    class TEXT NOT NULL,
+    split TEXT NOT NULL,
+    object TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX files_split_class ON files (split, class);
+CREATE TABLE dirs (path TEXT NOT NULL, mtime_ns INTEGER NOT NULL);
+'''
+
+
+def catalog_path(root):
+    return os.path.join(root, CATALOG_NAME)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _scan(path):
+    """(mtime_ns, [(name, path, is_dir, size, mtime_ns)]) of the directory
+    `path` and its entries.
+
+    The mtime is taken before the listing, so that files added meanwhile
+    make the catalog stale. Temporary files of interrupted writes, e.g.
+    obj2png.py views, are left out.
+    """
+    mtime_ns = _mtime(path)
+    entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.name.startswith(CATALOG_NAME) or entry.name.endswith('.tmp'):
+                continue
+            if entry.is_dir():
+                entries.append((entry.name, entry.path, True, 0, 0))
+            else:
+                stat = entry.stat()
+                entries.append((entry.name, entry.path, False,
+                                stat.st_size, stat.st_mtime_ns))
+    return mtime_ns, entries
+
+
+def scan_tree(root, num_threads=32):
+    """Lists every file of a modelnet tree.
+
+    Returns:
+      (classes, rows, dirs): the class directories, a list of (class, split,
+      object, path, size, mtime_ns) rows and the (path, mtime_ns) of the
+      directories below `root`. Files directly in a split directory are
+      objects of their own, files in an object directory (the views) belong
+      to that object.
+    """
+    dirs = []
+    with futures.ThreadPoolExecutor(num_threads) as executor:
+        classes = [e for e in _scan(root)[1] if e[2]]
+        splits = []
+        for (cls, path, _, _, _), (dir_mtime, entries) in zip(
+                classes, executor.map(_scan, [e[1] for e in classes])):
+            dirs.append((path, dir_mtime))
+            splits.extend((cls, e[0], e[1]) for e in entries if e[2])
+
+        rows = []
+        object_dirs = []
+        for (cls, split, split_path), (dir_mtime, entries) in zip(
+                splits, executor.map(_scan, [s[2] for s in splits])):
+            dirs.append((split_path, dir_mtime))
+            for name, path, is_dir, size, mtime_ns in entries:
+                if is_dir:
+                    object_dirs.append((cls, split, name, path))
+                else:
+                    rows.append((cls, split, name, path, size, mtime_ns))
+
+        for (cls, split, obj, obj_path), (dir_mtime, entries) in zip(
+                object_dirs, executor.map(_scan, [o[3] for o in object_dirs])):
+            dirs.append((obj_path, dir_mtime))
+            rows.extend((cls, split, obj, path, size, mtime_ns)
+                        for _, path, is_dir, size, mtime_ns in entries
+                        if not is_dir)
+
+    return [e[0] for e in classes], rows, dirs
+
+
+def build_catalog(root, num_threads=32):
+    """Lists `root` and writes its catalog, replacing any previous one."""
+    start_time = time.time()
+    classes, rows, dirs = scan_tree(root, num_threads)
+
+    path = catalog_path(root)
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    connection = sqlite3.connect(tmp_path)
+    with connection:
+        connection.executescript(_SCHEMA)
+        connection.executemany('INSERT INTO classes VALUES (?)',
+                               [(cls,) for cls in classes])
+        connection.executemany('INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)', rows)
+        connection.executemany('INSERT INTO dirs VALUES (?, ?)', dirs)
+    connection.close()
+    os.rename(tmp_path, path)
+
+    tf.compat.v1.logging.info('Cataloged %d files of %s in %.1f s.',
+                              len(rows), root, time.time() - start_time)
+    return Catalog(path)
+
+
+def load_catalog(root):
+    """The catalog of `root`, built if it does not exist yet or if the tree
+    changed since it was built."""
+    path = catalog_path(root)
+    if os.path.exists(path):
+        data_catalog = Catalog(path)
+        if data_catalog.is_current(root):
+            return data_catalog
+        data_catalog.close()
+        tf.compat.v1.logging.info('%s changed since it was cataloged, '
+                                  'listing it again.', root)
+    return build_catalog(root)
+
+
+def invalidate(root):
+    """Drops the catalog of `root` after files were added or removed."""
+    path = catalog_path(root)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class Catalog(object):
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+
+    def close(self):
+        self._connection.close()
+
+    def is_current(self, root, num_threads=32):
+        """Whether the directories of `root` are unchanged since the catalog
+        was built.
+
+        The mtime of `root` itself changes with the catalog file, so its
+        class directories are compared instead.
+        """
+        try:
+            dirs = self._connection.execute('SELECT path, mtime_ns FROM dirs').fetchall()
+        except sqlite3.OperationalError:
+            # Catalog written before the directory mtimes were stored.
+            return False
+        classes = sorted(e[0] for e in _scan(root)[1] if e[2])
+        if classes != self.classes():
+            return False
+        with futures.ThreadPoolExecutor(num_threads) as executor:
+            mtimes = executor.map(_mtime, [d[0] for d in dirs])
+            return all(mtime == d[1] for d, mtime in zip(dirs, mtimes))
+
+    def classes(self):
+        """Sorted names of the class directories."""
+        rows = self._connection.execute('SELECT name FROM classes ORDER BY name')
+        return [row[0] for row in rows]
+
+    def files(self, split, cls=None):
+        """(class, object, path, size, mtime_ns) of the files of a split,
+        optionally of one class, ordered by class, object and path."""
+        query = 'SELECT class, object, path, size, mtime_ns FROM files WHERE split = ?'
+        args = [split]
+        if cls is not None:
+            query += ' AND class = ?'
+            args.append(cls)
+        query += ' ORDER BY class, object, path'
+        return self._connection.execute(query, args).fetchall()
+
+    def objects(self, split, cls=None):
+        """OrderedDict from (class, object) to the paths of its files."""
+        objects = collections.OrderedDict()
+        for cls, obj, path, _, _ in self.files(split, cls):
+            objects.setdefault((cls, obj), []).append(path)
+        return objects
+
+
+def main(unused_argv):
+    tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.INFO)
+    build_catalog(FLAGS.catalog_dir, FLAGS.catalog_threads)
+
+
+if __name__ == '__main__':
+    flags.mark_flag_as_required('catalog_dir')
+    tf.compat.v1.app.run()
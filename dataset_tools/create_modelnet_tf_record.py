@@ -6,17 +6,15 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-import hashlib
-import io
 import logging
 import os
 import random
 import numpy as np
 
-import PIL.Image
 import tensorflow as tf
 
-from dataset_tools import dataset_util
+from dataset_tools import build_util
+from dataset_tools import catalog
 
 
 # RANDOM_SEED = 8045
@@ -31,140 +29,84 @@ flags.DEFINE_string('output_dir',
 flags.DEFINE_string('dataset_category',
                     'train',
                     'dataset category, train|validate|test')
+flags.DEFINE_boolean('grayscale', False,
+                     'Store single-channel views. Train with --channels=1.')
+flags.DEFINE_integer('target_size', 0,
+                     'Resize views to target_size x target_size when storing '
+                     'them. 0 keeps the rendered size.')
+flags.DEFINE_boolean('crop', False,
+                     'Crop the empty margins around the object in every view.')
+flags.DEFINE_boolean('shared_crop', False,
+                     'With --crop, use one crop box for all views of an object.')
+flags.DEFINE_enum('image_format', 'png', ['png', 'jpeg'],
+                  'Format to store the views in. JPEG records decode faster '
+                  'and can be decoded at 1/2, 1/4 or 1/8 scale.')
+flags.DEFINE_integer('jpeg_quality', 90, 'JPEG quality, 1-95.')
+flags.DEFINE_boolean('mosaic', False,
+                     'Tile the views of an object into one image, decoded with '
+                     'a single call. Views must share one size, see target_size. '
+                     'With --image_format=jpeg, every tile is padded to the JPEG '
+                     'block size (16 pixels, 8 with --grayscale) so that '
+                     'compression artifacts do not bleed between views.')
+flags.DEFINE_boolean('perceptual_hash', True,
+                     'Store a perceptual hash of every view for '
+                     'find_duplicates.py.')
+flags.DEFINE_integer('num_workers', 1,
+                     'Number of processes reading and encoding the views. '
+                     'Examples are written in order by a single writer.')
+flags.DEFINE_integer('num_shards', 1,
+                     'Number of record files to split the objects over. Only '
+                     'the shards whose objects changed since the last build '
+                     'are rewritten.')
 
 FLAGS = flags.FLAGS
 
 _FILE_PATTERN = 'modelnet%d_%dview_%s.record'
 
-filter = ['1','2','4','7','8','10']
 
-
-def get_data_map_dict(label_to_index):
+def get_data_map_dict(label_to_index, data_catalog):
     label_map_dict = {}
     view_map_dict = {}
 
-    cls_lst = os.listdir(FLAGS.dataset_dir)
-    for i, cls in enumerate(cls_lst):
-        if not os.path.isdir(os.path.join(FLAGS.dataset_dir, cls)):
-            continue
-
-        data_path = os.path.join(FLAGS.dataset_dir, cls, FLAGS.dataset_category)
-        img_lst = os.listdir(data_path)
-        for n, img in enumerate(img_lst):
-            img_path = os.path.join(data_path, img)
-            view_lst = os.listdir(img_path)
-            views = []
-            for k, view in enumerate(view_lst):
-                v_path = os.path.join(img_path, view)
-                views.append(v_path)
-            label_map_dict[img] = label_to_index[cls]
-            view_map_dict[img] = views
+    objects = data_catalog.objects(FLAGS.dataset_category)
+    for (cls, img), views in objects.items():
+        label_map_dict[img] = label_to_index[cls]
+        view_map_dict[img] = views
 
     return label_map_dict, view_map_dict
 
 
-def dict_to_tf_example(image,
-                       label_map_dict=None,
-                       view_map_dict=None):
-    """
-    Args:
-      image: a single image name
-      label_map_dict: A map from string label names to integers ids.
-      image_subdirectory: String specifying subdirectory within the
-        PCam dataset directory holding the actual image data.
-
-    Returns:
-      example: The converted tf.Example.
-
-    Raises:
-      ValueError: if the image pointed to by image is not a valid PNG
-    """
-    # full_path = os.path.join(dataset_directory, image_subdirectory, image_name)
-
-    filenames = []
-    sourceids = []
-    encoded_pngs = []
-    widths = []
-    heights = []
-    formats = []
-    labels = []
-    keys = []
-
-    view_lst = view_map_dict[image]
-    label = label_map_dict[image]
-    for i, view_path in enumerate(view_lst):
-        # Make fast training and verifying
-        if view_path.split('/')[-1].split('.')[1] in filter:
-            continue
-
-        filenames.append(view_path.encode('utf8'))
-        sourceids.append(view_path.encode('utf8'))
-        with tf.io.gfile.GFile(view_path, 'rb') as fid:
-            encoded_png = fid.read()
-            encoded_pngs.append(encoded_png)
-        encoded_png_io = io.BytesIO(encoded_png)
-        image = PIL.Image.open(encoded_png_io)
-        width, height = image.size
-        widths.append(width)
-        heights.append(height)
-
-        format = image.format
-        formats.append(format.encode('utf8'))
-        if format!= 'PNG':
-            raise ValueError('Image format not PNG')
-        key = hashlib.sha256(encoded_png).hexdigest()
-        keys.append(key.encode('utf8'))
-        # labels.append(label)
-
-    example = tf.train.Example(features=tf.train.Features(feature={
-        'image/height': dataset_util.int64_list_feature(heights),
-        'image/width': dataset_util.int64_list_feature(widths),
-        'image/filename': dataset_util.bytes_list_feature(filenames),
-        'image/source_id': dataset_util.bytes_list_feature(sourceids),
-        'image/key/sha256': dataset_util.bytes_list_feature(keys),
-        'image/encoded': dataset_util.bytes_list_feature(encoded_pngs),
-        'image/format': dataset_util.bytes_list_feature(formats),
-        'image/label': dataset_util.int64_feature(label),
-        # 'image/text': dataset_util.bytes_feature('label_text'.encode('utf8'))
-    }))
-    return example
+def example_kwargs():
+    """Options of view_example.dict_to_tf_example set by the flags."""
+    return dict(grayscale=FLAGS.grayscale,
+                target_size=FLAGS.target_size or None,
+                crop=FLAGS.crop,
+                shared_crop=FLAGS.shared_crop,
+                image_format=FLAGS.image_format,
+                jpeg_quality=FLAGS.jpeg_quality,
+                mosaic=FLAGS.mosaic,
+                perceptual_hash=FLAGS.perceptual_hash)
 
 
 def main(_):
     tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.INFO)
 
-    dataset_lst = os.listdir(FLAGS.dataset_dir)
-    dataset_lst.sort()
-
-    tfrecord_name = os.path.join(FLAGS.output_dir, _FILE_PATTERN %
-                                 (len(dataset_lst), 12-len(filter), FLAGS.dataset_category))
-    options = tf.io.TFRecordOptions(tf.compat.v1.io.TFRecordCompressionType.GZIP)
-    writer = tf.io.TFRecordWriter(tfrecord_name, options=options)
+    data_catalog = catalog.load_catalog(FLAGS.dataset_dir)
+    dataset_lst = data_catalog.classes()
+    label_to_index = {cls: i for i, cls in enumerate(dataset_lst)}
 
-    # dataset_lst = os.listdir(FLAGS.dataset_dir)
-    # dataset_lst.sort()
-    label_to_index = {}
-    for i, cls in enumerate(dataset_lst):
-        cls_path = os.path.join(FLAGS.dataset_dir, cls)
-        if os.path.isdir(cls_path):
-            label_to_index[cls] = i
+    label_map_dict, view_map_dict = get_data_map_dict(label_to_index, data_catalog)
 
-    label_map_dict, view_map_dict = get_data_map_dict(label_to_index)
+    num_views = max(len(views) for views in view_map_dict.values())
+    tfrecord_name = os.path.join(FLAGS.output_dir, _FILE_PATTERN %
+                                 (len(dataset_lst), num_views, FLAGS.dataset_category))
 
     tf.compat.v1.logging.info('Reading from modelnet dataset.')
-    cls_lst = os.listdir(FLAGS.dataset_dir)
-    for i, label in enumerate(cls_lst):
-        data_path = os.path.join(FLAGS.dataset_dir, label, FLAGS.dataset_category)
-        if not os.path.isdir(data_path):
-            continue
-        img_lst = os.listdir(data_path)
-        for idx, image in enumerate(img_lst):
-            if idx % 100 == 0:
-                tf.compat.v1.logging.info('On image %d of %d', idx, len(img_lst))
-            tf_example = dict_to_tf_example(image, label_map_dict, view_map_dict)
-            writer.write(tf_example.SerializeToString())
-
-    writer.close()
+    tasks = [(image, label_map_dict[image], view_map_dict[image])
+             for image in label_map_dict]
+
+    build_util.build_records(tfrecord_name, tasks, FLAGS.num_shards,
+                             FLAGS.num_workers, **example_kwargs())
 
 
 if __name__ == '__main__':
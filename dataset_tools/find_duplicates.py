@@ -0,0 +1,269 @@
+"""
+Finds near-duplicate objects within and across modelnet record files.
+
+Every view is summarized by its 64-bit difference hash ('image/phash', written
+by the record builders; computed from 'image/encoded' for older records).
+Two objects are near-duplicates when at least --min_matching_views of their
+views, compared view by view, are within --max_distance bits.
+
+Candidates are found with a multi-index: the hashes are split into
+max_distance + 1 blocks, and any two hashes within max_distance bits agree
+exactly on at least one block. Two objects matching on m of their V views
+match on at least one of any V - m + 1 views, so only those views are
+indexed. Only objects sharing a block value on an indexed view are compared,
+with the Hamming distances of all their views computed by NumPy bit
+operations.
+
+Duplicates are reported per split and across splits. With --output_dir, the
+records are copied without the duplicates: every group of near-duplicates
+keeps only its first object, in the order of --record_paths, so list the
+split to keep intact (e.g. test) first.
+
+    python -m dataset_tools.find_duplicates \
+        --record_paths=modelnet40_12view_test.record,modelnet40_12view_train.record
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import io
+import os
+import time
+
+import numpy as np
+import PIL.Image
+import tensorflow as tf
+
+from dataset_tools import image_util
+from dataset_tools import record_index
+
+
+flags = tf.compat.v1.app.flags
+flags.DEFINE_string('record_paths', None,
+                    'Comma-separated record files, one per split.')
+flags.DEFINE_integer('max_distance', 3,
+                     'Largest Hamming distance between two matching views.')
+flags.DEFINE_integer('min_matching_views', 0,
+                     'Views that must match for two objects to be duplicates, '
+                     '0 for all views.')
+flags.DEFINE_integer('max_bucket', 1000,
+                     'Block values shared by more objects than this, e.g. of '
+                     'empty views, are not used to find candidates.')
+flags.DEFINE_string('output_dir', None,
+                    'If set, write the records without the duplicates here.')
+
+FLAGS = flags.FLAGS
+
+# Set bits of every byte value.
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def object_name(example):
+    """Name of the object of an example, e.g. 'chair_0001.off'."""
+    filename = example.features.feature['image/filename'].bytes_list.value[0]
+    return os.path.basename(os.path.dirname(filename.decode('utf8')))
+
+
+def view_hashes(example):
+    """uint64 perceptual hashes of the views of a parsed tf.Example."""
+    feature = example.features.feature
+    if 'image/phash' in feature:
+        return np.array(feature['image/phash'].int64_list.value,
+                        dtype=np.int64).view(np.uint64)
+    if 'image/encoded' not in feature:
+        raise ValueError('%s has no image/phash, rebuild its record with '
+                         '--perceptual_hash' % object_name(example))
+    return np.array([image_util.dhash(PIL.Image.open(io.BytesIO(encoded)))
+                     for encoded in feature['image/encoded'].bytes_list.value],
+                    dtype=np.uint64)
+
+
+def read_hashes(record_paths):
+    """Reads the view hashes of every object in `record_paths`.
+
+    Returns:
+      (hashes, names, splits): [num_objects, num_views] uint64 hashes, the
+      object names and the index in `record_paths` of every object.
+    """
+    hashes = []
+    names = []
+    splits = []
+    options = tf.io.TFRecordOptions('GZIP')
+    for split, record_path in enumerate(record_paths):
+        for path in record_index.record_files(record_path):
+            for serialized in tf.compat.v1.io.tf_record_iterator(path, options):
+                example = tf.train.Example.FromString(serialized)
+                hashes.append(view_hashes(example))
+                names.append(object_name(example))
+                splits.append(split)
+
+    if len(set(len(h) for h in hashes)) > 1:
+        raise ValueError('Records hold objects with different numbers of views.')
+    return np.stack(hashes), names, np.array(splits)
+
+
+def hamming_distance(a, b):
+    """Bitwise Hamming distance between two uint64 arrays of equal shape."""
+    x = np.ascontiguousarray(np.bitwise_xor(a, b))
+    return _POPCOUNT[x.view(np.uint8)].reshape(x.shape + (8,)).sum(axis=-1)
+
+
+def hash_blocks(hashes, num_blocks):
+    """Splits the 64-bit hashes into `num_blocks` blocks of about equal bits.
+
+    Returns:
+      [num_blocks] + hashes.shape array with the value of every block.
+    """
+    bounds = np.linspace(0, 64, num_blocks + 1).astype(np.uint64)
+    blocks = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        mask = np.uint64((1 << int(hi - lo)) - 1)
+        blocks.append((hashes >> lo) & mask)
+    return np.stack(blocks)
+
+
+def candidate_pairs(hashes, max_distance, max_bucket):
+    """Pairs (i, j), i < j, of objects sharing a block value on some view."""
+    num_objects, num_views = hashes.shape
+    num_blocks = max_distance + 1
+    if num_blocks > 64:
+        raise ValueError('max_distance must be below 64, got %d' % max_distance)
+    blocks = hash_blocks(hashes, num_blocks)
+
+    # One key per (block, view, block value); objects with equal keys are
+    # candidates.
+    block_ids = np.arange(num_blocks, dtype=np.uint64)[:, None, None]
+    view_ids = np.arange(num_views, dtype=np.uint64)[None, None, :]
+    keys = np.stack([np.broadcast_to(block_ids, blocks.shape),
+                     np.broadcast_to(view_ids, blocks.shape),
+                     blocks], axis=-1).reshape(-1, 3)
+    objects = np.broadcast_to(np.arange(num_objects)[None, :, None],
+                              blocks.shape).reshape(-1)
+
+    order = np.lexsort(keys.T[::-1])
+    keys = keys[order]
+    objects = objects[order]
+    starts = np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1
+    starts = np.concatenate([[0], starts, [len(keys)]])
+    sizes = np.diff(starts)
+
+    # Most shared values are shared by two objects only.
+    pair_starts = starts[:-1][sizes == 2]
+    pairs = [np.stack([objects[pair_starts], objects[pair_starts + 1]], axis=1)]
+    skipped = np.sum(sizes > max_bucket)
+    for k in np.flatnonzero((sizes > 2) & (sizes <= max_bucket)):
+        members = objects[starts[k]:starts[k + 1]]
+        i, j = np.triu_indices(sizes[k], 1)
+        pairs.append(np.stack([members[i], members[j]], axis=1))
+    if skipped:
+        tf.compat.v1.logging.info('Skipped %d block values shared by more than '
+                                  '%d objects.', skipped, max_bucket)
+    pairs = np.concatenate(pairs)
+    pairs = np.sort(pairs, axis=1)
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    return np.unique(pairs, axis=0)
+
+
+def duplicate_pairs(hashes, max_distance=3, min_matching_views=0,
+                    max_bucket=1000, chunk_size=1 << 20):
+    """Pairs (i, j) of near-duplicate objects, see the module docstring."""
+    num_views = hashes.shape[1]
+    min_matching_views = min(min_matching_views or num_views, num_views)
+    indexed_views = num_views - min_matching_views + 1
+    candidates = candidate_pairs(hashes[:, :indexed_views], max_distance,
+                                 max_bucket)
+
+    matches = []
+    for start in range(0, len(candidates), chunk_size):
+        pairs = candidates[start:start + chunk_size]
+        distances = hamming_distance(hashes[pairs[:, 0]], hashes[pairs[:, 1]])
+        matching_views = np.sum(distances <= max_distance, axis=1)
+        matches.append(pairs[matching_views >= min_matching_views])
+
+    tf.compat.v1.logging.info('%d candidate pairs, %d near-duplicates.',
+                              len(candidates), sum(len(m) for m in matches))
+    if not matches:
+        return candidates
+    return np.concatenate(matches)
+
+
+def duplicate_groups(num_objects, pairs):
+    """Group id of every object; near-duplicates share the id of the first
+    object of their group."""
+    parent = np.arange(num_objects)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in pairs:
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+    return np.array([find(i) for i in range(num_objects)])
+
+
+def write_deduplicated(record_paths, keep, output_dir):
+    """Copies `record_paths` into `output_dir` with only the objects in `keep`."""
+    options = tf.io.TFRecordOptions('GZIP')
+    index = 0
+    for record_path in record_paths:
+        for path in record_index.record_files(record_path):
+            writer = record_index.RecordIndexWriter(
+                os.path.join(output_dir, os.path.basename(path)), compression='GZIP')
+            for serialized in tf.compat.v1.io.tf_record_iterator(path, options):
+                if keep[index]:
+                    feature = tf.train.Example.FromString(serialized).features.feature
+                    writer.write(serialized, feature['image/label'].int64_list.value[0],
+                                 len(feature['image/filename'].bytes_list.value))
+                index += 1
+            writer.close()
+
+
+def main(unused_argv):
+    tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.INFO)
+
+    record_paths = FLAGS.record_paths.split(',')
+    start_time = time.time()
+    hashes, names, splits = read_hashes(record_paths)
+    tf.compat.v1.logging.info('Read %d objects x %d views in %.1f s.',
+                              hashes.shape[0], hashes.shape[1],
+                              time.time() - start_time)
+
+    start_time = time.time()
+    pairs = duplicate_pairs(hashes, FLAGS.max_distance,
+                            FLAGS.min_matching_views, FLAGS.max_bucket)
+    groups = duplicate_groups(len(names), pairs)
+    keep = groups == np.arange(len(names))
+    tf.compat.v1.logging.info('Matched in %.1f s.', time.time() - start_time)
+
+    split_pairs = collections.Counter()
+    for i, j in pairs:
+        split_pairs[splits[i], splits[j]] += 1
+        tf.compat.v1.logging.info('%s (%s) ~ %s (%s)', names[i],
+                                  record_paths[splits[i]], names[j],
+                                  record_paths[splits[j]])
+    for (a, b), count in sorted(split_pairs.items()):
+        if a == b:
+            tf.compat.v1.logging.info('%d near-duplicate pairs within %s.',
+                                      count, record_paths[a])
+        else:
+            tf.compat.v1.logging.info('%d near-duplicate pairs across %s and %s.',
+                                      count, record_paths[a], record_paths[b])
+    for split, record_path in enumerate(record_paths):
+        dropped = np.sum(~keep & (splits == split))
+        tf.compat.v1.logging.info('%s: %d of %d objects are duplicates.',
+                                  record_path, dropped, np.sum(splits == split))
+
+    if FLAGS.output_dir:
+        if not tf.io.gfile.exists(FLAGS.output_dir):
+            tf.io.gfile.makedirs(FLAGS.output_dir)
+        write_deduplicated(record_paths, keep, FLAGS.output_dir)
+
+
+if __name__ == '__main__':
+    tf.compat.v1.app.run()
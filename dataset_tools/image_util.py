@@ -0,0 +1,190 @@
+"""Image transforms applied to the rendered views before they are stored."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import io
+import math
+import struct
+import zlib
+
+import numpy as np
+import PIL.Image
+import PIL.ImageOps
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def png_size(encoded):
+    """(width, height) of a PNG read from its IHDR chunk, without decoding.
+
+    Raises:
+      ValueError: if `encoded` does not start with a valid PNG signature and
+        IHDR chunk.
+    """
+    if encoded[:8] != PNG_SIGNATURE:
+        raise ValueError('Image format not PNG')
+    # Signature, then the IHDR chunk: length, type, 13 data bytes and CRC.
+    if len(encoded) < 33:
+        raise ValueError('Truncated PNG header')
+    length, chunk_type = struct.unpack('>I4s', encoded[8:16])
+    if chunk_type != b'IHDR' or length != 13:
+        raise ValueError('PNG does not start with an IHDR chunk')
+    crc, = struct.unpack('>I', encoded[29:33])
+    if zlib.crc32(encoded[12:29]) & 0xffffffff != crc:
+        raise ValueError('PNG IHDR chunk fails its CRC check')
+    width, height = struct.unpack('>II', encoded[16:24])
+    return width, height
+
+
+def dhash(image, hash_size=8):
+    """64-bit difference hash of a view, as an int in [0, 2**64).
+
+    Each bit tells whether a pixel of the hash_size x hash_size grayscale
+    thumbnail is brighter than its right neighbour, so near-identical
+    renders differ in only a few bits.
+    """
+    thumbnail = image.convert('L').resize((hash_size + 1, hash_size), PIL.Image.BOX)
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    bits = np.packbits(pixels[:, 1:] > pixels[:, :-1])
+    return int.from_bytes(bits.tobytes(), 'big')
+
+
+def foreground_box(image):
+    """Bounding box (left, top, right, bottom) of the rendered object.
+
+    Renders are saved with a transparent background, so the alpha channel is
+    used when present; otherwise every non-white pixel is foreground.
+    """
+    if 'A' in image.getbands():
+        box = image.getchannel('A').getbbox()
+    else:
+        box = PIL.ImageOps.invert(image.convert('L')).getbbox()
+    return box or (0, 0) + image.size
+
+
+def union_box(boxes):
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def square_box(box, image_size, margin=0.05):
+    """Grows `box` to a square with a relative `margin`, kept inside the image
+    so that no padding pixels are introduced."""
+    width, height = image_size
+    side = max(box[2] - box[0], box[3] - box[1]) * (1. + 2 * margin)
+    side = int(round(min(side, width, height)))
+    left = (box[0] + box[2] - side) // 2
+    top = (box[1] + box[3] - side) // 2
+    left = max(0, min(left, width - side))
+    top = max(0, min(top, height - side))
+    return left, top, left + side, top + side
+
+
+def mosaic_grid(num_views):
+    """(rows, cols) of the near-square grid the views are tiled in."""
+    cols = int(math.ceil(math.sqrt(num_views)))
+    rows = int(math.ceil(num_views / cols))
+    return rows, cols
+
+
+def jpeg_block(grayscale=False):
+    """Side of the pixel blocks JPEG encodes together: 8, or 16 for color
+    images, whose chroma PIL subsamples 2x2 by default."""
+    return 8 if grayscale else 16
+
+
+def tile_views(images, block=1):
+    """Tiles equally sized views row by row into one atlas image.
+
+    Every tile is padded to a multiple of `block` pixels by repeating the
+    view's edge pixels, so that with the JPEG block size no block spans two
+    views and no compression artifacts bleed between them.
+    """
+    sizes = set(image.size for image in images)
+    if len(sizes) != 1:
+        raise ValueError('Views of different sizes %s cannot be tiled, '
+                         'use a target size.' % sorted(sizes))
+    width, height = sizes.pop()
+    tile_w = -(-width // block) * block
+    tile_h = -(-height // block) * block
+    rows, cols = mosaic_grid(len(images))
+    atlas = PIL.Image.new(images[0].mode, (cols * tile_w, rows * tile_h))
+    for i, image in enumerate(images):
+        if (tile_w, tile_h) != (width, height):
+            pixels = np.asarray(image)
+            pad = [(0, tile_h - height), (0, tile_w - width)] + \
+                [(0, 0)] * (pixels.ndim - 2)
+            image = PIL.Image.fromarray(np.pad(pixels, pad, mode='edge'))
+        atlas.paste(image, ((i % cols) * tile_w, (i // cols) * tile_h))
+    return atlas
+
+
+def transform_views(encoded_pngs, target_size=None, crop=False,
+                    shared_crop=False, grayscale=False, image_format='png',
+                    jpeg_quality=90, mosaic=False):
+    """Crops, resizes and re-encodes the views of one object.
+
+    Args:
+      encoded_pngs: list of PNG encoded views.
+      target_size: if set, views are resized to target_size x target_size.
+      crop: whether to crop each view to a square around the object.
+      shared_crop: use one crop box, the union over all views, for every view
+        so the relative object scale between views is kept.
+      grayscale: whether to store single-channel (mode 'L') views. The alpha
+        channel is dropped, as `decode_png(..., channels=3)` does.
+      image_format: 'png' or 'jpeg', the format the views are stored in.
+      jpeg_quality: JPEG quality, 1-95.
+      mosaic: whether to tile all views into one atlas image, see tile_views.
+        JPEG atlases pad every tile to the JPEG block size.
+
+    Returns:
+      (encoded_views, source_sizes, crop_boxes) with the (width, height) of the
+      source views and the (left, top, right, bottom) box taken from each.
+      With `mosaic`, `encoded_views` holds the single encoded atlas.
+    """
+    if not (crop or target_size or grayscale or mosaic or image_format == 'jpeg'):
+        source_sizes = [png_size(png) for png in encoded_pngs]
+        crop_boxes = [(0, 0) + size for size in source_sizes]
+        return list(encoded_pngs), source_sizes, crop_boxes
+
+    images = [PIL.Image.open(io.BytesIO(png)) for png in encoded_pngs]
+    source_sizes = [image.size for image in images]
+
+    if crop:
+        boxes = [foreground_box(image) for image in images]
+        if shared_crop:
+            boxes = [union_box(boxes)] * len(boxes)
+        crop_boxes = [square_box(box, image.size)
+                      for box, image in zip(boxes, images)]
+    else:
+        crop_boxes = [(0, 0) + image.size for image in images]
+
+    outputs = []
+    for image, box in zip(images, crop_boxes):
+        if crop:
+            image = image.crop(box)
+        if target_size:
+            image = image.resize((target_size, target_size), PIL.Image.LANCZOS)
+        if grayscale:
+            image = image.convert('RGB').convert('L')
+        outputs.append(image)
+
+    if mosaic:
+        block = jpeg_block(grayscale) if image_format == 'jpeg' else 1
+        outputs = [tile_views(outputs, block)]
+
+    return ([encode(image, image_format, jpeg_quality) for image in outputs],
+            source_sizes, crop_boxes)
+
+
+def encode(image, image_format='png', jpeg_quality=90):
+    output = io.BytesIO()
+    if image_format == 'jpeg':
+        # JPEG has no alpha channel; drop it like the PNG readers do.
+        if image.mode not in ('L', 'RGB'):
+            image = image.convert('RGB')
+        image.save(output, format='JPEG', quality=jpeg_quality)
+    else:
+        image.save(output, format='PNG')
+    return output.getvalue()
@@ -0,0 +1,199 @@
+"""
+Content manifest for incremental, resumable record builds.
+
+The record builders keep `<record>.manifest` next to the record file(s). It
+maps every object to its label, output shard and the SHA-256 of its source
+views, and lists the shards that were completely written. A rebuild only
+re-encodes the shards whose objects were added, removed or changed; the
+other shards are reused as they are. Shards are written to a temporary file
+and renamed once complete, so an interrupted build never leaves a partial
+record behind and resumes from the last completed shard.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import hashlib
+import json
+import os
+
+import tensorflow as tf
+
+from dataset_tools import record_index
+
+
+MANIFEST_SUFFIX = '.manifest'
+
+
+def manifest_path(record_path):
+    return record_path + MANIFEST_SUFFIX
+
+
+def shard_paths(record_path, num_shards):
+    """Output files of a record split into `num_shards` shards."""
+    if num_shards == 1:
+        return [record_path]
+    return ['%s-%05d-of-%05d' % (record_path, i, num_shards)
+            for i in range(num_shards)]
+
+
+def shard_of(image, num_shards):
+    """Shard of an object, stable across builds so that adding objects only
+    touches the shards they fall in."""
+    return int(hashlib.sha1(image.encode('utf8')).hexdigest()[:8], 16) % num_shards
+
+
+def file_sha256(path):
+    sha = hashlib.sha256()
+    with tf.io.gfile.GFile(path, 'rb') as f:
+        sha.update(f.read())
+    return sha.hexdigest()
+
+
+def hash_views(entries, map_fn=map):
+    """Fills in the missing sha256 of view_entries() `entries`, hashing the
+    files with `map_fn`, e.g. the imap of a multiprocessing pool."""
+    missing = [entry for entry in entries if entry[3] is None]
+    for entry, sha in zip(missing, map_fn(file_sha256, [e[0] for e in missing])):
+        entry[3] = sha
+
+
+class Manifest(object):
+    """Manifest of the record file `record_path` built with `options`.
+
+    A manifest written with different options (e.g. another image format or
+    shard count) is discarded, so that every shard is rebuilt.
+    """
+
+    def __init__(self, record_path, options):
+        self.path = manifest_path(record_path)
+        self.options = options
+        self.objects = {}
+        self.shards = {}
+        # Per-channel pixel statistics written by utils/channel_stats.py.
+        self.stats = None
+        # Per-view discrimination ranking written by prune_views.py.
+        self.view_ranking = None
+        # Shards of a build with other options, not overwritten by this one.
+        self.stale_shards = []
+        # Path -> [path, size, mtime_ns, sha256] of the views of the last
+        # build, looked up by view_entries().
+        self._known_views = {}
+
+        if tf.io.gfile.exists(self.path):
+            with tf.io.gfile.GFile(self.path, 'r') as f:
+                manifest = json.load(f)
+            if manifest.get('options') == options:
+                self.objects = manifest['objects']
+                self.shards = manifest['shards']
+                self.stats = manifest.get('stats')
+                self.view_ranking = manifest.get('view_ranking')
+                self._known_views = {view[0]: view
+                                     for entry in self.objects.values()
+                                     for view in entry['views']}
+            else:
+                tf.compat.v1.logging.info('Build options changed, rebuilding '
+                                          'every shard of %s', record_path)
+                self.stale_shards = list(manifest.get('shards', []))
+
+    def view_entries(self, views):
+        """[path, size, mtime_ns, sha256] of every view.
+
+        Views whose size and mtime match the manifest keep their recorded
+        hash. The hash of new or modified files is None, for hash_views() to
+        fill in, so that they can all be hashed in parallel.
+        """
+        entries = []
+        for path in sorted(views):
+            stat = os.stat(path)
+            view = self._known_views.get(path)
+            if view is None or view[1:3] != [stat.st_size, stat.st_mtime_ns]:
+                view = [path, stat.st_size, stat.st_mtime_ns, None]
+            entries.append(list(view))
+        return entries
+
+    def is_current(self, shard_path, objects):
+        """Whether `shard_path` was completely written with exactly `objects`,
+        a dict from object to its {'label', 'views'} entry."""
+        if sorted(self.shards.get(os.path.basename(shard_path), [])) != sorted(objects):
+            return False
+        if not (tf.io.gfile.exists(shard_path) and
+                tf.io.gfile.exists(record_index.index_path(shard_path))):
+            return False
+        for image, entry in objects.items():
+            known = self.objects.get(image)
+            if known is None or known['label'] != entry['label']:
+                return False
+            if [v[3] for v in known['views']] != [v[3] for v in entry['views']]:
+                return False
+        return True
+
+    def complete_shard(self, shard_path, objects):
+        """Records `objects` as written to `shard_path` and saves the manifest."""
+        self.shards[os.path.basename(shard_path)] = sorted(objects)
+        # The statistics no longer describe the rewritten records.
+        self.stats = None
+        self.view_ranking = None
+        self.objects.update(objects)
+        self.save()
+
+    def prune(self, images):
+        """Drops the objects that are no longer in the dataset."""
+        images = set(images)
+        self.objects = {image: entry for image, entry in self.objects.items()
+                        if image in images}
+
+    def save(self):
+        manifest = {'options': self.options,
+                    'shards': self.shards,
+                    'objects': self.objects}
+        if self.stats is not None:
+            manifest['stats'] = self.stats
+        if self.view_ranking is not None:
+            manifest['view_ranking'] = self.view_ranking
+        tmp_path = self.path + '.tmp'
+        with tf.io.gfile.GFile(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        tf.io.gfile.rename(tmp_path, self.path, overwrite=True)
+
+
+def _read(path):
+    if not tf.io.gfile.exists(path):
+        return {}
+    with tf.io.gfile.GFile(path, 'r') as f:
+        return json.load(f)
+
+
+def _write(record_path, key, value):
+    """Stores `value` under `key` in the manifest of `record_path`, creating a
+    manifest if the records were built without one."""
+    path = manifest_path(record_path)
+    manifest = _read(path)
+    manifest[key] = value
+    tmp_path = path + '.tmp'
+    with tf.io.gfile.GFile(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    tf.io.gfile.rename(tmp_path, path, overwrite=True)
+
+
+def load_stats(record_path):
+    """Pixel statistics stored for `record_path`, None if there are none."""
+    return _read(manifest_path(record_path)).get('stats')
+
+
+def write_stats(record_path, stats):
+    """Stores pixel statistics in the manifest of `record_path`."""
+    _write(record_path, 'stats', stats)
+
+
+def load_view_ranking(record_path):
+    """View ranking stored for `record_path` by prune_views.py, None if there
+    is none."""
+    return _read(manifest_path(record_path)).get('view_ranking')
+
+
+def write_view_ranking(record_path, ranking):
+    """Stores the view ranking of prune_views.py in the manifest of
+    `record_path`."""
+    _write(record_path, 'view_ranking', ranking)
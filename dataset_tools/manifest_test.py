@@ -0,0 +1,156 @@
+"""Tests for dataset_tools.manifest and the shard reuse of build_util."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import PIL.Image
+import tensorflow as tf
+
+from dataset_tools import build_util
+from dataset_tools import manifest
+
+
+class ManifestTest(tf.test.TestCase):
+
+    def setUp(self):
+        super(ManifestTest, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.record_path = os.path.join(self.root, 'modelnet2_2view_train.record')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        super(ManifestTest, self).tearDown()
+
+    def _write_view(self, obj, view, value):
+        directory = os.path.join(self.root, 'views', obj)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        path = os.path.join(directory, '%s.off.%d.png' % (obj, view))
+        PIL.Image.fromarray(np.full((8, 8, 3), value, np.uint8)).save(path)
+        return path
+
+    def _tasks(self, num_objects=6):
+        return [('obj%d' % i, i % 2, [self._write_view('obj%d' % i, v, i * 10 + v)
+                                      for v in range(2)])
+                for i in range(num_objects)]
+
+    def _shard_mtimes(self, shard_paths):
+        return [os.stat(path).st_mtime_ns for path in shard_paths]
+
+    def test_hash_views_fills_in_sha256(self):
+        path = self._write_view('obj0', 0, 7)
+        with open(path, 'rb') as f:
+            expected = hashlib.sha256(f.read()).hexdigest()
+
+        entries = manifest.Manifest(self.record_path, {}).view_entries([path])
+        self.assertIsNone(entries[0][3])
+        manifest.hash_views(entries)
+        self.assertEqual(entries[0][3], expected)
+
+        again = manifest.Manifest(self.record_path, {}).view_entries([path])
+        manifest.hash_views(again)
+        self.assertEqual(again, entries)
+
+    def test_known_views_are_not_hashed_again(self):
+        tasks = self._tasks(2)
+        build_util.build_records(self.record_path, tasks)
+
+        hashed = []
+
+        def _map(fn, paths):
+            hashed.extend(paths)
+            return map(fn, paths)
+
+        reloaded = manifest.Manifest(self.record_path, {'num_shards': 1})
+        entries = reloaded.view_entries(tasks[0][2])
+        manifest.hash_views(entries, _map)
+        self.assertEqual(hashed, [])
+        self.assertEqual(entries, reloaded.objects['obj0']['views'])
+
+    def test_rebuild_reuses_unchanged_shards(self):
+        tasks = self._tasks()
+        shard_paths = build_util.build_records(self.record_path, tasks,
+                                               num_shards=3)
+        mtimes = self._shard_mtimes(shard_paths)
+
+        build_util.build_records(self.record_path, tasks, num_shards=3)
+        self.assertEqual(self._shard_mtimes(shard_paths), mtimes)
+
+    def test_rebuild_rewrites_only_changed_shard(self):
+        tasks = self._tasks()
+        shard_paths = build_util.build_records(self.record_path, tasks,
+                                               num_shards=3)
+        mtimes = self._shard_mtimes(shard_paths)
+
+        self._write_view('obj1', 0, 255)
+        build_util.build_records(self.record_path, tasks, num_shards=3)
+        changed = manifest.shard_of('obj1', 3)
+        for i, mtime in enumerate(self._shard_mtimes(shard_paths)):
+            if i == changed:
+                self.assertNotEqual(mtime, mtimes[i])
+            else:
+                self.assertEqual(mtime, mtimes[i])
+
+    def test_is_current_requires_matching_entry(self):
+        tasks = self._tasks(2)
+        shard_path, = build_util.build_records(self.record_path, tasks)
+        built = manifest.Manifest(self.record_path, {'num_shards': 1})
+        objects = dict(built.objects)
+        self.assertTrue(built.is_current(shard_path, objects))
+
+        relabeled = dict(objects, obj0=dict(objects['obj0'], label=1))
+        self.assertFalse(built.is_current(shard_path, relabeled))
+
+        views = [list(v) for v in objects['obj0']['views']]
+        views[0][3] = '0' * 64
+        rehashed = dict(objects, obj0=dict(objects['obj0'], views=views))
+        self.assertFalse(built.is_current(shard_path, rehashed))
+
+        removed = {'obj0': objects['obj0']}
+        self.assertFalse(built.is_current(shard_path, removed))
+
+    def test_changed_options_rebuild_every_shard(self):
+        tasks = self._tasks(2)
+        build_util.build_records(self.record_path, tasks)
+        rebuilt = manifest.Manifest(self.record_path,
+                                    {'num_shards': 1, 'grayscale': True})
+        self.assertEqual(rebuilt.objects, {})
+        self.assertEqual(rebuilt.stale_shards,
+                         [os.path.basename(self.record_path)])
+
+    def test_stats_round_trip(self):
+        self.assertIsNone(manifest.load_stats(self.record_path))
+        stats = {'mean': [0.1, 0.2, 0.3], 'std': [0.4, 0.5, 0.6]}
+        manifest.write_stats(self.record_path, stats)
+        self.assertEqual(manifest.load_stats(self.record_path), stats)
+
+    def test_view_ranking_round_trip(self):
+        self.assertIsNone(manifest.load_view_ranking(self.record_path))
+        ranking = {'top_k': 2, 'canonical_subset': [0, 3],
+                   'mean_score': [0.5, 0.1, 0.2, 0.9]}
+        manifest.write_view_ranking(self.record_path, ranking)
+        manifest.write_stats(self.record_path, {'mean': [0.5]})
+        self.assertEqual(manifest.load_view_ranking(self.record_path), ranking)
+        self.assertEqual(manifest.load_stats(self.record_path), {'mean': [0.5]})
+
+    def test_stats_survive_reuse_and_clear_on_rewrite(self):
+        tasks = self._tasks(2)
+        build_util.build_records(self.record_path, tasks)
+        manifest.write_stats(self.record_path, {'mean': [0.5]})
+
+        build_util.build_records(self.record_path, tasks)
+        self.assertEqual(manifest.load_stats(self.record_path), {'mean': [0.5]})
+
+        self._write_view('obj0', 0, 255)
+        build_util.build_records(self.record_path, tasks)
+        self.assertIsNone(manifest.load_stats(self.record_path))
+
+
+if __name__ == '__main__':
+    tf.test.main()
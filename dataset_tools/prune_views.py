@@ -0,0 +1,232 @@
+"""
+Ranks the views of modelnet records with a trained GVCNN and prunes the
+records to the most discriminative views.
+
+Every object of the record is run through the score path of nets/model.py
+gvcnn, the view discrimination scores that drive its grouping, one object
+per batch since gvcnn averages the scores over the batch. The views are
+ranked by their mean score over the dataset and by how often they are among
+the --top_k views of their object; the ranking is logged and stored in the
+manifest of the record, with the canonical subset: the --top_k view indices
+of highest mean score, e.g. for train.py/eval.py --view_subset.
+
+With --output_dir, the records are copied keeping --top_k views of every
+object, either the canonical subset (--subset=canonical) or the best views
+of each object (--subset=per_object), so that later training and inference
+decode fewer views. Read them with --num_views=<top_k>; 'image/view_index'
+keeps the original index of every view.
+
+    python -m dataset_tools.prune_views \
+        --record_path=modelnet10_12view_train.record --checkpoint_path=models \
+        --num_views=12 --top_k=6 --output_dir=pruned
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import val_data
+from dataset_tools import manifest
+from dataset_tools import record_index
+from nets import model
+
+
+flags = tf.compat.v1.app.flags
+flags.DEFINE_string('record_path', None, 'Record file to rank and prune.')
+flags.DEFINE_string('checkpoint_path',
+                    os.getcwd() + '/models',
+                    'Directory or file of the GVCNN checkpoint.')
+flags.DEFINE_integer('num_views', 12, 'Number of views stored per object.')
+flags.DEFINE_integer('height', 299, 'height')
+flags.DEFINE_integer('width', 299, 'width')
+flags.DEFINE_integer('channels', 3,
+                     'Channels to decode, 1 for records written with --grayscale.')
+flags.DEFINE_boolean('mosaic', False,
+                     'Whether the records were written with --mosaic. Mosaic '
+                     'records can be ranked but not pruned.')
+flags.DEFINE_string('stats_record', None,
+                    'Training record whose manifest holds the channel stats '
+                    'the model was trained with (train.py --normalize_stats).')
+flags.DEFINE_string('labels',
+                    'airplane,bed,bookshelf,toilet,vase',
+                    'number of classes')
+flags.DEFINE_integer('num_group', 10, 'number of group')
+flags.DEFINE_integer('top_k', 6, 'Number of views to keep per object.')
+flags.DEFINE_enum('subset', 'canonical', ['canonical', 'per_object'],
+                  'Keep the same top_k view indices for every object, or the '
+                  'top_k views of each object.')
+flags.DEFINE_string('output_dir', None,
+                    'If set, write the pruned records here.')
+
+FLAGS = flags.FLAGS
+
+# Features with one value per view, or 4 for 'image/crop_box'.
+_VIEW_FEATURES = ['image/encoded', 'image/filename', 'image/source_id',
+                  'image/key/sha256', 'image/format', 'image/height',
+                  'image/width', 'image/source_height', 'image/source_width',
+                  'image/crop_box', 'image/view_index', 'image/phash']
+
+
+def _values(feature):
+    return feature.bytes_list.value if feature.HasField('bytes_list') \
+        else feature.int64_list.value
+
+
+def prune_example(serialized, positions):
+    """Serialized copy of an example holding only the views at `positions`.
+
+    Raises:
+      ValueError: for a --mosaic example, whose views are tiled together.
+    """
+    example = tf.train.Example.FromString(serialized)
+    feature = example.features.feature
+    if 'image/mosaic/encoded' in feature:
+        raise ValueError('Mosaic records cannot be pruned.')
+    num_views = len(feature['image/encoded'].bytes_list.value)
+    if 'image/view_index' not in feature:
+        feature['image/view_index'].int64_list.value.extend(range(num_views))
+
+    for key in _VIEW_FEATURES:
+        if key not in feature:
+            continue
+        values = _values(feature[key])
+        per_view = len(values) // num_views
+        kept = [v for p in positions for v in values[p * per_view:(p + 1) * per_view]]
+        del values[:]
+        values.extend(kept)
+    return example.SerializeToString()
+
+
+def view_scores(record_files, num_classes, stats=None):
+    """[num_objects, num_views] discrimination scores, in record order."""
+    with tf.Graph().as_default():
+        # Only used for its decode() and normalize().
+        reader = val_data.Dataset(record_files,
+                                  FLAGS.num_views,
+                                  FLAGS.height,
+                                  FLAGS.width,
+                                  channels=FLAGS.channels,
+                                  mosaic=FLAGS.mosaic,
+                                  stats=stats)
+        # Read in order, one file after the other, to match the copies.
+        dataset = tf.data.TFRecordDataset(record_files, compression_type='GZIP')
+        dataset = dataset.map(reader.decode, num_parallel_calls=8)
+        dataset = dataset.map(reader.normalize, num_parallel_calls=8)
+        # gvcnn averages the scores over the batch.
+        dataset = dataset.batch(1).prefetch(4)
+        images, _ = tf.compat.v1.data.make_one_shot_iterator(dataset).get_next()
+
+        g_scheme = tf.compat.v1.placeholder(tf.int32, [FLAGS.num_group, FLAGS.num_views])
+        g_weight = tf.compat.v1.placeholder(tf.float32, [FLAGS.num_group])
+        scores, _, _ = model.gvcnn(images, num_classes, g_scheme, g_weight,
+                                   is_training=False, dropout_keep_prob=1.0)
+
+        if tf.io.gfile.isdir(FLAGS.checkpoint_path):
+            checkpoint_path = tf.train.latest_checkpoint(FLAGS.checkpoint_path)
+        else:
+            checkpoint_path = FLAGS.checkpoint_path
+
+        start_time = time.time()
+        object_scores = []
+        sess_config = tf.compat.v1.ConfigProto(
+            gpu_options=tf.compat.v1.GPUOptions(allow_growth=True))
+        with tf.compat.v1.Session(config=sess_config) as sess:
+            tf.compat.v1.train.Saver().restore(sess, checkpoint_path)
+            while True:
+                try:
+                    object_scores.append(sess.run(scores))
+                except tf.errors.OutOfRangeError:
+                    break
+                if len(object_scores) % 100 == 0:
+                    tf.compat.v1.logging.info('Scored %d objects, %.1f objects/sec',
+                                              len(object_scores), len(object_scores) /
+                                              (time.time() - start_time))
+    return np.array(object_scores, dtype=np.float64).reshape(-1, FLAGS.num_views)
+
+
+def first_view_indices(record_files):
+    """'image/view_index' of the first example, the stored views of every
+    object as the record builders write them."""
+    options = tf.io.TFRecordOptions('GZIP')
+    for serialized in tf.compat.v1.io.tf_record_iterator(record_files[0], options):
+        feature = tf.train.Example.FromString(serialized).features.feature
+        if 'image/view_index' in feature:
+            return list(feature['image/view_index'].int64_list.value)
+        break
+    return list(range(FLAGS.num_views))
+
+
+def top_positions(scores, k):
+    """Positions of the `k` highest `scores` along the last axis, in view
+    order."""
+    return np.sort(np.argsort(-scores, axis=-1, kind='stable')[..., :k], axis=-1)
+
+
+def write_pruned(record_files, positions, output_dir):
+    """Copies `record_files` into `output_dir`, keeping the views at
+    positions[i] of the i-th object."""
+    options = tf.io.TFRecordOptions('GZIP')
+    index = 0
+    for path in record_files:
+        writer = record_index.RecordIndexWriter(
+            os.path.join(output_dir, os.path.basename(path)), compression='GZIP')
+        for serialized in tf.compat.v1.io.tf_record_iterator(path, options):
+            pruned = prune_example(serialized, positions[index])
+            label = tf.train.Example.FromString(pruned).features.feature[
+                'image/label'].int64_list.value[0]
+            writer.write(pruned, label, len(positions[index]))
+            index += 1
+        writer.close()
+
+
+def main(unused_argv):
+    tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.INFO)
+
+    stats = None
+    if FLAGS.stats_record:
+        stats = manifest.load_stats(FLAGS.stats_record)
+        if stats is None:
+            raise ValueError('No channel stats for %s' % FLAGS.stats_record)
+
+    record_files = record_index.record_files(FLAGS.record_path)
+    scores = view_scores(record_files, len(FLAGS.labels.split(',')), stats)
+    view_index = first_view_indices(record_files)
+
+    per_object = top_positions(scores, FLAGS.top_k)
+    top_k_count = np.bincount(per_object.reshape(-1), minlength=FLAGS.num_views)
+    mean_score = scores.mean(axis=0)
+    canonical = top_positions(mean_score, FLAGS.top_k)
+    ranking = {'checkpoint': FLAGS.checkpoint_path,
+               'objects': len(scores),
+               'top_k': FLAGS.top_k,
+               'view_index': view_index,
+               'mean_score': mean_score.tolist(),
+               'top_k_count': top_k_count.tolist(),
+               'canonical_subset': [view_index[p] for p in canonical]}
+    for p in np.argsort(-mean_score, kind='stable'):
+        tf.compat.v1.logging.info('view %d: mean score %.4f, in the top %d of '
+                                  '%d of %d objects', view_index[p],
+                                  mean_score[p], FLAGS.top_k, top_k_count[p],
+                                  len(scores))
+    tf.compat.v1.logging.info('Canonical subset: --view_subset=%s',
+                              ','.join(str(v) for v in ranking['canonical_subset']))
+    manifest.write_view_ranking(FLAGS.record_path, ranking)
+
+    if FLAGS.output_dir:
+        if not tf.io.gfile.exists(FLAGS.output_dir):
+            tf.io.gfile.makedirs(FLAGS.output_dir)
+        if FLAGS.subset == 'canonical':
+            positions = np.tile(canonical, (len(scores), 1))
+        else:
+            positions = per_object
+        write_pruned(record_files, positions, FLAGS.output_dir)
+
+
+if __name__ == '__main__':
+    tf.compat.v1.app.run()
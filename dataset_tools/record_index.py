@@ -0,0 +1,144 @@
+"""
+Index sidecar for modelnet TFRecord files.
+
+The record writers emit `<record>.index` next to every record file with one
+entry per example: the byte offset and length of the record in the
+(uncompressed) TFRecord stream, the label and the number of views. Readers
+use it to get exact dataset sizes and step counts, per-class histograms and
+random-access samples without scanning the GZIP stream.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import gzip
+import json
+import struct
+
+import numpy as np
+import tensorflow as tf
+
+
+INDEX_SUFFIX = '.index'
+
+# uint64 length + uint32 crc of length, then data + uint32 crc of data.
+_HEADER_BYTES = 12
+_FOOTER_BYTES = 4
+
+
+def index_path(record_path):
+    return record_path + INDEX_SUFFIX
+
+
+class RecordIndexWriter(object):
+    """TFRecordWriter that also writes the index sidecar on close()."""
+
+    def __init__(self, record_path, compression='GZIP'):
+        self.record_path = record_path
+        self.compression = compression
+        options = tf.io.TFRecordOptions(compression)
+        self._writer = tf.io.TFRecordWriter(record_path, options=options)
+        self._offset = 0
+        self._entries = []
+
+    def write(self, serialized_example, label, num_views):
+        self._writer.write(serialized_example)
+        length = len(serialized_example)
+        self._entries.append([self._offset, length, int(label), int(num_views)])
+        self._offset += _HEADER_BYTES + length + _FOOTER_BYTES
+
+    def close(self):
+        self._writer.close()
+        with tf.io.gfile.GFile(index_path(self.record_path), 'w') as f:
+            json.dump({'compression': self.compression,
+                       'num_examples': len(self._entries),
+                       'examples': self._entries}, f)
+
+
+class RecordIndex(object):
+
+    def __init__(self, record_path):
+        self.record_path = record_path
+        with tf.io.gfile.GFile(index_path(record_path), 'r') as f:
+            index = json.load(f)
+        self.compression = index['compression']
+        entries = np.array(index['examples'], dtype=np.int64).reshape(-1, 4)
+        self.offsets = entries[:, 0]
+        self.lengths = entries[:, 1]
+        self.labels = entries[:, 2]
+        self.num_views = entries[:, 3]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def num_batches(self, batch_size):
+        return (len(self) + batch_size - 1) // batch_size
+
+    def class_histogram(self, num_classes=None):
+        return np.bincount(self.labels, minlength=num_classes or 0)
+
+    def sample(self, num_samples, seed=None):
+        """Returns `num_samples` example indices drawn without replacement."""
+        rng = np.random.RandomState(seed)
+        return rng.choice(len(self), size=min(num_samples, len(self)),
+                          replace=False)
+
+    def iter_examples(self, indices):
+        """Yields (index, serialized example) for every one of `indices`, in
+        offset order, reading the examples one at a time.
+
+        Uncompressed records are read with a seek per example. GZIP streams
+        cannot be seeked without inflating the bytes before the offset, so
+        the examples are read during a single forward pass, without parsing
+        the records in between.
+        """
+        indices = np.asarray(indices)
+        with tf.io.gfile.GFile(self.record_path, 'rb') as raw:
+            f = gzip.GzipFile(fileobj=raw) if self.compression == 'GZIP' else raw
+            for i in indices[np.argsort(self.offsets[indices], kind='stable')]:
+                f.seek(self.offsets[i])
+                length, = struct.unpack('<Q', f.read(8))
+                f.read(4)
+                yield i, f.read(length)
+
+    def read_examples(self, indices):
+        """Reads the serialized examples at `indices` by offset, see
+        iter_examples, and returns them in the order of `indices`."""
+        examples = dict(self.iter_examples(indices))
+        return [examples[i] for i in indices]
+
+
+def record_files(record_path):
+    """The record file `record_path`, or its shards when it was written with
+    --num_shards, e.g. `<record>-00000-of-00004`."""
+    if tf.io.gfile.exists(record_path):
+        return [record_path]
+    return sorted(tf.io.gfile.glob(record_path + '-?????-of-?????'))
+
+
+def load_index(record_path):
+    """Returns the RecordIndex of `record_path`, or None without a sidecar."""
+    if not tf.io.gfile.exists(index_path(record_path)):
+        return None
+    return RecordIndex(record_path)
+
+
+def dataset_size(record_path, default=None):
+    """Number of examples in `record_path`, `default` if it has no index.
+
+    `record_path` may also be a list of record files, in which case the total
+    over all files is returned, or `default` if any file has no index.
+    """
+    if isinstance(record_path, (list, tuple)):
+        sizes = [dataset_size(path) for path in record_path]
+        if None in sizes:
+            return default
+        return sum(sizes)
+
+    index = load_index(record_path)
+    if index is None:
+        tf.compat.v1.logging.warning('No index for %s, assuming %s examples.',
+                                     record_path, default)
+        return default
+    return len(index)
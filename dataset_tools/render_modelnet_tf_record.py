@@ -0,0 +1,190 @@
+"""
+Renders modelnet meshes straight into TFRecords.
+
+Replaces make_views_dir.py, obj2png.py and create_modelnet_tf_record.py for
+building records from the meshes, e.g.
+
+    python -m dataset_tools.render_modelnet_tf_record \
+        --mesh_dir=/home/ace19/dl_data/ModelNet10 --dataset_category=train \
+        --renderer=numpy --num_views=12 --num_workers=8 --num_shards=16
+
+Every worker process parses one mesh, renders its views into memory, encodes
+them and returns the serialized tf.Example, with the same features as
+create_modelnet_tf_record.py writes from the view PNGs. No view file is ever
+written or read back. The shards and their manifest are kept up to date like
+those of create_modelnet_tf_record.py, keyed by the content of the meshes, so
+a rerun only renders the shards whose meshes were added, removed or changed.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import functools
+import os
+
+import PIL.Image
+import tensorflow as tf
+
+from data_utils import render_util
+from dataset_tools import build_util
+from dataset_tools import catalog
+from dataset_tools import image_util
+from dataset_tools import view_example
+
+
+flags = tf.compat.v1.app.flags
+flags.DEFINE_string('mesh_dir',
+                    '/home/ace19/dl_data/ModelNet10',
+                    'Root directory of the <class>/<split>/<object>.off meshes.')
+flags.DEFINE_string('output_dir',
+                    '/home/ace19/dl_data/modelnet10',
+                    'Path to output TFRecord')
+flags.DEFINE_string('dataset_category',
+                    'train',
+                    'dataset category, train|validate|test')
+flags.DEFINE_integer('num_views', 12, 'Number of views')
+flags.DEFINE_float('azim', 30, 'Azimuth step between views in degrees.')
+flags.DEFINE_float('elevation', None, 'Elevation angle of the views in degrees.')
+flags.DEFINE_string('renderer', 'numpy',
+                    'numpy (data_utils/rasterizer.py) or matplotlib '
+                    '(ObjFile.PlotViews). Both draw on a transparent '
+                    'background, but the numpy views keep the aspect ratio of '
+                    'the mesh while matplotlib stretches every axis to fill '
+                    'its 3d box, so do not mix the records of the two.')
+flags.DEFINE_integer('image_size', 299, 'Height and width of the views.')
+flags.DEFINE_string('shading', 'lambert',
+                    'Shading of the numpy renderer, lambert or phong.')
+flags.DEFINE_float('scale', 0.9,
+                   'Axis scale of the matplotlib renderer.')
+flags.DEFINE_float('decimate', 0.,
+                   'If set, meshes are simplified by vertex clustering into '
+                   'cubes of about this many pixels of the views before '
+                   'rendering. 0 renders every face.')
+flags.DEFINE_string('mesh_cache_dir', None,
+                    'If set, parsed and normalized meshes are cached here and '
+                    'reused by later runs.')
+flags.DEFINE_boolean('grayscale', False,
+                     'Store single-channel views. Train with --channels=1.')
+flags.DEFINE_integer('target_size', 0,
+                     'Resize views to target_size x target_size when storing '
+                     'them. 0 keeps the rendered size.')
+flags.DEFINE_boolean('crop', False,
+                     'Crop the empty margins around the object in every view.')
+flags.DEFINE_boolean('shared_crop', False,
+                     'With --crop, use one crop box for all views of an object.')
+flags.DEFINE_enum('image_format', 'png', ['png', 'jpeg'],
+                  'Format to store the views in. JPEG records decode faster '
+                  'and can be decoded at 1/2, 1/4 or 1/8 scale.')
+flags.DEFINE_integer('jpeg_quality', 90, 'JPEG quality, 1-95.')
+flags.DEFINE_boolean('mosaic', False,
+                     'Tile the views of an object into one image, decoded with '
+                     'a single call. Views must share one size, see target_size. '
+                     'With --image_format=jpeg, every tile is padded to the JPEG '
+                     'block size (16 pixels, 8 with --grayscale) so that '
+                     'compression artifacts do not bleed between views.')
+flags.DEFINE_boolean('perceptual_hash', True,
+                     'Store a perceptual hash of every view for '
+                     'find_duplicates.py.')
+flags.DEFINE_integer('num_workers', 1,
+                     'Number of processes rendering and encoding the meshes. '
+                     'Examples are written in order by a single writer.')
+flags.DEFINE_integer('num_shards', 1,
+                     'Number of record files to split the objects over. Only '
+                     'the shards whose meshes changed since the last build '
+                     'are rendered again.')
+
+FLAGS = flags.FLAGS
+
+_FILE_PATTERN = 'modelnet%d_%dview_%s.record'
+
+
+def view_filenames(mesh_path, num_views):
+    """Paths the views of a mesh would have in the view tree of obj2png.py,
+    stored as 'image/filename'."""
+    object_path = os.path.splitext(mesh_path)[0]
+    name = os.path.basename(object_path)
+    return [os.path.join(object_path + '.off', '%s.%d.png' % (name, i))
+            for i in range(num_views)]
+
+
+def _serialize_mesh(task, example_kwargs, mesh_cache_dir=None):
+    image, label, (mesh_path,) = task
+    example_kwargs = dict(example_kwargs)
+    render_kwargs = example_kwargs.pop('render')
+    views = render_util.render_mesh_views(mesh_path,
+                                          mesh_cache_dir=mesh_cache_dir,
+                                          **render_kwargs)
+    source_pngs = [image_util.encode(PIL.Image.fromarray(view), 'png')
+                   for view in views]
+    example = view_example.views_to_tf_example(
+        source_pngs, label, view_filenames(mesh_path, len(views)),
+        list(range(len(views))), **example_kwargs)
+    return example.SerializeToString(), label, len(views)
+
+
+def get_mesh_tasks(label_to_index, data_catalog):
+    """(image, label, [mesh path]) of every mesh of the split, named like the
+    object directories of the view tree."""
+    mesh_files = data_catalog.files(FLAGS.dataset_category)
+    off_paths = set(path for _, _, path, _, _ in mesh_files if path.endswith('.off'))
+    tasks = []
+    for cls, mesh_file, mesh_path, _, _ in mesh_files:
+        if not mesh_file.endswith(('.off', '.obj')):
+            continue
+        if mesh_file.endswith('.obj') and mesh_path[:-4] + '.off' in off_paths:
+            # converted by off2obj.py, render the .off
+            continue
+        tasks.append((mesh_file[:-4] + '.off', label_to_index[cls], [mesh_path]))
+    return tasks
+
+
+def example_kwargs():
+    """Options of view_example.views_to_tf_example and of the renderer set by
+    the flags."""
+    elevations, azims = render_util.view_angles(FLAGS.num_views, FLAGS.azim,
+                                                FLAGS.elevation)
+    render = dict(elevations=elevations,
+                  azims=azims,
+                  image_size=FLAGS.image_size,
+                  renderer=FLAGS.renderer,
+                  shading=FLAGS.shading,
+                  scale=FLAGS.scale,
+                  decimate=FLAGS.decimate)
+    return dict(render=render,
+                grayscale=FLAGS.grayscale,
+                target_size=FLAGS.target_size or None,
+                crop=FLAGS.crop,
+                shared_crop=FLAGS.shared_crop,
+                image_format=FLAGS.image_format,
+                jpeg_quality=FLAGS.jpeg_quality,
+                mosaic=FLAGS.mosaic,
+                perceptual_hash=FLAGS.perceptual_hash)
+
+
+def main(_):
+    tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.INFO)
+
+    data_catalog = catalog.load_catalog(FLAGS.mesh_dir)
+    dataset_lst = data_catalog.classes()
+    label_to_index = {cls: i for i, cls in enumerate(dataset_lst)}
+
+    tasks = get_mesh_tasks(label_to_index, data_catalog)
+    tfrecord_name = os.path.join(FLAGS.output_dir, _FILE_PATTERN %
+                                 (len(dataset_lst), FLAGS.num_views,
+                                  FLAGS.dataset_category))
+
+    tf.io.gfile.makedirs(FLAGS.output_dir)
+    tf.compat.v1.logging.info('Rendering %d meshes into %s.', len(tasks),
+                              tfrecord_name)
+    # The cache directory does not change the records, it is left out of the
+    # options recorded in the manifest.
+    serialize_fn = functools.partial(_serialize_mesh,
+                                     mesh_cache_dir=FLAGS.mesh_cache_dir)
+    build_util.build_records(tfrecord_name, tasks, FLAGS.num_shards,
+                             FLAGS.num_workers, serialize_fn=serialize_fn,
+                             **example_kwargs())
+
+
+if __name__ == '__main__':
+    tf.compat.v1.app.run()
@@ -0,0 +1,180 @@
+"""
+Builds the multi-view tf.Example of one modelnet object.
+
+Shared by create_modelnet_tf_record.py, _create_modelnet_tf_record_each.py
+and render_modelnet_tf_record.py, which passes views rendered in memory.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import hashlib
+import io
+import os
+
+import PIL.Image
+import tensorflow as tf
+
+from dataset_tools import dataset_util
+from dataset_tools import image_util
+
+
+def view_index(view_path):
+    """View index of a rendered view, e.g. 3 for 'chair_0001.3.png'."""
+    return int(os.path.basename(view_path).split('.')[-2])
+
+
+def to_int64(value):
+    """Two's complement int64 of a 64-bit unsigned int."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def dict_to_tf_example(image,
+                       label_map_dict=None,
+                       view_map_dict=None,
+                       **kwargs):
+    """
+    Args:
+      image: a single image name
+      label_map_dict: A map from string label names to integers ids.
+      view_map_dict: A map from image names to the paths of their views.
+      **kwargs: options of views_to_tf_example.
+
+    Returns:
+      example: The converted tf.Example.
+
+    Raises:
+      ValueError: if a stored view is not a valid `image_format` image
+    """
+    filenames = []
+    source_pngs = []
+    view_indices = []
+
+    # All views are stored in view order; readers pick a subset with
+    # 'image/view_index'.
+    view_lst = sorted(view_map_dict[image], key=view_index)
+    for view_path in view_lst:
+        view_indices.append(view_index(view_path))
+        filenames.append(view_path)
+        with tf.io.gfile.GFile(view_path, 'rb') as fid:
+            source_pngs.append(fid.read())
+
+    return views_to_tf_example(source_pngs, label_map_dict[image], filenames,
+                               view_indices, **kwargs)
+
+
+def views_to_tf_example(source_pngs,
+                        label,
+                        filenames,
+                        view_indices,
+                        grayscale=False,
+                        target_size=None,
+                        crop=False,
+                        shared_crop=False,
+                        image_format='png',
+                        jpeg_quality=90,
+                        mosaic=False,
+                        perceptual_hash=True):
+    """
+    Args:
+      source_pngs: the PNG encoded views of one object, in view order.
+      label: integer class id of the object.
+      filenames: path of every view, stored as 'image/filename'.
+      view_indices: index of every view, stored as 'image/view_index'.
+      grayscale: whether to store the views as single-channel images.
+      target_size: if set, views are resized to target_size x target_size.
+      crop: whether to crop each view to the object's bounding box.
+      shared_crop: crop every view of the object with one shared box.
+      image_format: 'png' or 'jpeg', the format the views are stored in.
+      jpeg_quality: JPEG quality when image_format is 'jpeg'.
+      mosaic: whether to store all views tiled into one image under
+        'image/mosaic/encoded' instead of one image per view.
+      perceptual_hash: whether to store the difference hash of every source
+        view under 'image/phash', used by find_duplicates.py.
+
+    Returns:
+      example: The converted tf.Example.
+
+    Raises:
+      ValueError: if a stored view is not a valid `image_format` image
+    """
+    widths = []
+    heights = []
+    formats = []
+    keys = []
+    filenames = [filename.encode('utf8') for filename in filenames]
+    sourceids = list(filenames)
+
+    encoded_views, source_sizes, crop_boxes = image_util.transform_views(
+        source_pngs, target_size=target_size, crop=crop,
+        shared_crop=shared_crop, grayscale=grayscale,
+        image_format=image_format, jpeg_quality=jpeg_quality, mosaic=mosaic)
+
+    for encoded_view in encoded_views:
+        if image_format == 'png':
+            # Only the IHDR chunk is read, the pixels are never decoded.
+            width, height = image_util.png_size(encoded_view)
+            format = 'PNG'
+        else:
+            encoded_view_io = io.BytesIO(encoded_view)
+            image = PIL.Image.open(encoded_view_io)
+            width, height = image.size
+            format = image.format
+        widths.append(width)
+        heights.append(height)
+
+        formats.append(format.encode('utf8'))
+        if format!= image_format.upper():
+            raise ValueError('Image format not %s' % image_format.upper())
+        key = hashlib.sha256(encoded_view).hexdigest()
+        keys.append(key.encode('utf8'))
+
+    if mosaic:
+        rows, cols = image_util.mosaic_grid(len(source_pngs))
+        # The size of the views, without the padding of JPEG atlas tiles.
+        box = crop_boxes[0]
+        view_width, view_height = ((target_size, target_size) if target_size
+                                   else (box[2] - box[0], box[3] - box[1]))
+        widths = [view_width] * len(source_pngs)
+        heights = [view_height] * len(source_pngs)
+        formats = formats * len(source_pngs)
+        # The views are not stored on their own, key them by their source.
+        keys = [hashlib.sha256(png).hexdigest().encode('utf8')
+                for png in source_pngs]
+
+    feature = {
+        'image/height': dataset_util.int64_list_feature(heights),
+        'image/width': dataset_util.int64_list_feature(widths),
+        'image/source_height': dataset_util.int64_list_feature(
+            [size[1] for size in source_sizes]),
+        'image/source_width': dataset_util.int64_list_feature(
+            [size[0] for size in source_sizes]),
+        # left, top, right, bottom of every view, in source pixels.
+        'image/crop_box': dataset_util.int64_list_feature(
+            [v for box in crop_boxes for v in box]),
+        'image/filename': dataset_util.bytes_list_feature(filenames),
+        'image/source_id': dataset_util.bytes_list_feature(sourceids),
+        'image/key/sha256': dataset_util.bytes_list_feature(keys),
+        'image/format': dataset_util.bytes_list_feature(formats),
+        'image/label': dataset_util.int64_feature(label),
+        'image/view_index': dataset_util.int64_list_feature(view_indices),
+        'image/channels': dataset_util.int64_feature(1 if grayscale else 3),
+    }
+    if perceptual_hash:
+        # tf.Example has no unsigned type, the 64-bit hashes are stored as
+        # two's complement int64.
+        feature['image/phash'] = dataset_util.int64_list_feature(
+            [to_int64(image_util.dhash(PIL.Image.open(io.BytesIO(png))))
+             for png in source_pngs])
+    if mosaic:
+        feature['image/mosaic/encoded'] = dataset_util.bytes_feature(encoded_views[0])
+        feature['image/mosaic/rows'] = dataset_util.int64_feature(rows)
+        feature['image/mosaic/cols'] = dataset_util.int64_feature(cols)
+        feature['image/mosaic/view_height'] = dataset_util.int64_feature(view_height)
+        feature['image/mosaic/view_width'] = dataset_util.int64_feature(view_width)
+    else:
+        feature['image/encoded'] = dataset_util.bytes_list_feature(encoded_views)
+
+    example = tf.train.Example(features=tf.train.Features(feature=feature))
+    return example
@@ -12,7 +12,10 @@ import os
 import tensorflow as tf
 
 import eval_data
+from dataset_tools import manifest
+from dataset_tools import record_index
 from nets import model
+from utils import view_utils
 
 slim = tf.contrib.slim
 
@@ -22,7 +25,7 @@ FLAGS = flags.FLAGS
 
 NUM_GROUP = 10
 
-# temporary constant
+# used only when the record has no index sidecar
 MODELNET_EVAL_DATA_SIZE = 150
 
 
@@ -36,8 +39,20 @@ flags.DEFINE_string('checkpoint_path',
 
 flags.DEFINE_integer('batch_size', 4, 'batch size')
 flags.DEFINE_integer('num_views', 6, 'number of views')
+flags.DEFINE_string('view_subset', '0,3,5,6,9,11',
+                    'Comma-separated indices of the views to read from records '
+                    'storing all views. Must hold num_views indices. The '
+                    'default reads the 6 views the builders used to keep out of '
+                    '12; empty reads every view in the record.')
 flags.DEFINE_integer('height', 299, 'height')
 flags.DEFINE_integer('width', 299, 'width')
+flags.DEFINE_integer('channels', 3,
+                     'Channels to decode, 1 for records written with --grayscale.')
+flags.DEFINE_boolean('mosaic', False,
+                     'Whether the records were written with --mosaic.')
+flags.DEFINE_string('stats_record', None,
+                    'Training record whose manifest holds the channel stats '
+                    'the model was trained with (train.py --normalize_stats).')
 flags.DEFINE_string('labels',
                     'airplane,bed,bookshelf,toilet,vase',
                     'number of classes')
@@ -50,7 +65,7 @@ def main(unused_argv):
 
     # Define the model
     X = tf.compat.v1.placeholder(tf.float32,
-                                 [None, FLAGS.num_views, FLAGS.height, FLAGS.width, 3],
+                                 [None, FLAGS.num_views, FLAGS.height, FLAGS.width, FLAGS.channels],
                                  name='X')
     # final_X = tf.compat.v1.placeholder(tf.float32,
     #                          [FLAGS.num_views, None, 8, 8, 1536],
@@ -102,12 +117,22 @@ def main(unused_argv):
     ################
     # Prepare data
     ################
-    filenames = tf.compat.v1.placeholder(tf.string, shape=[])
+    stats = None
+    if FLAGS.stats_record:
+        stats = manifest.load_stats(FLAGS.stats_record)
+        if stats is None:
+            raise ValueError('No channel stats for %s' % FLAGS.stats_record)
+    filenames = tf.compat.v1.placeholder(tf.string, shape=[None])
     eval_dataset = eval_data.Dataset(filenames,
                                      FLAGS.num_views,
                                      FLAGS.height,
                                      FLAGS.width,
-                                     FLAGS.batch_size)
+                                     FLAGS.batch_size,
+                                     view_subset=view_utils.parse_view_subset(
+                                         FLAGS.view_subset, FLAGS.num_views),
+                                     channels=FLAGS.channels,
+                                     mosaic=FLAGS.mosaic,
+                                     stats=stats)
     iterator = eval_dataset.dataset.make_initializable_iterator()
     next_batch = iterator.get_next()
 
@@ -127,8 +152,11 @@ def main(unused_argv):
         # global_step = checkpoint_path.split('/')[-1].split('-')[-1]
 
         # Get the number of training/validation steps per epoch
-        batches = int(MODELNET_EVAL_DATA_SIZE / FLAGS.batch_size)
-        if MODELNET_EVAL_DATA_SIZE % FLAGS.batch_size > 0:
+        eval_filenames = record_index.record_files(FLAGS.dataset_path)
+        eval_data_size = record_index.dataset_size(eval_filenames,
+                                                   MODELNET_EVAL_DATA_SIZE)
+        batches = int(eval_data_size / FLAGS.batch_size)
+        if eval_data_size % FLAGS.batch_size > 0:
             batches += 1
 
         ##############
@@ -137,7 +165,6 @@ def main(unused_argv):
         start_time = datetime.datetime.now()
         tf.logging.info("Start prediction: %s" % start_time)
 
-        eval_filenames = os.path.join(FLAGS.dataset_path)
         sess.run(iterator.initializer, feed_dict={filenames: eval_filenames})
 
         count = 0;
@@ -212,7 +239,7 @@ def main(unused_argv):
         total_acc /= count
         tf.compat.v1.logging.info('Confusion Matrix:\n %s' % (total_conf_matrix))
         tf.compat.v1.logging.info('Final test accuracy = %.3f%% (N=%d)' %
-                                  (total_acc * 100, MODELNET_EVAL_DATA_SIZE))
+                                  (total_acc * 100, eval_data_size))
 
         end_time = datetime.datetime.now()
         tf.compat.v1.logging.info('End prediction: %s' % end_time)
@@ -12,6 +12,21 @@ from nets import inception_v3, resnet_v2
 slim = tf.contrib.slim
 
 
+def expand_grayscale(inputs):
+    '''
+    Grayscale views are fed with a single channel to keep host memory and
+    feed size low, and only broadcast to the 3 channels expected by the
+    pretrained root conv here, inside the graph.
+
+    :param inputs: N x V x H x W x C tensor, C is 1 or 3
+    :return: N x V x H x W x 3 tensor
+    '''
+    if inputs.get_shape().as_list()[-1] == 1:
+        inputs = tf.tile(inputs, [1, 1, 1, 1, 3])
+
+    return inputs
+
+
 # best group count for accuracy?
 def group_scheme(view_discrimination_score, num_group, num_views):
     '''
@@ -117,12 +132,13 @@ def gvcnn(inputs, num_classes, group_scheme, group_weight,
     the content information which could represent the view feature better.
 
     Args:
-    inputs: N x V x H x W x C tensor
+    inputs: N x V x H x W x C tensor, C is 1 (grayscale) or 3
     scope:
     """
     view_discrimination_scores = []
     final_view_descriptors = []
 
+    inputs = expand_grayscale(inputs)
     n_views = inputs.get_shape().as_list()[1]
     # transpose views: (NxVxHxWxC) -> (VxNxHxWxC)
     views = tf.transpose(inputs, perm=[1, 0, 2, 3, 4])
@@ -173,11 +189,12 @@ def basic(inputs,
           reuse=tf.compat.v1.AUTO_REUSE):
     '''
     Args:
-    inputs: N x V x H x W x C tensor
+    inputs: N x V x H x W x C tensor, C is 1 (grayscale) or 3
     scope:
     '''
     final_view_descriptors = []
 
+    inputs = expand_grayscale(inputs)
     n_views = inputs.get_shape().as_list()[1]
     # transpose views: (NxVxHxWxC) -> (VxNxHxWxC)
     views = tf.transpose(inputs, perm=[1, 0, 2, 3, 4])
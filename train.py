@@ -1,4 +1,5 @@
 import os
+import time
 import cv2
 
 import tensorflow as tf
@@ -7,8 +8,11 @@ import numpy as np
 
 import train_data
 import val_data
+from dataset_tools import manifest
+from dataset_tools import record_index
 from nets import model
-from utils import train_utils, _train_helper
+from utils import train_utils, _train_helper, view_cache, view_utils
+from utils import checkpoint_util
 
 slim = tf.contrib.slim
 
@@ -23,8 +27,15 @@ flags.DEFINE_string('ckpt_name_to_save', 'gvcnn.ckpt',
                     'Name to save checkpoint file')
 flags.DEFINE_integer('log_steps', 10,
                      'Display logging information at every log_steps.')
-flags.DEFINE_integer('save_interval_secs', 1200,
-                     'How often, in seconds, we save the model to disk.')
+flags.DEFINE_integer('save_interval_secs', 300,
+                     'How often, in seconds, we save the model to disk, 0 to '
+                     'save only at the end of every epoch.')
+flags.DEFINE_integer('save_interval_steps', 0,
+                     'Also save the model every this many steps, 0 to disable.')
+flags.DEFINE_integer('max_to_keep', 5, 'Number of recent checkpoints to keep.')
+flags.DEFINE_boolean('resume', True,
+                     'Resume from the latest checkpoint in train_logdir, at '
+                     'the epoch, step and input position of its global step.')
 flags.DEFINE_boolean('save_summaries_images', False,
                      'Save sample inputs, labels, and semantic predictions as '
                      'images to summary.')
@@ -87,6 +98,24 @@ flags.DEFINE_boolean('ignore_missing_vars',
 # Dataset settings.
 flags.DEFINE_string('dataset_dir', '/home/ace19/dl_data/modelnet5',
                     'Where the dataset reside.')
+flags.DEFINE_string('train_record', 'modelnet5_12view_train.record',
+                    'Training record file in dataset_dir.')
+flags.DEFINE_string('validate_record', 'modelnet5_12view_test.record',
+                    'Validation record file in dataset_dir.')
+flags.DEFINE_enum('balanced_sampler', 'none',
+                  ['none', 'uniform', 'inverse_frequency'],
+                  'Class weights for sampling from per-class training records '
+                  'matched by train_record_pattern. uniform draws every class '
+                  'equally often, i.e. class-balanced batches; '
+                  'inverse_frequency deliberately oversamples the rare '
+                  'classes, drawing each class in proportion to 1/size. none '
+                  'trains on the shuffled train_record file.')
+flags.DEFINE_string('train_record_pattern', 'modelnet12_train_*.tfrecord',
+                    'Glob in dataset_dir matching one training record per class, '
+                    'as written by _create_modelnet_tf_record_each.py.')
+flags.DEFINE_float('target_accuracy', None,
+                   'Log the wall time at which the validation accuracy first '
+                   'reaches this value.')
 
 flags.DEFINE_integer('how_many_training_epochs', 100,
                      'How many training loops to runs')
@@ -95,14 +124,34 @@ flags.DEFINE_integer('batch_size', 4, 'batch size')
 flags.DEFINE_integer('val_batch_size', 4, 'val batch size')
 flags.DEFINE_integer('num_views', 6, 'number of views')
 flags.DEFINE_integer('num_group', 10, 'number of group')
+flags.DEFINE_string('view_subset', '0,3,5,6,9,11',
+                    'Comma-separated indices of the views to read from records '
+                    'storing all views. Must hold num_views indices. The '
+                    'default reads the 6 views the builders used to keep out of '
+                    '12; empty reads every view in the record.')
 flags.DEFINE_integer('height', 299, 'height')
 flags.DEFINE_integer('width', 299, 'width')
+flags.DEFINE_integer('channels', 3,
+                     'Channels to decode, 1 for records written with --grayscale.')
+flags.DEFINE_boolean('mosaic', False,
+                     'Whether the records were written with --mosaic.')
+flags.DEFINE_boolean('normalize_stats', False,
+                     'Normalize the views with the per-channel mean/std stored '
+                     'in the manifest of train_record by utils/channel_stats.py.')
+flags.DEFINE_integer('train_cache_mb', 0,
+                     'Byte budget in MB for caching decoded training views '
+                     'before augmentation. 0 disables the cache.')
+flags.DEFINE_integer('val_cache_mb', 0,
+                     'Byte budget in MB for caching decoded validation views. '
+                     '0 disables the cache.')
+flags.DEFINE_string('cache_dir', None,
+                    'Local directory to keep cached views in instead of memory.')
 flags.DEFINE_string('labels',
                     # 'airplane,bed,bookshelf,bottle,chair,monitor,sofa,table,toilet,vase',
                     'bottle,monitor,table,toilet,vase',
                     'number of classes')
 
-# check total count before training
+# check total count before training, only used for records without an index.
 MODELNET_TRAIN_DATA_SIZE = 392+335+344+475+465    # 5 class
 MODELNET_VALIDATE_DATA_SIZE = 500
 
@@ -119,7 +168,7 @@ def main(unused_argv):
 
         # Define the model
         X = tf.compat.v1.placeholder(tf.float32,
-                                     [None, FLAGS.num_views, FLAGS.height, FLAGS.width, 3],
+                                     [None, FLAGS.num_views, FLAGS.height, FLAGS.width, FLAGS.channels],
                                      name='X')
         ground_truth = tf.compat.v1.placeholder(tf.int64, [None], name='ground_truth')
         is_training = tf.compat.v1.placeholder(tf.bool, name='is_training')
@@ -190,21 +239,70 @@ def main(unused_argv):
         ################
         # Prepare data
         ################
-        filenames = tf.compat.v1.placeholder(tf.string, shape=[])
-        tr_dataset = train_data.Dataset(filenames,
+        filenames = tf.compat.v1.placeholder(tf.string, shape=[None])
+        view_subset = view_utils.parse_view_subset(FLAGS.view_subset,
+                                                  FLAGS.num_views)
+        stats = None
+        if FLAGS.normalize_stats:
+            stats_record = os.path.join(FLAGS.dataset_dir, FLAGS.train_record)
+            stats = manifest.load_stats(stats_record)
+            if stats is None:
+                raise ValueError('No channel stats for %s, run utils/channel_stats.py'
+                                 % stats_record)
+            tf.compat.v1.logging.info('Normalizing with mean %s, std %s',
+                                      stats['mean'], stats['std'])
+        tr_cache = None
+        if FLAGS.train_cache_mb > 0:
+            tr_cache = view_cache.ViewCache(
+                FLAGS.train_cache_mb * 2**20,
+                FLAGS.cache_dir and os.path.join(FLAGS.cache_dir, 'train'))
+        training_records = None
+        class_weights = None
+        if FLAGS.balanced_sampler != 'none':
+            training_records = sorted(tf.io.gfile.glob(
+                os.path.join(FLAGS.dataset_dir, FLAGS.train_record_pattern)))
+            if not training_records:
+                raise ValueError('No per-class records match %s' %
+                                 FLAGS.train_record_pattern)
+            class_weights = FLAGS.balanced_sampler
+        # Shuffle seed and examples to skip of the training input, for a
+        # resumed epoch to continue where the checkpoint was taken.
+        epoch_seed = tf.compat.v1.placeholder_with_default(
+            tf.constant(0, tf.int64), [], name='epoch_seed')
+        skip = tf.compat.v1.placeholder_with_default(
+            tf.constant(0, tf.int64), [], name='skip')
+        tr_dataset = train_data.Dataset(training_records or filenames,
                                          FLAGS.num_views,
                                          FLAGS.height,
                                          FLAGS.width,
-                                         FLAGS.batch_size)
+                                         FLAGS.batch_size,
+                                         cache=tr_cache,
+                                         view_subset=view_subset,
+                                         class_weights=class_weights,
+                                         channels=FLAGS.channels,
+                                         mosaic=FLAGS.mosaic,
+                                         stats=stats,
+                                         seed=epoch_seed,
+                                         skip=skip)
         iterator = tr_dataset.dataset.make_initializable_iterator()
         next_batch = iterator.get_next()
 
         # validation dateset
+        val_cache = None
+        if FLAGS.val_cache_mb > 0:
+            val_cache = view_cache.ViewCache(
+                FLAGS.val_cache_mb * 2**20,
+                FLAGS.cache_dir and os.path.join(FLAGS.cache_dir, 'validate'))
         val_dataset = val_data.Dataset(filenames,
                                         FLAGS.num_views,
                                         FLAGS.height,
                                         FLAGS.width,
-                                        FLAGS.val_batch_size)   # val_batch_size
+                                        FLAGS.val_batch_size,   # val_batch_size
+                                        cache=val_cache,
+                                        view_subset=view_subset,
+                                        channels=FLAGS.channels,
+                                        mosaic=FLAGS.mosaic,
+                                        stats=stats)
         val_iterator = val_dataset.dataset.make_initializable_iterator()
         val_next_batch = val_iterator.get_next()
 
@@ -226,26 +324,75 @@ def main(unused_argv):
             if FLAGS.pre_trained_checkpoint:
                 train_utils.restore_fn(FLAGS)
 
-            if FLAGS.saved_checkpoint_dir:
+            # A checkpoint of this run, e.g. one written before the job was
+            # preempted, wins over saved_checkpoint_dir.
+            checkpoint_path = None
+            if FLAGS.resume:
+                checkpoint_path = tf.train.latest_checkpoint(FLAGS.train_logdir)
+            resumed = checkpoint_path is not None
+            if checkpoint_path is None and FLAGS.saved_checkpoint_dir:
                 if tf.gfile.IsDirectory(FLAGS.saved_checkpoint_dir):
                     checkpoint_path = tf.train.latest_checkpoint(FLAGS.saved_checkpoint_dir)
                 else:
                     checkpoint_path = FLAGS.saved_checkpoint_dir
+            if checkpoint_path is not None:
+                tf.compat.v1.logging.info('Restoring from "%s"', checkpoint_path)
                 saver.restore(sess, checkpoint_path)
 
-            start_epoch = 0
+            checkpointer = checkpoint_util.AsyncCheckpointer(
+                sess, os.path.join(FLAGS.train_logdir, FLAGS.ckpt_name_to_save),
+                global_step,
+                save_interval_secs=FLAGS.save_interval_secs,
+                save_interval_steps=FLAGS.save_interval_steps,
+                max_to_keep=FLAGS.max_to_keep,
+                keep_checkpoint_every_n_hours=1.0)
+            stop_request = checkpoint_util.StopRequest()
+
+            # The filenames argument to the TFRecordDataset initializer can either be a string,
+            # a list of strings, or a tf.Tensor of strings.
+            training_filenames = training_records or record_index.record_files(
+                os.path.join(FLAGS.dataset_dir, FLAGS.train_record))
+            validate_filenames = record_index.record_files(
+                os.path.join(FLAGS.dataset_dir, FLAGS.validate_record))
+
             # Get the number of training/validation steps per epoch
-            tr_batches = int(MODELNET_TRAIN_DATA_SIZE / FLAGS.batch_size)
-            if MODELNET_TRAIN_DATA_SIZE % FLAGS.batch_size > 0:
+            train_data_size = record_index.dataset_size(training_filenames,
+                                                        MODELNET_TRAIN_DATA_SIZE)
+            validate_data_size = record_index.dataset_size(validate_filenames,
+                                                           MODELNET_VALIDATE_DATA_SIZE)
+            tr_batches = int(train_data_size / FLAGS.batch_size)
+            if train_data_size % FLAGS.batch_size > 0:
                 tr_batches += 1
-            val_batches = int(MODELNET_VALIDATE_DATA_SIZE / FLAGS.val_batch_size)
-            if MODELNET_VALIDATE_DATA_SIZE % FLAGS.val_batch_size > 0:
+            val_batches = int(validate_data_size / FLAGS.val_batch_size)
+            if validate_data_size % FLAGS.val_batch_size > 0:
                 val_batches += 1
 
-            # The filenames argument to the TFRecordDataset initializer can either be a string,
-            # a list of strings, or a tf.Tensor of strings.
-            training_filenames = os.path.join(FLAGS.dataset_dir, 'modelnet5_6view_train.record')
-            validate_filenames = os.path.join(FLAGS.dataset_dir, 'modelnet5_6view_test.record')
+            # Every training step increments the global step, so the steps
+            # this run took tell the epoch and the step within it to resume
+            # at. A checkpoint restored from saved_checkpoint_dir starts a new
+            # run at epoch 0, keeping its global step for the learning rate.
+            start_epoch, start_step = 0, 0
+            if resumed:
+                start_epoch, start_step = divmod(
+                    sess.run(global_step) -
+                    checkpoint_util.read_start_step(FLAGS.train_logdir),
+                    tr_batches)
+                tf.compat.v1.logging.info('Resuming at epoch #%d, step #%d',
+                                          start_epoch, start_step)
+            else:
+                checkpoint_util.write_start_step(FLAGS.train_logdir,
+                                                 sess.run(global_step))
+
+            if training_records is None:
+                tr_indices = [record_index.load_index(path)
+                              for path in training_filenames]
+                if tr_indices and None not in tr_indices:
+                    tf.compat.v1.logging.info(
+                        'Training examples per class: %s',
+                        sum(index.class_histogram(num_classes)
+                            for index in tr_indices))
+            train_start_time = time.time()
+            reached_target = False
 
             ###################################
             # Training loop.
@@ -255,8 +402,22 @@ def main(unused_argv):
                 print(" Epoch {} ".format(num_epoch))
                 print("-------------------------------------")
 
-                sess.run(iterator.initializer, feed_dict={filenames: training_filenames})
-                for step in range(tr_batches):
+                first_step = start_step if num_epoch == start_epoch else 0
+                if training_records is None:
+                    # Every epoch has its own shuffle order; a resumed epoch
+                    # skips the batches it already trained on.
+                    sess.run(iterator.initializer,
+                             feed_dict={filenames: training_filenames,
+                                        epoch_seed: num_epoch,
+                                        skip: first_step * FLAGS.batch_size})
+                elif num_epoch == start_epoch:
+                    # The per-class streams are endless, keep their position
+                    # across epochs; a resumed run skips the examples of all
+                    # the steps it already took.
+                    sess.run(iterator.initializer,
+                             feed_dict={skip: (start_epoch * tr_batches +
+                                               first_step) * FLAGS.batch_size})
+                for step in range(first_step, tr_batches):
                     # Pull the image batch we'll use for training.
                     train_batch_xs, train_batch_ys = sess.run(next_batch)
 
@@ -301,6 +462,12 @@ def main(unused_argv):
                     tf.compat.v1.logging.info('Epoch #%d, Step #%d, rate %.6f, top1_acc %.3f%%, loss %.5f' %
                                     (num_epoch, step, lr, train_accuracy, train_loss))
 
+                    checkpointer.maybe_save()
+                    if stop_request.requested:
+                        checkpointer.save(block=True)
+                        checkpointer.close()
+                        return
+
 
                 ###################################################
                 # Validate the model on the validation set
@@ -365,19 +532,40 @@ def main(unused_argv):
                     else:
                         total_conf_matrix += conf_matrix
 
+                    # The epoch was trained in full; a resumed run starts at
+                    # the next one.
+                    if stop_request.requested:
+                        checkpointer.save(block=True)
+                        checkpointer.close()
+                        return
+
                 total_val_losses /= val_count
                 total_val_top1_acc /= val_count
 
                 tf.compat.v1.logging.info('Confusion Matrix:\n %s' % total_conf_matrix)
                 tf.compat.v1.logging.info('Validation loss = %.5f' % total_val_losses)
                 tf.compat.v1.logging.info('Validation accuracy = %.3f%% (N=%d)' %
-                                (total_val_top1_acc, MODELNET_VALIDATE_DATA_SIZE))
-
-                # Save the model checkpoint periodically.
-                if (num_epoch <= FLAGS.how_many_training_epochs-1):
-                    checkpoint_path = os.path.join(FLAGS.train_logdir, FLAGS.ckpt_name_to_save)
-                    tf.compat.v1.logging.info('Saving to "%s-%d"', checkpoint_path, num_epoch)
-                    saver.save(sess, checkpoint_path, global_step=num_epoch)
+                                (total_val_top1_acc, validate_data_size))
+                if (FLAGS.target_accuracy is not None and not reached_target and
+                        total_val_top1_acc >= FLAGS.target_accuracy):
+                    reached_target = True
+                    tf.compat.v1.logging.info(
+                        'Reached target accuracy %.3f after %d epochs in %.1f s '
+                        '(balanced_sampler=%s)', FLAGS.target_accuracy,
+                        num_epoch + 1, time.time() - train_start_time,
+                        FLAGS.balanced_sampler)
+                if tr_cache is not None:
+                    tr_cache.log_stats('Training')
+                if val_cache is not None:
+                    val_cache.log_stats('Validation')
+
+                # Save the model checkpoint at the end of every epoch, in the
+                # background while the next epoch starts.
+                checkpointer.save()
+                if stop_request.requested:
+                    break
+
+            checkpointer.close()
 
 
 if __name__ == '__main__':
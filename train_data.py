@@ -2,11 +2,48 @@ import tensorflow as tf
 
 import random
 
+from dataset_tools import record_index
+from utils import view_utils
+
 
 MEAN=[0.485, 0.456, 0.406]
 STD=[0.229, 0.224, 0.225]
 
 
+def class_sampling_weights(tfrecord_paths, class_weights):
+    """Sampling weight of each per-class record file.
+
+    Args:
+      tfrecord_paths: list of record files, one per class.
+      class_weights: 'uniform' to draw every class equally often, which
+        balances the classes since every file is a stream of one class;
+        'inverse_frequency' to draw each class proportionally to 1/size
+        (needs the record index sidecars), which deliberately oversamples
+        the rare classes beyond balance, so that a class half the size of
+        another is drawn twice as often; or a list with one weight per file.
+
+    Returns:
+      The weights, normalized to sum to 1.
+    """
+    if class_weights == 'uniform':
+        weights = [1.] * len(tfrecord_paths)
+    elif class_weights == 'inverse_frequency':
+        weights = []
+        for path in tfrecord_paths:
+            size = record_index.dataset_size(path)
+            if not size:
+                raise ValueError('inverse_frequency weights need a non-empty '
+                                 'indexed record, got %s' % path)
+            weights.append(1. / size)
+    else:
+        weights = [float(w) for w in class_weights]
+        if len(weights) != len(tfrecord_paths):
+            raise ValueError('Got %d class weights for %d record files' %
+                             (len(weights), len(tfrecord_paths)))
+
+    return [w / sum(weights) for w in weights]
+
+
 class Dataset(object):
     """
     Wrapper class around the new Tensorflows dataset pipeline.
@@ -14,14 +51,55 @@ class Dataset(object):
     Handles loading, partitioning, and preparing training data.
     """
 
-    def __init__(self, tfrecord_path, num_views, height, width, batch_size=1):
+    def __init__(self, tfrecord_path, num_views, height, width, batch_size=1,
+                 cache=None, view_subset=None, class_weights=None, channels=3,
+                 mosaic=False, stats=None, seed=None, skip=0):
+        if view_subset is not None and len(view_subset) != num_views:
+            raise ValueError('view_subset %s does not hold %d views' %
+                             (view_subset, num_views))
         self.num_views = num_views
+        # Indices of the views to decode, None to decode all views in the record.
+        self.view_subset = view_subset
         self.resize_h = height
         self.resize_w = width
-
-        self.dataset = tf.data.TFRecordDataset(tfrecord_path,
-                                          compression_type='GZIP',
-                                          num_parallel_reads=batch_size * 4)
+        # 1 for grayscale records, expanded to 3 channels in the model.
+        self.channels = channels
+        # Whether the records hold views tiled into one image (--mosaic).
+        self.mosaic = mosaic
+        # Optional per-channel {'mean', 'std'} of the pixels in [0, 1], see
+        # utils/channel_stats.py. Without it images are scaled to [-0.5, 0.5].
+        self.stats = stats
+        # Optional utils.view_cache.ViewCache for decoded, resized views.
+        self.cache = cache
+
+        if class_weights is None:
+            self.dataset = tf.data.TFRecordDataset(tfrecord_path,
+                                              compression_type='GZIP',
+                                              num_parallel_reads=batch_size * 4)
+            # The shuffle transformation uses a finite-sized buffer to shuffle
+            # elements in memory. Records are shuffled before they are
+            # decoded, in an order fixed by `seed`, so that a resumed epoch
+            # skips the `skip` examples it was already trained on without
+            # decoding them.
+            self.dataset = self.dataset.shuffle(1000 + 3 * batch_size, seed=seed)
+            self.dataset = self.dataset.skip(skip)
+            self.dataset = self.dataset.repeat()
+        else:
+            # Class-balanced sampling: `tfrecord_path` is a list of per-class
+            # record files, each read as its own endless stream, and every
+            # example is drawn from a class picked by `class_weights`. The
+            # streams and the class draws are fixed by `seed`, so that a
+            # resumed run skips the `skip` examples it was already trained on.
+            weights = class_sampling_weights(tfrecord_path, class_weights)
+            class_datasets = []
+            for path in tfrecord_path:
+                class_dataset = tf.data.TFRecordDataset(path, compression_type='GZIP')
+                class_dataset = class_dataset.shuffle(4 * batch_size, seed=seed).repeat()
+                class_datasets.append(class_dataset)
+            self.dataset = tf.data.experimental.sample_from_datasets(class_datasets,
+                                                                     weights,
+                                                                     seed=seed)
+            self.dataset = self.dataset.skip(skip)
 
         # self.dataset = self.dataset.map(self._parse_func, num_parallel_calls=8)
         # The map transformation takes a function and applies it to every element
@@ -33,41 +111,15 @@ class Dataset(object):
         # Prefetches a batch at a time to smooth out the time taken to load input
         # files for shuffling and processing.
         self.dataset = self.dataset.prefetch(buffer_size=batch_size)
-        # The shuffle transformation uses a finite-sized buffer to shuffle elements
-        # in memory. The parameter is the number of elements in the buffer. For
-        # completely uniform shuffling, set the parameter to be the same as the
-        # number of elements in the dataset.
-        self.dataset = self.dataset.shuffle(1000 + 3 * batch_size)
-        self.dataset = self.dataset.repeat()
         self.dataset = self.dataset.batch(batch_size)
 
 
     def decode(self, serialized_example):
         """Parses an image and label from the given `serialized_example`."""
-        features = tf.io.parse_single_example(
-            serialized_example,
-            # Defaults are not specified since both keys are required.
-            features={
-                # 'image/filename': tf.io.FixedLenFeature([], tf.string),
-                'image/encoded': tf.io.FixedLenFeature([self.num_views], tf.string),
-                'image/label': tf.io.FixedLenFeature([], tf.int64),
-            })
-
-        images = []
-        # labels = []
-        img_lst = tf.unstack(features['image/encoded'])
-        # lbl_lst = tf.unstack(features['image/label'])
-        for i, img in enumerate(img_lst):
-            # Convert from a scalar string tensor to a float32 tensor with shape
-            image_decoded = tf.image.decode_png(img, channels=3)
-            image = tf.image.resize(image_decoded, [self.resize_h, self.resize_w])
-            images.append(image)
-            # labels.append(lbl_lst[i])
-
-        # Convert label from a scalar uint8 tensor to an int32 scalar.
-        label = features['image/label']
-
-        return images, label
+        return view_utils.decode_example(serialized_example, self.num_views,
+                                         self.channels, self.resize_h,
+                                         self.resize_w, self.view_subset,
+                                         self.mosaic, self.cache)
 
     def augment(self, images, label):
         """Placeholder for data augmentation."""
@@ -97,8 +149,10 @@ class Dataset(object):
         img_lst = []
         img_tensor_lst = tf.unstack(images)
         for i, image in enumerate(img_tensor_lst):
-            # image = tf.cast(image, tf.float32) * (1. / 255) - 0.5
-            img_lst.append(tf.cast(image, tf.float32) * (1. / 255) - 0.5)
-            # img_lst.append(tf.div(tf.subtract(image, MEAN), STD))
+            image = tf.cast(image, tf.float32) * (1. / 255)
+            if self.stats is None:
+                img_lst.append(image - 0.5)
+            else:
+                img_lst.append((image - self.stats['mean']) / self.stats['std'])
 
         return img_lst, label
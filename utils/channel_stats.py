@@ -0,0 +1,175 @@
+"""
+Computes the per-channel mean and std of the views of a record file and
+stores them in its manifest, where train.py --normalize_stats and eval.py
+--stats_record pick them up to normalize the inputs, e.g.
+
+    python -m utils.channel_stats --record_path=modelnet5_6view_train.record \
+        --num_views=6 --height=299 --width=299 --foreground_only
+
+The views are decoded by a parallel tf.data pipeline that reduces every
+example to its per-channel pixel count, mean and sum of squared deviations.
+These are merged into running totals with Chan et al.'s parallel update, so
+the whole training set is processed in one pass with constant memory and
+without the cancellation of a sum-of-squares formula. With
+--sample_fraction, the record index sidecars draw the sample and only the
+sampled records are read.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import val_data
+from dataset_tools import manifest
+from dataset_tools import record_index
+from utils import view_utils
+
+
+flags = tf.compat.v1.app.flags
+flags.DEFINE_string('record_path', None, 'Record file to read.')
+flags.DEFINE_integer('num_views', 6, 'number of views')
+flags.DEFINE_string('view_subset', '0,3,5,6,9,11',
+                    'Comma-separated indices of the views to read from records '
+                    'storing all views. Must hold num_views indices. The '
+                    'default reads the 6 views the builders used to keep out of '
+                    '12; empty reads every view in the record.')
+flags.DEFINE_integer('height', 299, 'height')
+flags.DEFINE_integer('width', 299, 'width')
+flags.DEFINE_integer('channels', 3, 'Channels to decode.')
+flags.DEFINE_boolean('mosaic', False,
+                     'Whether the records were written with --mosaic.')
+flags.DEFINE_float('sample_fraction', 1.,
+                   'Fraction of the examples of every record file to read, '
+                   'drawn at random through the record index.')
+flags.DEFINE_integer('seed', 0, 'Seed of the example sample.')
+flags.DEFINE_boolean('foreground_only', False,
+                     'Only count pixels that differ from the background.')
+flags.DEFINE_integer('background', 255,
+                     'Value of the background pixels in every channel.')
+flags.DEFINE_integer('batch_size', 64, 'Examples merged per session run.')
+
+FLAGS = flags.FLAGS
+
+
+class ChannelMoments(object):
+    """Running per-channel pixel count, mean and sum of squared deviations."""
+
+    def __init__(self, channels):
+        self.count = np.zeros(channels)
+        self.mean = np.zeros(channels)
+        self.m2 = np.zeros(channels)
+
+    def update(self, counts, means, m2s):
+        """Merges the [k, channels] moments of k disjoint pixel sets."""
+        batch_count = counts.sum(axis=0)
+        nonzero = np.maximum(batch_count, 1.)
+        batch_mean = (counts * means).sum(axis=0) / nonzero
+        batch_m2 = m2s.sum(axis=0) + (counts * (means - batch_mean) ** 2).sum(axis=0)
+
+        total = self.count + batch_count
+        delta = batch_mean - self.mean
+        self.mean = self.mean + delta * batch_count / np.maximum(total, 1.)
+        self.m2 = (self.m2 + batch_m2 +
+                   delta ** 2 * self.count * batch_count / np.maximum(total, 1.))
+        self.count = total
+
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / np.maximum(self.count, 1.))
+
+
+def pixel_moments(images, channels, foreground_only=False, background=255):
+    """Per-channel count, mean and sum of squared deviations of the pixels
+    of `images`, scaled to [0, 1]."""
+    pixels = tf.reshape(tf.cast(images, tf.float64), [-1, channels])
+    if foreground_only:
+        foreground = tf.reduce_any(tf.abs(pixels - background) > 0.5, axis=1)
+        pixels = tf.boolean_mask(pixels, foreground)
+    pixels = pixels / 255.
+
+    count = tf.cast(tf.shape(pixels)[0], tf.float64)
+    mean = tf.reduce_sum(pixels, axis=0) / tf.maximum(count, 1.)
+    m2 = tf.reduce_sum(tf.square(pixels - mean), axis=0)
+    return tf.fill([channels], count), mean, m2
+
+
+def sampled_examples(indices, fraction, seed=0):
+    """Yields the serialized examples of a random `fraction` of the examples
+    of every record.RecordIndex in `indices`."""
+    for i, index in enumerate(indices):
+        sample = index.sample(int(round(fraction * len(index))), seed=seed + i)
+        for _, serialized in index.iter_examples(sample):
+            yield serialized
+
+
+def main(unused_argv):
+    tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.INFO)
+
+    record_files = record_index.record_files(FLAGS.record_path)
+    moments = ChannelMoments(FLAGS.channels)
+
+    with tf.Graph().as_default():
+        # Only used for its decode(), which handles view subsets and mosaics.
+        reader = val_data.Dataset(record_files,
+                                  FLAGS.num_views,
+                                  FLAGS.height,
+                                  FLAGS.width,
+                                  view_subset=view_utils.parse_view_subset(
+                                      FLAGS.view_subset, FLAGS.num_views),
+                                  channels=FLAGS.channels,
+                                  mosaic=FLAGS.mosaic)
+
+        indices = [record_index.load_index(path) for path in record_files]
+        if FLAGS.sample_fraction < 1. and None not in indices:
+            dataset = tf.data.Dataset.from_generator(
+                lambda: sampled_examples(indices, FLAGS.sample_fraction,
+                                         FLAGS.seed),
+                output_signature=tf.TensorSpec([], tf.string))
+        else:
+            dataset = tf.data.TFRecordDataset(record_files,
+                                              compression_type='GZIP',
+                                              num_parallel_reads=8)
+            if FLAGS.sample_fraction < 1.:
+                tf.compat.v1.logging.warning(
+                    'No index for some of %s, sampling by scanning them.',
+                    FLAGS.record_path)
+                dataset = dataset.filter(
+                    lambda _: tf.random.uniform([], seed=FLAGS.seed) < FLAGS.sample_fraction)
+        dataset = dataset.map(reader.decode, num_parallel_calls=8)
+        dataset = dataset.map(
+            lambda images, label: pixel_moments(images, FLAGS.channels,
+                                                FLAGS.foreground_only,
+                                                FLAGS.background),
+            num_parallel_calls=8)
+        dataset = dataset.batch(FLAGS.batch_size).prefetch(2)
+        next_batch = tf.compat.v1.data.make_one_shot_iterator(dataset).get_next()
+
+        start_time = time.time()
+        num_examples = 0
+        with tf.compat.v1.Session() as sess:
+            while True:
+                try:
+                    counts, means, m2s = sess.run(next_batch)
+                except tf.errors.OutOfRangeError:
+                    break
+                moments.update(counts, means, m2s)
+                num_examples += len(counts)
+
+    stats = {'mean': moments.mean.tolist(),
+             'std': moments.std.tolist(),
+             'pixels': int(moments.count[0]),
+             'examples': num_examples,
+             'foreground_only': FLAGS.foreground_only}
+    tf.compat.v1.logging.info('%d examples in %.1f s: mean %s, std %s',
+                              num_examples, time.time() - start_time,
+                              stats['mean'], stats['std'])
+    manifest.write_stats(FLAGS.record_path, stats)
+
+
+if __name__ == '__main__':
+    tf.compat.v1.app.run()
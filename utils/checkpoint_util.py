@@ -0,0 +1,219 @@
+"""
+Background checkpointing for train.py.
+
+AsyncCheckpointer copies the variables into host memory with one session
+run between two training steps, and writes the copy from a thread of its
+own, so training goes on while the checkpoint is written. The copy is
+written by a SaveV2 op of a private graph fed with the values, under the
+variable names tf.compat.v1.train.Saver uses, so the checkpoints restore with
+a Saver as before; the checkpoint state file is updated once the files are
+complete, so an interrupted write never becomes the latest checkpoint.
+
+StopRequest catches SIGTERM, e.g. when a spot instance is preempted, so that
+the training loop can save a last checkpoint and stop cleanly.
+
+write_start_step() records the global step a run started at, e.g. that of
+the checkpoint it fine-tunes, so that a resumed run can tell the steps it
+took itself from those of the checkpoint it started from.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import queue
+import signal
+import threading
+import time
+
+import tensorflow as tf
+
+
+class AsyncCheckpointer(object):
+    """Writes checkpoints `<prefix>-<global step>` on a background thread.
+
+    Args:
+      sess: session holding the variables.
+      prefix: checkpoint path prefix, e.g. <train_logdir>/gvcnn.ckpt.
+      global_step: the global step variable, read along with the snapshot.
+      var_list: variables to save, all global variables by default.
+      save_interval_secs: maybe_save() saves when this many seconds passed
+        since the last checkpoint, 0 to disable.
+      save_interval_steps: maybe_save() saves when the global step advanced
+        this much since the last checkpoint, 0 to disable.
+      max_to_keep: number of recent checkpoints to keep.
+      keep_checkpoint_every_n_hours: additionally keep one checkpoint per
+        this many hours, as tf.compat.v1.train.Saver does.
+    """
+
+    def __init__(self, sess, prefix, global_step, var_list=None,
+                 save_interval_secs=0, save_interval_steps=0, max_to_keep=5,
+                 keep_checkpoint_every_n_hours=10000.):
+        self.prefix = prefix
+        self.save_interval_secs = save_interval_secs
+        self.save_interval_steps = save_interval_steps
+        self.max_to_keep = max_to_keep
+        self.keep_checkpoint_every_n_hours = keep_checkpoint_every_n_hours
+
+        self._sess = sess
+        self._global_step = global_step
+        self._variables = var_list or tf.compat.v1.global_variables()
+        self._graph = tf.Graph()
+        with self._graph.as_default():
+            self._path = tf.compat.v1.placeholder(tf.string, [])
+            self._values = [tf.compat.v1.placeholder(v.dtype.base_dtype, v.get_shape())
+                            for v in self._variables]
+            self._save_op = tf.raw_ops.SaveV2(
+                prefix=self._path,
+                tensor_names=[v.op.name for v in self._variables],
+                shape_and_slices=[''] * len(self._variables),
+                tensors=self._values)
+        self._save_sess = tf.compat.v1.Session(graph=self._graph)
+
+        # Checkpoints of an earlier run in the same directory are kept and
+        # pruned like those of this run.
+        self._checkpoints = []
+        state = tf.train.get_checkpoint_state(os.path.dirname(prefix))
+        if state is not None:
+            self._checkpoints = [(path, time.time())
+                                 for path in state.all_model_checkpoint_paths
+                                 if tf.io.gfile.exists(path + '.index')]
+        self._last_preserved = time.time()
+        self._last_save_time = time.time()
+        self._last_save_step = sess.run(global_step)
+        self._error = None
+
+        self._queue = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(target=self._run, name='checkpointer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def busy(self):
+        """Whether a checkpoint is being written."""
+        return self._queue.unfinished_tasks > 0
+
+    def maybe_save(self):
+        """Saves if an interval passed and no checkpoint is being written.
+
+        Returns:
+          Whether a checkpoint was started.
+        """
+        due = (self.save_interval_secs and
+               time.time() - self._last_save_time >= self.save_interval_secs)
+        if not (due or self.save_interval_steps) or self.busy:
+            return False
+        if not due and (self._sess.run(self._global_step) - self._last_save_step <
+                        self.save_interval_steps):
+            return False
+        self.save()
+        return True
+
+    def save(self, block=False):
+        """Snapshots the variables and writes them as `<prefix>-<global step>`.
+
+        Waits for the checkpoint being written, if any, before taking the
+        snapshot, so that at most one snapshot is held in memory and
+        checkpoints are written in order; with `block`, also for this
+        checkpoint to be written.
+        """
+        self.flush()
+        values, global_step = self._sess.run([self._variables, self._global_step])
+        self._last_save_time = time.time()
+        self._last_save_step = global_step
+        self._queue.put((global_step, values))
+        if block:
+            self.flush()
+
+    def flush(self):
+        """Waits for the pending checkpoint to be written."""
+        self._queue.join()
+        self._check_error()
+
+    def close(self):
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+        self._save_sess.close()
+
+    def _check_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            except Exception as e:  # pylint: disable=broad-except
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _write(self, global_step, values):
+        start_time = time.time()
+        path = '%s-%d' % (self.prefix, global_step)
+        feed_dict = dict(zip(self._values, values))
+        feed_dict[self._path] = path
+        self._save_sess.run(self._save_op, feed_dict=feed_dict)
+
+        now = time.time()
+        # The state file holds the paths relative to the directory.
+        self._checkpoints = [c for c in self._checkpoints
+                             if os.path.basename(c[0]) != os.path.basename(path)]
+        self._checkpoints.append((path, now))
+        removed = []
+        while len(self._checkpoints) > self.max_to_keep:
+            old_path, saved_time = self._checkpoints.pop(0)
+            if (saved_time - self._last_preserved >
+                    self.keep_checkpoint_every_n_hours * 3600):
+                self._last_preserved = saved_time
+            else:
+                removed.append(old_path)
+        tf.compat.v1.train.update_checkpoint_state(
+            os.path.dirname(self.prefix), path,
+            all_model_checkpoint_paths=[c[0] for c in self._checkpoints])
+        for old_path in removed:
+            for old_file in tf.io.gfile.glob(old_path + '.*'):
+                tf.io.gfile.remove(old_file)
+        tf.compat.v1.logging.info('Saved "%s" in %.1f s', path, time.time() - start_time)
+
+
+START_STEP_NAME = 'start_global_step'
+
+
+def write_start_step(logdir, global_step):
+    """Records the global step a new run in `logdir` starts at."""
+    with tf.io.gfile.GFile(os.path.join(logdir, START_STEP_NAME), 'w') as f:
+        f.write('%d\n' % global_step)
+
+
+def read_start_step(logdir):
+    """Global step the run in `logdir` started at, 0 if it was not recorded."""
+    path = os.path.join(logdir, START_STEP_NAME)
+    if not tf.io.gfile.exists(path):
+        return 0
+    with tf.io.gfile.GFile(path, 'r') as f:
+        return int(f.read())
+
+
+class StopRequest(object):
+    """Records a SIGTERM instead of dying, for the training loop to poll."""
+
+    def __init__(self, signals=(signal.SIGTERM,)):
+        self.signum = None
+        for signum in signals:
+            signal.signal(signum, self._handle)
+
+    def _handle(self, signum, frame):
+        tf.compat.v1.logging.warning('Received signal %d, saving a checkpoint '
+                                     'and stopping.', signum)
+        self.signum = signum
+
+    @property
+    def requested(self):
+        return self.signum is not None
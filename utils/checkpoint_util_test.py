@@ -0,0 +1,145 @@
+"""Tests for utils.checkpoint_util."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import threading
+
+import tensorflow as tf
+
+from utils import checkpoint_util
+
+
+class AsyncCheckpointerTest(tf.test.TestCase):
+
+    def setUp(self):
+        super(AsyncCheckpointerTest, self).setUp()
+        self.logdir = tempfile.mkdtemp()
+        self.prefix = os.path.join(self.logdir, 'gvcnn.ckpt')
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            self.global_step = tf.compat.v1.train.get_or_create_global_step()
+            self.weights = tf.compat.v1.get_variable(
+                'weights', initializer=tf.zeros([2, 3]))
+            self.new_weights = tf.compat.v1.placeholder(tf.float32, [2, 3])
+            self.assign = [self.weights.assign(self.new_weights),
+                           self.global_step.assign_add(1)]
+            self.sess = tf.compat.v1.Session()
+            self.sess.run(tf.compat.v1.global_variables_initializer())
+
+    def tearDown(self):
+        self.sess.close()
+        shutil.rmtree(self.logdir)
+        super(AsyncCheckpointerTest, self).tearDown()
+
+    def _checkpointer(self, **kwargs):
+        with self.graph.as_default():
+            return checkpoint_util.AsyncCheckpointer(self.sess, self.prefix,
+                                                     self.global_step, **kwargs)
+
+    def _step(self, value):
+        """Sets the weights to `value` and advances the global step."""
+        self.sess.run(self.assign, feed_dict={self.new_weights: [[value] * 3] * 2})
+
+    def _saved_weights(self, global_step):
+        return tf.train.load_variable('%s-%d' % (self.prefix, global_step),
+                                      'weights')
+
+    def test_restores_with_saver(self):
+        checkpointer = self._checkpointer()
+        self._step(2.)
+        checkpointer.save(block=True)
+        checkpointer.close()
+
+        self.assertEqual(tf.train.latest_checkpoint(self.logdir), self.prefix + '-1')
+        self._step(5.)
+        with self.graph.as_default():
+            tf.compat.v1.train.Saver().restore(self.sess, self.prefix + '-1')
+        self.assertAllEqual(self.sess.run(self.weights), [[2.] * 3] * 2)
+        self.assertEqual(self.sess.run(self.global_step), 1)
+
+    def test_save_waits_for_the_write_in_flight(self):
+        checkpointer = self._checkpointer()
+        write = checkpointer._write
+        writing = threading.Event()
+        release = threading.Event()
+
+        def _slow_write(global_step, values):
+            writing.set()
+            release.wait()
+            write(global_step, values)
+
+        checkpointer._write = _slow_write
+        self._step(1.)
+        checkpointer.save()
+        self.assertTrue(writing.wait(10))
+        self.assertTrue(checkpointer.busy)
+
+        second = threading.Thread(target=checkpointer.save)
+        second.start()
+        second.join(0.5)
+        # The second snapshot is only taken once the first one is written.
+        self.assertTrue(second.is_alive())
+        self._step(2.)
+        release.set()
+        second.join(10)
+        self.assertFalse(second.is_alive())
+        checkpointer.close()
+
+        self.assertAllEqual(self._saved_weights(1), [[1.] * 3] * 2)
+        self.assertAllEqual(self._saved_weights(2), [[2.] * 3] * 2)
+        self.assertEqual(tf.train.latest_checkpoint(self.logdir), self.prefix + '-2')
+
+    def test_keeps_max_to_keep_checkpoints(self):
+        checkpointer = self._checkpointer(max_to_keep=2)
+        for value in range(4):
+            self._step(value)
+            checkpointer.save()
+        checkpointer.close()
+
+        state = tf.train.get_checkpoint_state(self.logdir)
+        self.assertEqual([os.path.basename(p) for p in state.all_model_checkpoint_paths],
+                         ['gvcnn.ckpt-3', 'gvcnn.ckpt-4'])
+        self.assertEqual(tf.io.gfile.glob(self.prefix + '-1.*'), [])
+        self.assertEqual(tf.io.gfile.glob(self.prefix + '-2.*'), [])
+
+    def test_maybe_save_every_n_steps(self):
+        checkpointer = self._checkpointer(save_interval_steps=2)
+        saved = []
+        for value in range(5):
+            self._step(value)
+            saved.append(checkpointer.maybe_save())
+            checkpointer.flush()
+        checkpointer.close()
+        self.assertEqual(saved, [False, True, False, True, False])
+
+    def test_write_error_is_raised(self):
+        checkpointer = self._checkpointer()
+
+        def _failing_write(global_step, values):
+            raise IOError('disk full')
+
+        checkpointer._write = _failing_write
+        checkpointer.save()
+        with self.assertRaisesRegex(IOError, 'disk full'):
+            checkpointer.flush()
+        checkpointer.close()
+
+
+class StartStepTest(tf.test.TestCase):
+
+    def test_round_trip(self):
+        logdir = tempfile.mkdtemp()
+        try:
+            self.assertEqual(checkpoint_util.read_start_step(logdir), 0)
+            checkpoint_util.write_start_step(logdir, 1234)
+            self.assertEqual(checkpoint_util.read_start_step(logdir), 1234)
+        finally:
+            shutil.rmtree(logdir)
+
+
+if __name__ == '__main__':
+    tf.test.main()
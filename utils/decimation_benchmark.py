@@ -0,0 +1,106 @@
+"""
+Reports what ObjFile.Decimate saves when rendering the views of meshes: the
+triangle count and render time before and after, and how much the views
+change, e.g.
+
+    python -m utils.decimation_benchmark \
+        --mesh_pattern='/home/ace19/dl_data/ModelNet10/*/test/*.off' \
+        --renderer=numpy --image_size=299 --decimate=1,2
+
+Meshes are sorted by file size and the largest are timed, as they are the
+ones decimation is for.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import copy
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from data_utils import mesh_cache
+from data_utils import rasterizer
+from data_utils import render_util
+
+
+flags = tf.compat.v1.app.flags
+flags.DEFINE_string('mesh_pattern', None, 'Glob pattern of the meshes to render.')
+flags.DEFINE_integer('max_meshes', 20, 'Number of meshes to time, largest first.')
+flags.DEFINE_string('decimate', '1,2',
+                    'Comma-separated cube sizes in pixels to compare with the '
+                    'full mesh.')
+flags.DEFINE_string('renderer', 'numpy', 'numpy or matplotlib.')
+flags.DEFINE_integer('image_size', 299, 'Height and width of the views.')
+flags.DEFINE_integer('num_views', 12, 'Number of views')
+flags.DEFINE_float('azim', 30, 'Azimuth step between views in degrees.')
+
+FLAGS = flags.FLAGS
+
+
+def render(mesh, elevations, azims):
+    """[V, H, W, 3] float views and the time they took."""
+    start_time = time.time()
+    if FLAGS.renderer == 'numpy':
+        views = rasterizer.render_views(mesh.nodes, mesh.Triangulate(),
+                                        elevations, azims,
+                                        height=FLAGS.image_size,
+                                        width=FLAGS.image_size)
+    else:
+        views = np.stack(mesh.PlotViews(elevations, azims,
+                                        height=FLAGS.image_size,
+                                        width=FLAGS.image_size,
+                                        scale=0.9))[..., :3]
+    return views.astype(np.float64), time.time() - start_time
+
+
+def main(unused_argv):
+    tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.INFO)
+
+    mesh_paths = sorted(tf.io.gfile.glob(FLAGS.mesh_pattern),
+                        key=lambda path: -os.path.getsize(path))[:FLAGS.max_meshes]
+    if not mesh_paths:
+        raise ValueError('No meshes match %s' % FLAGS.mesh_pattern)
+    cell_sizes = [float(size) for size in FLAGS.decimate.split(',')]
+    elevations, azims = render_util.view_angles(FLAGS.num_views, FLAGS.azim)
+
+    full_triangles = 0
+    full_time = 0.
+    triangles = np.zeros(len(cell_sizes))
+    times = np.zeros(len(cell_sizes))
+    diffs = np.zeros(len(cell_sizes))
+    for path in mesh_paths:
+        mesh, _, _ = mesh_cache.parse_mesh(path)
+        full_views, seconds = render(mesh, elevations, azims)
+        full_triangles += len(mesh.face_sizes)
+        full_time += seconds
+        for i, cell_size in enumerate(cell_sizes):
+            decimated = copy.deepcopy(mesh)
+            start_time = time.time()
+            _, num_triangles = decimated.Decimate(
+                render_util.decimation_cell(cell_size, FLAGS.image_size))
+            decimate_time = time.time() - start_time
+            views, seconds = render(decimated, elevations, azims)
+            triangles[i] += num_triangles
+            # The decimation is part of the render time it saves.
+            times[i] += decimate_time + seconds
+            diffs[i] += np.abs(views - full_views).mean()
+
+    tf.compat.v1.logging.info('%d meshes, %d views of %dpx: %d triangles, '
+                              '%.3f s/view', len(mesh_paths), FLAGS.num_views,
+                              FLAGS.image_size, full_triangles,
+                              full_time / (len(mesh_paths) * FLAGS.num_views))
+    for i, cell_size in enumerate(cell_sizes):
+        tf.compat.v1.logging.info(
+            '--decimate=%g: %d triangles (%.1fx fewer), %.3f s/view (%.1fx '
+            'faster), mean abs pixel difference %.2f', cell_size, triangles[i],
+            full_triangles / max(triangles[i], 1), times[i] /
+            (len(mesh_paths) * FLAGS.num_views), full_time / max(times[i], 1e-6),
+            diffs[i] / len(mesh_paths))
+
+
+if __name__ == '__main__':
+    tf.compat.v1.app.run()
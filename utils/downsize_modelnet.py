@@ -1,3 +1,11 @@
+"""
+Deletes the odd-numbered views of every object from disk.
+
+Records built by dataset_tools/create_modelnet_tf_record.py store all views
+with their view index, so the views can instead be selected at read time
+with --view_subset in train.py / eval.py without touching the PNGs.
+
+"""
 from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
@@ -7,6 +15,8 @@ import shutil
 
 import tensorflow as tf
 
+from dataset_tools import catalog
+
 
 flags = tf.app.flags
 flags.DEFINE_string('dataset_dir',
@@ -25,18 +35,13 @@ FLAGS = flags.FLAGS
 def main(_):
     tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.INFO)
 
-    cls_lst = os.listdir(FLAGS.dataset_dir)
-    for i, label in enumerate(cls_lst):
-        category_path = os.path.join(FLAGS.dataset_dir, label, FLAGS.dataset_category)
-        off_lst = os.listdir(category_path)
-        for off_file in off_lst:
-            off_path = os.path.join(category_path, off_file)
-            img_lst = os.listdir(off_path)
-            for img in img_lst:
-                img_path = os.path.join(off_path, img)
-                if os.path.isfile(img_path):
-                   if not int(img.split('.')[1]) % 2 == 0:
-                       os.remove(img_path)
+    data_catalog = catalog.load_catalog(FLAGS.dataset_dir)
+    for _, _, img_path, _, _ in data_catalog.files(FLAGS.dataset_category):
+        img = os.path.basename(img_path)
+        if not int(img.split('.')[1]) % 2 == 0:
+            os.remove(img_path)
+
+    catalog.invalidate(FLAGS.dataset_dir)
 
 if __name__ == '__main__':
     tf.compat.v1.app.run()
\ No newline at end of file
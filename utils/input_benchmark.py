@@ -0,0 +1,160 @@
+"""
+Measures the throughput of the validation input pipeline over a record file.
+
+Used to compare record encodings (PNG/JPEG, grayscale, crop/resize at build
+time, mosaic) at a given training resolution, e.g.
+
+    python -m utils.input_benchmark --record_path=modelnet5_12view_test.record \
+        --num_views=12 --view_subset= --height=224 --width=224
+
+With --reference_record, e.g. the PNG build of the same objects when
+benchmarking a --image_format=jpeg build, the views of both records are also
+decoded at the training resolution and compared, reporting the mean absolute
+error and PSNR the faster encoding costs.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import val_data
+from dataset_tools import record_index
+from utils import view_utils
+
+
+flags = tf.compat.v1.app.flags
+flags.DEFINE_string('record_path', None, 'Record file to read.')
+flags.DEFINE_integer('num_views', 6, 'number of views')
+flags.DEFINE_string('view_subset', '0,3,5,6,9,11',
+                    'Comma-separated indices of the views to read from records '
+                    'storing all views. Must hold num_views indices. The '
+                    'default reads the 6 views the builders used to keep out of '
+                    '12; empty reads every view in the record.')
+flags.DEFINE_integer('height', 299, 'height')
+flags.DEFINE_integer('width', 299, 'width')
+flags.DEFINE_integer('channels', 3, 'Channels to decode.')
+flags.DEFINE_boolean('mosaic', False,
+                     'Whether the records were written with --mosaic.')
+flags.DEFINE_integer('batch_size', 4, 'batch size')
+flags.DEFINE_integer('warmup_batches', 10, 'Batches to skip before timing.')
+flags.DEFINE_integer('num_batches', 100, 'Batches to time.')
+flags.DEFINE_string('reference_record', None,
+                    'Record of the same objects in another encoding, e.g. '
+                    'PNG, to compare the decoded views of record_path with.')
+flags.DEFINE_boolean('reference_mosaic', False,
+                     'Whether reference_record was written with --mosaic.')
+flags.DEFINE_integer('compare_examples', 200,
+                     'Number of examples to compare with reference_record.')
+
+FLAGS = flags.FLAGS
+
+
+def _decoded_views(record_files, mosaic):
+    """Dataset of the (first filename, views) of `record_files`, in order."""
+    view_subset = view_utils.parse_view_subset(FLAGS.view_subset, FLAGS.num_views)
+
+    def _decode(serialized):
+        images, _ = view_utils.decode_example(serialized, FLAGS.num_views,
+                                              FLAGS.channels, FLAGS.height,
+                                              FLAGS.width, view_subset, mosaic)
+        filenames = tf.io.parse_single_example(
+            serialized, {'image/filename': tf.io.VarLenFeature(tf.string)})
+        return filenames['image/filename'].values[0], images
+
+    dataset = tf.data.TFRecordDataset(record_files, compression_type='GZIP')
+    return dataset.map(_decode, num_parallel_calls=8)
+
+
+def compare_views(record_files, reference_files, num_examples):
+    """Pixel error of the decoded views of `record_files` against those of
+    `reference_files`, which must hold the same objects in the same order.
+
+    Returns:
+      (examples, mean absolute error, PSNR in dB, max absolute error) over
+      the views in [0, 255].
+    """
+    with tf.Graph().as_default():
+        dataset = tf.data.Dataset.zip((_decoded_views(record_files, FLAGS.mosaic),
+                                       _decoded_views(reference_files,
+                                                      FLAGS.reference_mosaic)))
+        dataset = dataset.take(num_examples).prefetch(4)
+        next_pair = tf.compat.v1.data.make_one_shot_iterator(dataset).get_next()
+
+        examples = 0
+        abs_error = 0.
+        squared_error = 0.
+        max_error = 0.
+        with tf.compat.v1.Session() as sess:
+            while True:
+                try:
+                    (name, views), (ref_name, ref_views) = sess.run(next_pair)
+                except tf.errors.OutOfRangeError:
+                    break
+                if name != ref_name:
+                    raise ValueError('%s and %s hold other objects (%s, %s); '
+                                     'build both with the same --num_shards' %
+                                     (FLAGS.record_path, FLAGS.reference_record,
+                                      name, ref_name))
+                error = np.abs(views.astype(np.float64) - ref_views)
+                examples += 1
+                abs_error += error.mean()
+                squared_error += np.square(error).mean()
+                max_error = max(max_error, error.max())
+
+    examples = max(examples, 1)
+    mse = squared_error / examples
+    psnr = 10. * np.log10(255. ** 2 / mse) if mse > 0 else float('inf')
+    return examples, abs_error / examples, psnr, max_error
+
+
+def main(unused_argv):
+    tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.INFO)
+
+    with tf.Graph().as_default():
+        dataset = val_data.Dataset(record_index.record_files(FLAGS.record_path),
+                                   FLAGS.num_views,
+                                   FLAGS.height,
+                                   FLAGS.width,
+                                   FLAGS.batch_size,
+                                   view_subset=view_utils.parse_view_subset(
+                                       FLAGS.view_subset, FLAGS.num_views),
+                                   channels=FLAGS.channels,
+                                   mosaic=FLAGS.mosaic)
+        iterator = tf.compat.v1.data.make_one_shot_iterator(dataset.dataset)
+        next_batch = iterator.get_next()
+
+        with tf.compat.v1.Session() as sess:
+            for _ in range(FLAGS.warmup_batches):
+                sess.run(next_batch)
+
+            start_time = time.time()
+            for _ in range(FLAGS.num_batches):
+                sess.run(next_batch)
+            elapsed = time.time() - start_time
+
+    num_examples = FLAGS.num_batches * FLAGS.batch_size
+    decode_calls = 1 if FLAGS.mosaic else FLAGS.num_views
+    tf.compat.v1.logging.info('%d examples in %.2f s: %.1f examples/sec, '
+                              '%.1f views/sec, %d decode calls per example',
+                              num_examples, elapsed, num_examples / elapsed,
+                              num_examples * FLAGS.num_views / elapsed,
+                              decode_calls)
+
+    if FLAGS.reference_record:
+        examples, mae, psnr, max_error = compare_views(
+            record_index.record_files(FLAGS.record_path),
+            record_index.record_files(FLAGS.reference_record),
+            FLAGS.compare_examples)
+        tf.compat.v1.logging.info('Views of %d examples against %s: mean abs '
+                                  'error %.3f, PSNR %.2f dB, max abs error %.0f',
+                                  examples, FLAGS.reference_record, mae, psnr,
+                                  max_error)
+
+
+if __name__ == '__main__':
+    tf.compat.v1.app.run()
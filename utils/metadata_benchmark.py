@@ -0,0 +1,67 @@
+"""
+Compares the per-view metadata time of the record builder: PIL.Image.open
+against the IHDR parser of dataset_tools/image_util.py, e.g.
+
+    python -m utils.metadata_benchmark \
+        --view_pattern='/home/ace19/dl_data/modelnet12/view/classes/*/test/*/*.png'
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import io
+import time
+
+import PIL.Image
+import tensorflow as tf
+
+from dataset_tools import image_util
+
+
+flags = tf.compat.v1.app.flags
+flags.DEFINE_string('view_pattern', None, 'Glob pattern of the PNG views to read.')
+flags.DEFINE_integer('max_views', 1000, 'Number of views to time.')
+flags.DEFINE_integer('repeats', 10, 'Times every view is parsed.')
+
+FLAGS = flags.FLAGS
+
+
+def pil_size(encoded):
+    image = PIL.Image.open(io.BytesIO(encoded))
+    if image.format != 'PNG':
+        raise ValueError('Image format not PNG')
+    return image.size
+
+
+def time_per_view(size_fn, views):
+    start_time = time.time()
+    for _ in range(FLAGS.repeats):
+        for encoded in views:
+            size_fn(encoded)
+    return (time.time() - start_time) / (FLAGS.repeats * len(views))
+
+
+def main(unused_argv):
+    tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.INFO)
+
+    views = []
+    for path in sorted(tf.io.gfile.glob(FLAGS.view_pattern))[:FLAGS.max_views]:
+        with tf.io.gfile.GFile(path, 'rb') as fid:
+            views.append(fid.read())
+    if not views:
+        raise ValueError('No views match %s' % FLAGS.view_pattern)
+
+    for encoded in views:
+        if image_util.png_size(encoded) != pil_size(encoded):
+            raise ValueError('IHDR and PIL sizes differ')
+
+    pil_time = time_per_view(pil_size, views)
+    ihdr_time = time_per_view(image_util.png_size, views)
+    tf.compat.v1.logging.info('%d views: PIL %.2f us/view, IHDR %.2f us/view, '
+                              '%.1fx', len(views), pil_time * 1e6,
+                              ihdr_time * 1e6, pil_time / ihdr_time)
+
+
+if __name__ == '__main__':
+    tf.compat.v1.app.run()
@@ -0,0 +1,133 @@
+"""
+Bounded LRU cache for decoded and resized views.
+
+The cache sits in front of the PNG decode and resize in the Dataset classes
+and stores the result as a uint8 [num_views, height, width, 3] array keyed
+by the view sha256 keys of an example, i.e. before any augmentation.
+Entries are kept in memory, or in a local directory when `cache_dir` is
+given, and the least recently used entries are evicted once the byte budget
+is exceeded, so only part of a dataset larger than the budget is cached.
+
+The Dataset maps call the cache from several threads. Files are written
+under a temporary name and renamed into place under the lock, so readers
+never see a partial file, and a file evicted while it is being read counts
+as a miss.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import hashlib
+import os
+import threading
+
+import numpy as np
+import tensorflow as tf
+
+
+_MISS = (np.array(False), np.zeros((0,), dtype=np.uint8))
+
+
+class ViewCache(object):
+
+    def __init__(self, max_bytes, cache_dir=None):
+        """
+        Args:
+          max_bytes: byte budget of the cached views.
+          cache_dir: if set, cached views are written as .npy files into this
+            local directory instead of being held in memory.
+        """
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        # key -> ndarray (memory) or nbytes (cache_dir), oldest first.
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(key):
+        return hashlib.sha1(key).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.npy')
+
+    def lookup(self, key):
+        """Returns (hit, views). `views` is an empty array on a miss."""
+        key = self._key(key)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return _MISS
+            self._entries.move_to_end(key)
+            value = self._entries[key]
+            if not self.cache_dir:
+                self.hits += 1
+                return np.array(True), value
+
+        try:
+            value = np.load(self._path(key))
+        except (IOError, OSError, ValueError, EOFError):
+            # Evicted since, or left short by an earlier crash.
+            with self._lock:
+                self.misses += 1
+                if self._entries.get(key) == value:
+                    del self._entries[key]
+                    self.bytes -= value
+            return _MISS
+        with self._lock:
+            self.hits += 1
+        return np.array(True), value
+
+    def insert(self, key, views):
+        """Stores `views` under `key` and returns `views` unchanged."""
+        key = self._key(key)
+        nbytes = views.nbytes
+        if nbytes > self.max_bytes:
+            return views
+
+        if self.cache_dir:
+            tmp_path = '%s.%d.%d.tmp' % (self._path(key), os.getpid(),
+                                         threading.current_thread().ident)
+            with open(tmp_path, 'wb') as f:
+                np.save(f, views)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                if self.cache_dir:
+                    os.remove(tmp_path)
+                return views
+            if self.cache_dir:
+                os.rename(tmp_path, self._path(key))
+            self._entries[key] = nbytes if self.cache_dir else views
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                old_key, old_value = self._entries.popitem(last=False)
+                if self.cache_dir:
+                    self.bytes -= old_value
+                    try:
+                        os.remove(self._path(old_key))
+                    except OSError:
+                        pass
+                else:
+                    self.bytes -= old_value.nbytes
+                self.evictions += 1
+
+        return views
+
+    def log_stats(self, name):
+        total = self.hits + self.misses
+        tf.compat.v1.logging.info(
+            '%s cache: %d hits, %d misses (hit rate %.1f%%), %d evictions, '
+            '%d entries, %.1f/%.1f MB',
+            name, self.hits, self.misses,
+            100. * self.hits / total if total else 0.,
+            self.evictions, len(self._entries),
+            self.bytes / 2.**20, self.max_bytes / 2.**20)
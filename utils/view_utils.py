@@ -0,0 +1,249 @@
+"""
+Helpers shared by the Dataset classes for parsing the per-view features of
+a modelnet example.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+
+def parse_view_subset(view_subset, num_views=None):
+    """Parses a comma-separated list of view indices, e.g. '0,3,5,6,9,11'.
+
+    Raises:
+      ValueError: if `num_views` is given and the list does not hold that
+        many indices.
+    """
+    if not view_subset:
+        return None
+    view_subset = [int(v) for v in view_subset.split(',')]
+    if num_views is not None and len(view_subset) != num_views:
+        raise ValueError('--view_subset=%s holds %d views but --num_views=%d; '
+                         'pass as many view indices as num_views, or an empty '
+                         '--view_subset to read every stored view' %
+                         (','.join(str(v) for v in view_subset),
+                          len(view_subset), num_views))
+    return view_subset
+
+
+def view_features(keys, num_views, view_subset=None, mosaic=False):
+    """Feature spec for the per-view `keys` of an example.
+
+    Without `view_subset` every record must hold exactly `num_views` views.
+    With it, records may hold any number of views: every stored view is
+    still parsed, as variable-length features, and select_views() then picks
+    the subset by 'image/view_index' so that only the subset is decoded.
+    Records without 'image/view_index' are taken to hold exactly the views
+    of `view_subset`, in that order. With `mosaic`,
+    the spec also holds the tiled views of records written with --mosaic.
+    """
+    if view_subset is None:
+        features = {k: tf.io.FixedLenFeature([num_views], tf.string) for k in keys}
+    else:
+        features = {k: tf.io.VarLenFeature(tf.string) for k in keys}
+        features['image/view_index'] = tf.io.VarLenFeature(tf.int64)
+
+    if mosaic:
+        features['image/mosaic/encoded'] = tf.io.FixedLenFeature([], tf.string)
+        features['image/mosaic/rows'] = tf.io.FixedLenFeature([], tf.int64)
+        features['image/mosaic/cols'] = tf.io.FixedLenFeature([], tf.int64)
+        # 0 in records written before JPEG atlas tiles were padded.
+        features['image/mosaic/view_height'] = tf.io.FixedLenFeature(
+            [], tf.int64, default_value=0)
+        features['image/mosaic/view_width'] = tf.io.FixedLenFeature(
+            [], tf.int64, default_value=0)
+    return features
+
+
+def view_positions(features, view_subset):
+    """Positions of the views in `view_subset` within the parsed record."""
+    view_index = tf.sparse.to_dense(features['image/view_index'])
+    # Records written before the view index was stored hold the subset only.
+    view_index = tf.cond(tf.size(view_index) > 0,
+                         lambda: view_index,
+                         lambda: tf.constant(view_subset, tf.int64))
+    positions = []
+    for v in view_subset:
+        found = tf.equal(view_index, v)
+        assert_op = tf.debugging.Assert(tf.reduce_any(found),
+                                        ['View index not in record:', v])
+        with tf.control_dependencies([assert_op]):
+            positions.append(tf.argmax(tf.cast(found, tf.int32)))
+    return tf.stack(positions)
+
+
+def select_views(features, keys, view_subset=None):
+    """Returns the per-view `keys` of the parsed `features`, restricted to
+    the views in `view_subset` and in that order. All stored views have been
+    parsed; only the returned ones are decoded."""
+    if view_subset is None:
+        return [features[k] for k in keys]
+
+    positions = view_positions(features, view_subset)
+    return [tf.gather(tf.sparse.to_dense(features[k], default_value=''), positions)
+            for k in keys]
+
+
+def decode_mosaic(features, num_views, channels, height, width, view_subset=None):
+    """Decodes the tiled views of a --mosaic record with a single decode call.
+
+    The atlas is split into its rows*cols tiles with a reshape and a
+    transpose at the stored resolution, the padding of JPEG atlas tiles is
+    cropped off, and only then are the selected tiles resized to
+    height x width, so that resizing never blends neighbouring views along
+    the tile borders.
+    """
+    encoded = features['image/mosaic/encoded']
+    rows = tf.cast(features['image/mosaic/rows'], tf.int32)
+    cols = tf.cast(features['image/mosaic/cols'], tf.int32)
+    atlas = _decode_image(encoded, channels, height, width, rows, cols)
+
+    shape = tf.shape(atlas)
+    tile_h = shape[0] // rows
+    tile_w = shape[1] // cols
+    tiles = tf.reshape(atlas[:rows * tile_h, :cols * tile_w],
+                       [rows, tile_h, cols, tile_w, channels])
+    tiles = tf.transpose(tiles, perm=[0, 2, 1, 3, 4])
+    tiles = tf.reshape(tiles, [rows * cols, tile_h, tile_w, channels])
+
+    # The view size is stored at full scale, the JPEG may have been decoded
+    # at a smaller one.
+    stored_shape = tf.cond(tf.image.is_jpeg(encoded),
+                           lambda: tf.image.extract_jpeg_shape(encoded)[:2],
+                           lambda: shape[:2])
+
+    def _view_size(key, tile, stored_tile):
+        size = tf.cast(features[key], tf.int32)
+        scaled = (size * tile + stored_tile - 1) // stored_tile
+        return tf.where(size > 0, tf.minimum(scaled, tile), tile)
+
+    tiles = tiles[:, :_view_size('image/mosaic/view_height', tile_h,
+                                 stored_shape[0] // rows),
+                  :_view_size('image/mosaic/view_width', tile_w,
+                              stored_shape[1] // cols)]
+
+    if view_subset is None:
+        tiles = tiles[:num_views]
+    else:
+        tiles = tf.gather(tiles, view_positions(features, view_subset))
+    images = tf.image.resize(tiles, [height, width])
+    images.set_shape([num_views, height, width, channels])
+
+    return images
+
+
+def _decode_image(encoded, channels, height, width, rows=None, cols=None):
+    """Decodes a PNG or JPEG image without resizing it.
+
+    JPEG images larger than the target are decoded at 1/2, 1/4 or 1/8 scale
+    in the DCT domain, the smallest scale that still covers height x width,
+    so fewer pixels are decoded and resized. With `rows` and `cols`, the
+    target is the size of each of the rows x cols tiles of the image, and
+    only scales dividing the tile size are used, so that the tiles stay
+    aligned after the scaled decode rounds up.
+    """
+    def _decode_jpeg(ratio):
+        return lambda: tf.image.decode_jpeg(encoded, channels=channels, ratio=ratio)
+
+    def _decode_scaled_jpeg():
+        shape = tf.image.extract_jpeg_shape(encoded)
+        tile_h, tile_w = shape[0], shape[1]
+        if rows is not None:
+            tile_h, tile_w = tile_h // rows, tile_w // cols
+        scale = tf.minimum(tile_h // height, tile_w // width)
+
+        def _fits(ratio):
+            fits = scale >= ratio
+            if rows is not None:
+                fits = tf.logical_and(fits, tf.logical_and(
+                    tf.equal(tile_h % ratio, 0), tf.equal(tile_w % ratio, 0)))
+            return fits
+
+        return tf.case([(_fits(8), _decode_jpeg(8)),
+                        (_fits(4), _decode_jpeg(4)),
+                        (_fits(2), _decode_jpeg(2))],
+                       default=_decode_jpeg(1), exclusive=False)
+
+    image_decoded = tf.cond(tf.image.is_jpeg(encoded),
+                            _decode_scaled_jpeg,
+                            lambda: tf.image.decode_png(encoded, channels=channels))
+    image_decoded.set_shape([None, None, channels])
+    return image_decoded
+
+
+def decode_view(encoded, channels, height, width):
+    """Decodes one PNG or JPEG view, see _decode_image, and resizes it to
+    height x width."""
+    return tf.image.resize(_decode_image(encoded, channels, height, width),
+                           [height, width])
+
+
+def decode_views(encoded, channels, height, width):
+    """Decodes the [num_views] encoded views into a float32
+    [num_views, height, width, channels] tensor, see decode_view."""
+    return tf.stack([decode_view(view, channels, height, width)
+                     for view in tf.unstack(encoded)])
+
+
+def cached_decode_views(cache, keys, decode_fn, num_views, channels, height,
+                        width):
+    """Looks the views of an example up in `cache`, a
+    utils.view_cache.ViewCache keyed by the concatenated view `keys`, and
+    decodes them with `decode_fn` on a miss.
+
+    The cache holds the decoded views rounded to uint8, which are returned
+    as float32 whether or not they were cached.
+    """
+    key = tf.strings.reduce_join(keys)
+    hit, cached = tf.numpy_function(cache.lookup, [key], [tf.bool, tf.uint8])
+
+    def _decode_and_insert():
+        images = decode_fn()
+        images = tf.cast(tf.clip_by_value(tf.round(images), 0, 255), tf.uint8)
+        return tf.numpy_function(cache.insert, [key, images], tf.uint8)
+
+    images = tf.cond(hit, lambda: cached, _decode_and_insert)
+    images.set_shape([num_views, height, width, channels])
+
+    return tf.cast(images, tf.float32)
+
+
+def decode_example(serialized_example, num_views, channels, height, width,
+                   view_subset=None, mosaic=False, cache=None):
+    """Parses and decodes the views and label of a serialized example.
+
+    Args:
+      serialized_example: serialized tf.Example of one object.
+      num_views, view_subset, mosaic: see view_features.
+      channels, height, width: shape the views are decoded to.
+      cache: optional utils.view_cache.ViewCache of decoded views.
+
+    Returns:
+      (images, label): float32 [num_views, height, width, channels] views in
+      [0, 255] and the int64 label.
+    """
+    view_keys = ['image/key/sha256']
+    if not mosaic:
+        view_keys.append('image/encoded')
+    features = view_features(view_keys, num_views, view_subset, mosaic)
+    # Defaults are not specified since both keys are required.
+    features['image/label'] = tf.io.FixedLenFeature([], tf.int64)
+    features = tf.io.parse_single_example(serialized_example, features=features)
+    views = select_views(features, view_keys, view_subset)
+
+    def _decode():
+        if mosaic:
+            return decode_mosaic(features, num_views, channels, height, width,
+                                 view_subset)
+        return decode_views(views[1], channels, height, width)
+
+    if cache is None:
+        images = _decode()
+    else:
+        images = cached_decode_views(cache, views[0], _decode, num_views,
+                                     channels, height, width)
+
+    return images, features['image/label']
@@ -1,5 +1,7 @@
 import tensorflow as tf
 
+from utils import view_utils
+
 
 MEAN=[0.485, 0.456, 0.406]
 STD=[0.229, 0.224, 0.225]
@@ -12,10 +14,26 @@ class Dataset(object):
     Handles loading, partitioning, and preparing training data.
     """
 
-    def __init__(self, tfrecord_path, num_views, height, width, batch_size=1):
+    def __init__(self, tfrecord_path, num_views, height, width, batch_size=1,
+                 cache=None, view_subset=None, channels=3, mosaic=False,
+                 stats=None):
+        if view_subset is not None and len(view_subset) != num_views:
+            raise ValueError('view_subset %s does not hold %d views' %
+                             (view_subset, num_views))
         self.num_views = num_views
+        # Indices of the views to decode, None to decode all views in the record.
+        self.view_subset = view_subset
         self.resize_h = height
         self.resize_w = width
+        # 1 for grayscale records, expanded to 3 channels in the model.
+        self.channels = channels
+        # Whether the records hold views tiled into one image (--mosaic).
+        self.mosaic = mosaic
+        # Optional per-channel {'mean', 'std'} of the pixels in [0, 1], see
+        # utils/channel_stats.py. Without it images are scaled to [-0.5, 0.5].
+        self.stats = stats
+        # Optional utils.view_cache.ViewCache for decoded, resized views.
+        self.cache = cache
 
         self.dataset = tf.data.TFRecordDataset(tfrecord_path,
                                                compression_type='GZIP',
@@ -42,30 +60,10 @@ class Dataset(object):
 
     def decode(self, serialized_example):
         """Parses an image and label from the given `serialized_example`."""
-        features = tf.io.parse_single_example(
-            serialized_example,
-            # Defaults are not specified since both keys are required.
-            features={
-                # 'image/filename': tf.io.FixedLenFeature([], tf.string),
-                'image/encoded': tf.io.FixedLenFeature([self.num_views], tf.string),
-                'image/label': tf.io.FixedLenFeature([], tf.int64),
-            })
-
-        images = []
-        # labels = []
-        img_lst = tf.unstack(features['image/encoded'])
-        # lbl_lst = tf.unstack(features['image/label'])
-        for i, img in enumerate(img_lst):
-            # Convert from a scalar string tensor to a float32 tensor with shape
-            image_decoded = tf.image.decode_png(img, channels=3)
-            image = tf.image.resize(image_decoded, [self.resize_h, self.resize_w])
-            images.append(image)
-            # labels.append(lbl_lst[i])
-
-        # Convert label from a scalar uint8 tensor to an int32 scalar.
-        label = features['image/label']
-
-        return images, label
+        return view_utils.decode_example(serialized_example, self.num_views,
+                                         self.channels, self.resize_h,
+                                         self.resize_w, self.view_subset,
+                                         self.mosaic, self.cache)
 
     def augment(self, images, label):
         """Placeholder for data augmentation."""
@@ -95,8 +93,10 @@ class Dataset(object):
         img_lst = []
         img_tensor_lst = tf.unstack(images)
         for i, image in enumerate(img_tensor_lst):
-            # image = tf.cast(image, tf.float32) * (1. / 255) - 0.5
-            img_lst.append(tf.cast(image, tf.float32) * (1. / 255) - 0.5)
-            # img_lst.append(tf.div(tf.subtract(image, MEAN), STD))
+            image = tf.cast(image, tf.float32) * (1. / 255)
+            if self.stats is None:
+                img_lst.append(image - 0.5)
+            else:
+                img_lst.append((image - self.stats['mean']) / self.stats['std'])
 
         return img_lst, label